@@ -1,50 +1,38 @@
 import streamlit as st
 import requests
+import time
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from app.utils import get_place_suggestions, get_place_details, day_of_week_to_int, predict_tip_amount
-from src.functions import make_prediction, load_model
+from app.utils import lookup_places, day_of_week_to_int, predict_tip_amount, cached_model, cached_tree_models, cached_jfk_stats, cached_map_markers, start_metrics_export, metrics_tables, cached_trip_index, get_secret
+from src.functions import make_prediction
+from src import telemetry
 import plotly.express as px
 import plotly.graph_objects as go
 
+# A quote is timed end to end from the start of the script run, geocoding lookups included
+run_start = time.perf_counter()
+start_metrics_export()
+
 tab1, tab2 = st.tabs(["📈 Exploration", "🗃 Prediction"])
 
-# Fetch API key from Streamlit Secrets
-API_KEY = st.secrets["GOOGLE_MAPS_API_KEY"]
+# Fetch API key from Streamlit Secrets, optional with the local gazetteer
+API_KEY = get_secret("GOOGLE_MAPS_API_KEY")
 
 ### The Visualizations Tab 1
 
 # The stuff under tab1.xyz are all exploration related UI eliments.
 tab1.subheader("A tab with a chart")
-df = pd.read_csv("outputs/csvdata/VisualizeLocations.csv")
-# pickups = pd.read_csv("data/processed_data/PickupLocations.csv")
-# dropoff = pd.read_csv("data/processed_data/DropoffLocations.csv")
-
-df20 =  df.head(20000)
-# pick_df20 =  pickups.head(20000)
-# drop_df20 =  dropoff.head(20000)
+# All pickup/dropoff points, aggregated offline into grid cells with `python -m src.spatial`.
+# Only the finest level of detail that fits the marker budget is sent to the browser.
+markers = cached_map_markers("outputs/csvdata/VisualizeLocations_lod.csv")
 
-tab1.map(df20, size=2, color='color')
+tab1.map(markers, size='size', color='color')
 
 # JFK trips code.
 
-# Load data from file
-data = pd.read_csv('outputs/csvdata/JFK_trips.csv')  # Load your dataset
-
-# Extract hour and day of week from pickup_datetime
-data['pickup_datetime'] = pd.to_datetime(data['pickup_datetime'])
-data['hour'] = data['pickup_datetime'].dt.hour
-data['day_of_week'] = data['pickup_datetime'].dt.dayofweek
-
-# Group by day_of_week and hour
-grouped_data = data.groupby(['day_of_week', 'hour']).agg({
-    'trip_duration': ['mean', 'median', 'std'],
-    'total_amount': ['mean', 'median', 'std']
-}).reset_index()
-
-# Rename columns for easier access
-grouped_data.columns = ['day_of_week', 'hour', 'duration_mean', 'duration_median', 'duration_std', 'fare_mean', 'fare_median', 'fare_std']
+# Per-(day_of_week, hour) duration and fare statistics, built offline with `python -m src.jfk_stats`
+grouped_data = cached_jfk_stats('outputs/stats/jfk_cube.npz')
 
 # Streamlit app
 tab1.title('Trip Duration and Fare Analysis')
@@ -94,51 +82,51 @@ fig.update_layout(
 tab1.plotly_chart(fig)
 
 
-tree_fare, tree_duration, linreg_tip_amount = load_model('outputs/models/tree_fare_amount.pkl'), \
-                            load_model('outputs/models/tree_trip_duration.pkl'), \
-                            load_model('outputs/models/tip_amount_model.pkl')
+tree_targets, tree_models = cached_tree_models('outputs/models/', ['fare_amount', 'trip_duration'])
+linreg_tip_amount = cached_model('outputs/models/tip_amount_model.pkl')
 
 
 ### The PREDICTION TAB 2
 # Streamlit app
 tab2.title('Trip Search')
 
-# Text input for the address
-input_origin_address = tab2.text_input('Origin:')
-suggestions = []
+# Text inputs for the addresses. The containers keep each field's suggestions under its input
+# while both addresses are looked up at once
+origin_box, destination_box = tab2.container(), tab2.container()
+input_origin_address = origin_box.text_input('Origin:')
+input_destination_address = destination_box.text_input('Destination:')
 
-orlat, orlng, destlat, destlng = None, None, None, None
+# Suggestions and coordinates of both addresses are fetched concurrently, for the suggestion
+# picked in the previous run or else the top one
+places = lookup_places({
+    'origin': (input_origin_address, st.session_state.get('origin_choice')),
+    'destination': (input_destination_address, st.session_state.get('destination_choice')),
+})
 
-if input_origin_address:
-    suggestions = get_place_suggestions(input_origin_address)
+orlat, orlng, destlat, destlng = None, None, None, None
 
-if suggestions:
-    selected_suggestion = tab2.selectbox('Suggestions:', [s['description'] for s in suggestions])
-    selected_place_id = next(s['place_id'] for s in suggestions if s['description'] == selected_suggestion)
-    orlat, orlng = get_place_details(selected_place_id)
+origin = places['origin']
+if origin and origin['suggestions']:
+    origin_box.selectbox('Suggestions:', [s['description'] for s in origin['suggestions']], key='origin_choice')
+    orlat, orlng = origin['location']
     if orlat and orlng:
-        tab2.write(f"You selected: {selected_suggestion}")
-        tab2.write(f"Coordinates: Latitude {orlat}, Longitude {orlng}")
+        origin_box.write(f"You selected: {origin['description']}")
+        origin_box.write(f"Coordinates: Latitude {orlat}, Longitude {orlng}")
     else:
-        tab2.write("Could not retrieve coordinates for the selected address.")
-
-input_destination_address = tab2.text_input('Destination:')
-suggestions = []
-
-if input_destination_address:
-    suggestions = get_place_suggestions(input_destination_address)
+        origin_box.write("Could not retrieve coordinates for the selected address.")
 
-if suggestions:
-    selected_suggestion = tab2.selectbox('Suggestions:', [s['description'] for s in suggestions])
-    selected_place_id = next(s['place_id'] for s in suggestions if s['description'] == selected_suggestion)
-    destlat, destlng = get_place_details(selected_place_id)
+destination = places['destination']
+if destination and destination['suggestions']:
+    destination_box.selectbox('Suggestions:', [s['description'] for s in destination['suggestions']],
+                              key='destination_choice')
+    destlat, destlng = destination['location']
     if destlat and destlng:
-        tab2.write(f"You selected: {selected_suggestion}")
-        tab2.write(f"Coordinates: Latitude {destlat}, Longitude {destlng}")
+        destination_box.write(f"You selected: {destination['description']}")
+        destination_box.write(f"Coordinates: Latitude {destlat}, Longitude {destlng}")
     else:
-        tab2.write("Could not retrieve coordinates for the selected address.")
+        destination_box.write("Could not retrieve coordinates for the selected address.")
 else:
-    tab2.write("Please start typing an address to see suggestions.")
+    destination_box.write("Please start typing an address to see suggestions.")
 
 
 
@@ -180,19 +168,45 @@ if tab2.button('Submit'):
     tab2.write(f"Destination Coordinates: Latitude {destlat}, Longitude {destlng}")
     
     # Predict tip amount
-    pred = make_prediction(hour_24,
-                           minute,
-                           day_of_week_int,
-                           orlng,
-                           orlat,
-                           destlng,
-                           destlat,
-                           tree_targets=['fare_amount', 'trip_duration'],
-                           tree_models=[tree_fare, tree_duration],
-                           reg_targets=['tip_amount'],
-                           reg_models=[linreg_tip_amount]
-    )
+    try:
+        pred = make_prediction(hour_24,
+                               minute,
+                               day_of_week_int,
+                               orlng,
+                               orlat,
+                               destlng,
+                               destlat,
+                               tree_targets=tree_targets,
+                               tree_models=tree_models,
+                               reg_targets=['tip_amount'],
+                               reg_models=[linreg_tip_amount]
+        )
+    except Exception:
+        telemetry.count('quote_errors_total')
+        raise
     
     tab2.write(f"Predicted trip duration: {pred['trip_duration']}")                       
     tab2.write(f"Predicted fare: {pred['fare_amount']}")
     tab2.write(f"Predicted tip amount: {pred['tip_amount']}")
+    telemetry.count('quotes_total')
+    telemetry.observe('quote_seconds', time.perf_counter() - run_start)
+
+    # Actual fares and durations of past trips between nearby points around the same day and hour
+    trip_index = cached_trip_index('outputs/trip_index')
+    if trip_index is not None:
+        with telemetry.timer('similar_trips_seconds'):
+            similar_trips = trip_index.nearest(day_of_week_int, hour_24, orlat, orlng, destlat, destlng,
+                                               k=10, radius=1.0, hour_window=1)
+        tab2.subheader('Similar past trips')
+        if len(similar_trips):
+            tab2.dataframe(similar_trips, hide_index=True)
+        else:
+            tab2.write("No past trips within a mile of both the origin and the destination at this time.")
+
+# Admin panel with the latency and cache metrics of this process, enabled with the METRICS_PANEL secret
+if get_secret("METRICS_PANEL", False):
+    with st.sidebar.expander("Metrics"):
+        latencies, counters = metrics_tables()
+        st.dataframe(latencies, hide_index=True)
+        st.dataframe(counters, hide_index=True)
+        st.download_button("Prometheus metrics", telemetry.to_prometheus(), file_name="metrics.prom")
@@ -0,0 +1,130 @@
+import bisect
+import csv
+import re
+
+from src import telemetry
+
+LOCAL_PREFIX = "local:"
+DEFAULT_CITY = "New York, NY"
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+# Lowercase, with every run of punctuation and whitespace turned into a single space
+def normalize(text):
+    return _NON_ALPHANUMERIC.sub(' ', text.lower()).strip()
+
+
+class Gazetteer:
+    """
+    Offline autocomplete over named places (addresses, landmarks) with known coordinates.
+
+    The normalized names are kept once. The prefix index is two sorted arrays of (place, offset)
+    pairs: one for whole names and one for the names from each later word on, so "kennedy"
+    finds "John F. Kennedy International Airport". A lookup is a binary search plus a scan over
+    the matches it returns, which takes microseconds even for a million places.
+
+    Suggestions and details have the shape of GeocodingClient's, with place ids "local:<row>".
+
+    Args:
+        places (list): (name, latitude, longitude) tuples, optionally with a borough/area fourth element
+            and a "City, ST" fifth one (default: "New York, NY").
+    """
+
+    def __init__(self, places):
+        self.descriptions = []
+        self.coordinates = []
+        self._names = []
+        for place in places:
+            name, lat, lng = place[:3]
+            area = place[3] if len(place) > 3 else None
+            city = place[4] if len(place) > 4 and place[4] else DEFAULT_CITY
+            self.descriptions.append(', '.join(part for part in (name, area, city) if part))
+            self.coordinates.append((float(lat), float(lng)))
+            self._names.append(normalize(name))
+
+        starts, words = [], []
+        for row, name in enumerate(self._names):
+            starts.append((row, 0))
+            words.extend((row, match.start() + 1) for match in re.finditer(' ', name))
+        self._starts = sorted(starts, key=self._suffix)
+        self._words = sorted(words, key=self._suffix)
+
+    @classmethod
+    def from_csv(cls, path):
+        # CSV with name, latitude and longitude columns and optional borough and city ("City, ST") columns
+        with open(path, newline='', encoding='utf-8') as file:
+            return cls([(row['name'], row['latitude'], row['longitude'], row.get('borough'), row.get('city'))
+                        for row in csv.DictReader(file)])
+
+    def _suffix(self, entry):
+        row, offset = entry
+        return self._names[row][offset:]
+
+    def __len__(self):
+        return len(self._names)
+
+    def _matches(self, index, prefix):
+        position = bisect.bisect_left(index, prefix, key=self._suffix)
+        while position < len(index) and self._suffix(index[position]).startswith(prefix):
+            yield index[position][0]
+            position += 1
+
+    # Places whose name, or a word of it onwards, starts with the typed text. Whole-name matches come first
+    def autocomplete(self, input_text, limit=5):
+        prefix = normalize(input_text)
+        if not prefix:
+            return []
+        rows = []
+        for index in (self._starts, self._words):
+            for row in self._matches(index, prefix):
+                if row not in rows:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+            if len(rows) == limit:
+                break
+        return [{'description': self.descriptions[row], 'place_id': f"{LOCAL_PREFIX}{row}"} for row in rows]
+
+    # Coordinates of a local place id, (None, None) for unknown ids
+    def details(self, place_id):
+        if not is_local(place_id):
+            return None, None
+        row = place_id[len(LOCAL_PREFIX):]
+        if not row.isdigit() or int(row) >= len(self.coordinates):
+            return None, None
+        return self.coordinates[int(row)]
+
+
+def is_local(place_id):
+    return place_id.startswith(LOCAL_PREFIX)
+
+
+class LocalFirstPlaces:
+    """
+    Autocomplete and details from a gazetteer first, and from a remote client (GeocodingClient)
+    only when nothing matches locally.
+
+    Args:
+        gazetteer (Gazetteer): The local places, or None.
+        remote (GeocodingClient): The Places API client, or None to stay offline.
+    """
+
+    def __init__(self, gazetteer, remote=None):
+        self.gazetteer = gazetteer
+        self.remote = remote
+
+    def autocomplete(self, input_text):
+        suggestions = []
+        if self.gazetteer is not None:
+            suggestions = self.gazetteer.autocomplete(input_text)
+            telemetry.count('gazetteer_lookups_total', result='hit' if suggestions else 'miss')
+        if suggestions or self.remote is None:
+            return suggestions
+        return self.remote.autocomplete(input_text)
+
+    def details(self, place_id):
+        if is_local(place_id):
+            return self.gazetteer.details(place_id) if self.gazetteer is not None else (None, None)
+        if self.remote is None:
+            return None, None
+        return self.remote.details(place_id)
@@ -0,0 +1,240 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import telemetry
+
+PLACES_URL = "https://maps.googleapis.com/maps/api/place"
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (found, value)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires, value = item
+            if expires < self.clock():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Optional persistent cache in a SQLite file, shared by processes on the same host.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                               (key, json.dumps(value), time.time() + self.ttl))
+            self._conn.commit()
+
+
+class GeocodingClient:
+    """
+    Google Places client with a pooled keep-alive session, timeouts and an LRU+TTL cache.
+    Cache results, errors and the latency of the remote calls are recorded in src.telemetry.
+
+    Args:
+        api_key (str): The Google Maps API key.
+        base_url (str): Places API root, override to point at a stub server in tests.
+        timeout (float | tuple): requests timeout, (connect, read) in seconds.
+        pool_size (int): Maximum number of kept-alive connections.
+        cache_size (int): Entries kept in the in-memory cache.
+        ttl (float): Seconds before an in-memory entry expires.
+        disk_cache_path (str): Optional SQLite file for a persistent second-level cache.
+    """
+
+    def __init__(self, api_key, base_url=PLACES_URL, timeout=(3.05, 5), pool_size=10,
+                 cache_size=1024, ttl=3600, disk_cache_path=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = TTLCache(cache_size, ttl)
+        self.disk_cache = DiskCache(disk_cache_path) if disk_cache_path else None
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, endpoint):
+        with self._stats_lock:
+            self.stats[name] += 1
+        if name == 'errors':
+            telemetry.count('geocoding_errors_total', endpoint=endpoint)
+        else:
+            telemetry.count('geocoding_cache_total', endpoint=endpoint, result=name)
+
+    def _cached(self, endpoint, key, fetch):
+        found, value = self.cache.get(key)
+        if found:
+            self._count('hits', endpoint)
+            return value
+        if self.disk_cache is not None:
+            found, value = self.disk_cache.get(key)
+            if found:
+                self._count('disk_hits', endpoint)
+                self.cache.set(key, value)
+                return value
+        self._count('misses', endpoint)
+        value = fetch()
+        # Failed lookups return None and are not cached, so they are retried next time
+        if value is not None:
+            self.cache.set(key, value)
+            if self.disk_cache is not None:
+                self.disk_cache.set(key, value)
+        return value
+
+    def _get_json(self, endpoint, params):
+        try:
+            with telemetry.timer('geocoding_request_seconds', endpoint=endpoint):
+                response = self.session.get(f"{self.base_url}/{endpoint}/json",
+                                            params={**params, 'key': self.api_key}, timeout=self.timeout)
+        except requests.RequestException:
+            self._count('errors', endpoint)
+            return None
+        if response.status_code != 200:
+            self._count('errors', endpoint)
+            return None
+        return response.json()
+
+    # Get place suggestions for a typed prefix
+    def autocomplete(self, input_text):
+        input_text = input_text.strip()
+
+        def fetch():
+            body = self._get_json('autocomplete', {'input': input_text, 'types': 'geocode'})
+            if body is None:
+                return None
+            return [{'description': item['description'], 'place_id': item['place_id']}
+                    for item in body.get('predictions', [])]
+
+        return self._cached('autocomplete', f"autocomplete:{input_text.lower()}", fetch) or []
+
+    # Get place details to fetch GPS coordinates
+    def details(self, place_id):
+        def fetch():
+            body = self._get_json('details', {'place_id': place_id})
+            if body is None:
+                return None
+            location = body.get('result', {}).get('geometry', {}).get('location', {})
+            return [location.get('lat'), location.get('lng')]
+
+        location = self._cached('details', f"details:{place_id}", fetch)
+        return tuple(location) if location is not None else (None, None)
+
+
+class ConcurrentGeocoder:
+    """
+    Resolves several address fields at once.
+
+    Each field is one task: autocomplete, then details of the selected suggestion (the top one
+    unless the user picked another). lookup() runs the tasks of one call on threads of its own,
+    so a rerun waits for the slowest field instead of the sum of all round-trips, and sessions
+    never queue behind each other's lookups. The top suggestion's details are always fetched:
+    directly when it is the selection, otherwise prefetched on the shared background pool, so
+    switching back to it is a cache hit. Other suggestions are not prefetched, to save requests.
+    A task whose field has received newer text since it was submitted skips its remaining
+    requests and returns None.
+
+    Args:
+        client: Object with autocomplete(text) and details(place_id), e.g. GeocodingClient.
+        max_workers (int): Threads of the background pool for prefetches and submit(), shared by all sessions.
+        max_keys (int): Fields whose latest text is remembered, least recently submitted dropped first.
+    """
+
+    def __init__(self, client, max_workers=8, max_keys=4096):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geocoding')
+        self._latest = TTLCache(maxsize=max_keys)
+
+    def _current(self, key, text):
+        return self._latest.get(key) == (True, text)
+
+    def _resolve(self, key, text, selected):
+        if not self._current(key, text):
+            telemetry.count('geocoding_stale_total')
+            return None
+        suggestions = self.client.autocomplete(text)
+        if not suggestions:
+            return {'suggestions': [], 'description': None, 'place_id': None, 'location': (None, None)}
+        top = suggestions[0]
+        choice = next((s for s in suggestions if s['description'] == selected), top)
+        # The top suggestion is the default selection, keep its details warm when another one is picked
+        if choice is not top:
+            self._executor.submit(self.client.details, top['place_id'])
+        if not self._current(key, text):
+            telemetry.count('geocoding_stale_total')
+            return None
+        return {'suggestions': suggestions, 'description': choice['description'], 'place_id': choice['place_id'],
+                'location': self.client.details(choice['place_id'])}
+
+    # Submit the lookup of one field to the background pool. key identifies the field (per user session),
+    # selected is the description the user picked earlier, if any. The future gives None when the lookup went stale
+    def submit(self, key, text, selected=None):
+        self._latest.set(key, text)
+        return self._executor.submit(self._resolve, key, text, selected)
+
+    # Look up several fields concurrently: {key: (text, selected)} -> {key: result or None}.
+    # Empty texts are not looked up
+    def lookup(self, fields):
+        tasks = {key: (text.strip(), selected) for key, (text, selected) in fields.items() if text and text.strip()}
+        results = dict.fromkeys(fields)
+        if not tasks:
+            return results
+        for key, (text, _) in tasks.items():
+            self._latest.set(key, text)
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='geocoding-lookup') as executor:
+            futures = {key: executor.submit(self._resolve, key, text, selected) for key, (text, selected) in tasks.items()}
+            results.update((key, future.result()) for key, future in futures.items())
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
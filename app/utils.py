@@ -1,31 +1,150 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.errors import StreamlitSecretNotFoundError
 import requests
 import pandas as pd
 import numpy as np
 import joblib
+import os
+from src.functions import load_model, load_tree_models
+from src import telemetry
+from app.geocoding import GeocodingClient, ConcurrentGeocoder
+from app.gazetteer import Gazetteer, LocalFirstPlaces
+from src.jfk_stats import load_cube, cube_frame
+from src.spatial import select_level, MAX_MARKERS
+from src.trip_index import TripIndex
 
-API_KEY = st.secrets["GOOGLE_MAPS_API_KEY"]
+# A Streamlit secret, or default when it is not set or there is no secrets.toml at all
+def get_secret(name, default=None):
+    try:
+        return st.secrets.get(name, default)
+    except StreamlitSecretNotFoundError:
+        return default
 
-# Get place suggestions
+# Without a key only the local gazetteer answers
+API_KEY = get_secret("GOOGLE_MAPS_API_KEY")
+GAZETTEER_PATH = get_secret("GAZETTEER_PATH", "outputs/csvdata/nyc_gazetteer.csv")
+
+# Cached loaders. Streamlit reruns app.py on every interaction, so files are read once per
+# process and kept until their modification time changes (the mtime is part of the cache key).
+@st.cache_resource(max_entries=16)
+def _cached_model(file_path, mtime_ns):
+    return load_model(file_path)
+
+def cached_model(file_path):
+    return _cached_model(file_path, os.stat(file_path).st_mtime_ns)
+
+# The trees the models manifest names: a joint multi-output tree (MULTI_OUTPUT) or one tree per target
+def cached_tree_models(models_path, targets):
+    return load_tree_models(models_path, targets, load=cached_model)
+
+@st.cache_data(max_entries=16)
+def _cached_csv(file_path, mtime_ns):
+    return pd.read_csv(file_path)
+
+def cached_csv(file_path):
+    return _cached_csv(file_path, os.stat(file_path).st_mtime_ns)
+
+# The JFK statistics are precomputed offline by `python -m src.jfk_stats`, the app only loads the cube
+@st.cache_data(max_entries=16)
+def _cached_jfk_stats(file_path, mtime_ns):
+    return cube_frame(load_cube(file_path))
+
+def cached_jfk_stats(file_path):
+    return _cached_jfk_stats(file_path, os.stat(file_path).st_mtime_ns)
+
+# Map markers from the level-of-detail pyramid built offline by `python -m src.spatial`
+@st.cache_data(max_entries=16)
+def _cached_map_markers(file_path, mtime_ns, max_markers):
+    return select_level(_cached_csv(file_path, mtime_ns), max_markers)
+
+def cached_map_markers(file_path, max_markers=MAX_MARKERS):
+    return _cached_map_markers(file_path, os.stat(file_path).st_mtime_ns, max_markers)
+
+# Historical trip index built offline by `python -m src.trip_index build`, None when it has not been built.
+# The trees of the (day, hour) slots are loaded on first use and shared by all sessions
+@st.cache_resource(max_entries=4)
+def _cached_trip_index(path, mtime_ns):
+    return TripIndex(path)
+
+def cached_trip_index(path):
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    return _cached_trip_index(path, os.stat(meta_path).st_mtime_ns)
+
+# One pooled, cached Places client per process
+@st.cache_resource
+def get_geocoding_client():
+    return GeocodingClient(API_KEY, disk_cache_path=get_secret("GEOCODING_CACHE_PATH"))
+
+# Local NYC places for offline autocomplete, reloaded when the CSV changes. None without the file
+@st.cache_resource(max_entries=4)
+def _cached_gazetteer(file_path, mtime_ns):
+    return Gazetteer.from_csv(file_path)
+
+def get_gazetteer():
+    if not os.path.exists(GAZETTEER_PATH):
+        return None
+    return _cached_gazetteer(GAZETTEER_PATH, os.stat(GAZETTEER_PATH).st_mtime_ns)
+
+# Local gazetteer first, the Places API only when nothing matches locally and a key is set
+def get_places():
+    return LocalFirstPlaces(get_gazetteer(), get_geocoding_client() if API_KEY else None)
+
+# Get place suggestions. Lookups are timed whether they hit the cache or the API
 def get_place_suggestions(input_text):
-    url = f"https://maps.googleapis.com/maps/api/place/autocomplete/json?input={input_text}&types=geocode&key={API_KEY}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        predictions = response.json().get('predictions', [])
-        return [{'description': item['description'], 'place_id': item['place_id']} for item in predictions]
-    else:
-        return []
-
-# Get place details to fetch GPS coordinates
+    with telemetry.timer('geocoding_lookup_seconds', endpoint='autocomplete'):
+        return get_places().autocomplete(input_text)
+
+# Get place details to fetch GPS coordinates, local place ids are resolved by the gazetteer
 def get_place_details(place_id):
-    url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&key={API_KEY}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        result = response.json().get('result', {})
-        location = result.get('geometry', {}).get('location', {})
-        return location.get('lat'), location.get('lng')
-    else:
-        return None, None
+    with telemetry.timer('geocoding_lookup_seconds', endpoint='details'):
+        return get_places().details(place_id)
+
+# One geocoder per process, rebuilt when the gazetteer or the client changes. Lookups run on threads
+# of their own per script run; GEOCODING_WORKERS sizes the shared pool that prefetches suggestions
+@st.cache_resource(max_entries=4)
+def _cached_geocoder(_places, gazetteer_id, client_id):
+    return ConcurrentGeocoder(_places, max_workers=int(get_secret("GEOCODING_WORKERS", 8)))
+
+def get_geocoder():
+    places = get_places()
+    return _cached_geocoder(places, id(places.gazetteer), id(places.remote))
+
+# Suggestions, selection and coordinates of several address fields ({name: (text, selected)}),
+# looked up in parallel. Fields are keyed per session so newer keystrokes only stale their own lookups
+def lookup_places(fields):
+    ctx = get_script_run_ctx()
+    session = ctx.session_id if ctx is not None else ''
+    with telemetry.timer('geocoding_lookup_seconds', endpoint='fields'):
+        results = get_geocoder().lookup({f"{session}:{name}": value for name, value in fields.items()})
+    return {name: results[f"{session}:{name}"] for name in fields}
+
+# Metrics are process-wide, shared by all sessions. With METRICS_PATH set they are written
+# every 15 s, as Prometheus text (e.g. for node_exporter's textfile collector) or as .json
+@st.cache_resource
+def start_metrics_export():
+    file_path = get_secret("METRICS_PATH")
+    return telemetry.export_periodically(file_path) if file_path else None
+
+# Latency percentiles and counters for the admin panel
+def metrics_tables():
+    snapshot = telemetry.snapshot()
+    latencies = pd.DataFrame([{
+        'metric': entry['name'],
+        'labels': ', '.join(f'{key}={value}' for key, value in entry['labels'].items()),
+        'count': entry['count'],
+        'mean_ms': 1000 * entry['sum'] / entry['count'] if entry['count'] else np.nan,
+        'p50_ms': 1000 * telemetry.REGISTRY.histogram(entry['name'], **entry['labels']).quantile(0.5),
+        'p99_ms': 1000 * telemetry.REGISTRY.histogram(entry['name'], **entry['labels']).quantile(0.99),
+    } for entry in snapshot['histograms']], columns=['metric', 'labels', 'count', 'mean_ms', 'p50_ms', 'p99_ms'])
+    counters = pd.DataFrame([{
+        'metric': entry['name'],
+        'labels': ', '.join(f'{key}={value}' for key, value in entry['labels'].items()),
+        'value': entry['value'],
+    } for entry in snapshot['counters']], columns=['metric', 'labels', 'value'])
+    return latencies, counters
 
 def day_of_week_to_int(day_of_week):
     days = {
@@ -59,8 +178,8 @@ def predict_tip_amount(hour:int = 14,
                        gps_distance:float= 5.2,
                        pickup_latitude:float= 40.748817,
                        pickup_longitude:float= -73.985428):
-    # Load the model
-    model = joblib.load('./outputs/models/tip_amount_model.pkl')
+    # Load the model (cached per process)
+    model = cached_model('./outputs/models/tip_amount_model.pkl')
     
 
     input_X = constructInputdf(hour,
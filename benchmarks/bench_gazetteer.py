@@ -0,0 +1,67 @@
+"""
+Measure build time and autocomplete latency of the local gazetteer.
+
+Indexes the bundled NYC places plus synthetic street addresses ("1234 W 45th St") and times
+autocomplete for prefixes of random places, typed one character at a time as in the app.
+
+Usage:
+    python -m benchmarks.bench_gazetteer --size 1e6
+"""
+import argparse
+import time
+import numpy as np
+from app.gazetteer import Gazetteer
+from src.functions import logger
+
+STREETS: list = ['Broadway', 'Amsterdam Ave', 'Lexington Ave', 'Park Ave', 'Flatbush Ave', 'Queens Blvd',
+                 'Atlantic Ave', 'Grand Concourse', 'Ocean Pkwy', 'Northern Blvd']
+
+def synthetic_addresses(n: int, seed: int = 0) -> list:
+    """
+    n (name, latitude, longitude, borough) street addresses around Manhattan.
+    """
+    rng = np.random.default_rng(seed)
+    numbers = rng.integers(1, 3000, n)
+    kinds = rng.integers(0, 3, n)
+    streets = rng.integers(1, 230, n)
+    named = rng.integers(0, len(STREETS), n)
+    lat = rng.normal(40.75, 0.05, n)
+    lon = rng.normal(-73.97, 0.05, n)
+    places = []
+    for i in range(n):
+        if kinds[i] == 0:
+            street = STREETS[named[i]]
+        else:
+            street = f"{'W' if kinds[i] == 1 else 'E'} {streets[i]}th St"
+        places.append((f"{numbers[i]} {street}", lat[i], lon[i], 'Manhattan'))
+    return places
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the local gazetteer.')
+    parser.add_argument('--csv', default='outputs/csvdata/nyc_gazetteer.csv')
+    parser.add_argument('--size', type=float, default=1_000_000, help='number of synthetic addresses')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    local = Gazetteer.from_csv(args.csv)
+    places = [(local.descriptions[row].split(', ')[0], *local.coordinates[row]) for row in range(len(local))]
+    places += synthetic_addresses(int(args.size), args.seed)
+    start = time.perf_counter()
+    gazetteer = Gazetteer(places)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    latencies, empty = [], 0
+    for row in rng.integers(0, len(places), args.queries):
+        name = places[row][0]
+        for length in range(1, min(len(name), 12) + 1):
+            start = time.perf_counter()
+            suggestions = gazetteer.autocomplete(name[:length])
+            latencies.append(time.perf_counter() - start)
+            empty += not suggestions
+
+    latencies = np.array(latencies) * 1e6
+    logger.info(f"{len(gazetteer):,} places indexed in {build_seconds:.1f}s")
+    logger.info(f"{len(latencies)} lookups: p50 {np.percentile(latencies, 50):.1f} us, "
+                f"p99 {np.percentile(latencies, 99):.1f} us, max {latencies.max():.1f} us, {empty} without suggestions")
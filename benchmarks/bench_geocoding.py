@@ -0,0 +1,160 @@
+"""
+Compare sequential and concurrent origin/destination geocoding against a local stub of the
+Places API that adds artificial latency to every request.
+
+The sequential path is what app.py did before: autocomplete and details for the origin, then
+for the destination, four round-trips. ConcurrentGeocoder resolves both fields in parallel.
+The script also checks that both paths give the same coordinates, that concurrent sessions do
+not queue behind each other, that lookups made stale by newer keystrokes skip their requests,
+and that the top suggestion's details are prefetched, and exits with status 1 when a check fails.
+
+Usage:
+    python -m benchmarks.bench_geocoding --latency-ms 150
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.geocoding import GeocodingClient, ConcurrentGeocoder
+from src.functions import logger
+
+# Sessions looked up at once. Together they may take a few times the two round-trips of one
+# lookup, plus some time for starting threads and connections
+SESSIONS: int = 16
+MAX_SLOWDOWN: float = 3.0
+OVERHEAD_SECONDS: float = 0.2
+
+class StubServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 makes simultaneous connections wait for SYN retries
+    request_queue_size = 128
+    daemon_threads = True
+
+def start_stub(latency: float) -> tuple:
+    """
+    Serve /autocomplete/json and /details/json on a free local port, each answer delayed by latency seconds.
+
+    Returns:
+        tuple: The server, its base URL and a dict counting the requests per endpoint.
+    """
+    counts = {'autocomplete': 0, 'details': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            endpoint = url.path.strip('/').split('/')[0]
+            with lock:
+                counts[endpoint] = counts.get(endpoint, 0) + 1
+            time.sleep(latency)
+            if endpoint == 'autocomplete':
+                text = query['input']
+                body = {'predictions': [{'description': f"{text} {i}, New York, NY", 'place_id': f"{text}|{i}"}
+                                        for i in range(3)]}
+            else:
+                seed = zlib.crc32(query['place_id'].encode())
+                body = {'result': {'geometry': {'location': {'lat': 40.5 + seed % 5000 / 10000,
+                                                             'lng': -74.2 + seed // 5000 % 5000 / 10000}}}}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = StubServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", counts
+
+def sequential(client: GeocodingClient, origin: str, destination: str) -> dict:
+    """
+    The four lookups one after another, top suggestion of each field.
+    """
+    locations = {}
+    for name, text in (('origin', origin), ('destination', destination)):
+        suggestions = client.autocomplete(text)
+        locations[name] = client.details(suggestions[0]['place_id'])
+    return locations
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure concurrent geocoding against a slow stub server.')
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='delay the stub adds to every request')
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+    server, base_url, counts = start_stub(latency)
+
+    failures = []
+
+    # Fresh clients, so no lookup is answered from a cache
+    start = time.perf_counter()
+    expected = sequential(GeocodingClient('key', base_url=base_url), 'times square', 'jfk airport')
+    sequential_seconds = time.perf_counter() - start
+
+    geocoder = ConcurrentGeocoder(GeocodingClient('key', base_url=base_url))
+    start = time.perf_counter()
+    results = geocoder.lookup({'origin': ('times square', None), 'destination': ('jfk airport', None)})
+    concurrent_seconds = time.perf_counter() - start
+    same = all(results[name]['location'] == expected[name] for name in expected)
+    logger.info(f"{args.latency_ms:.0f} ms per request: sequential {sequential_seconds * 1000:.0f} ms, "
+                f"concurrent {concurrent_seconds * 1000:.0f} ms ({sequential_seconds / concurrent_seconds:.1f}x), "
+                f"same coordinates: {same}")
+    if not same:
+        failures.append('concurrent lookups returned other coordinates than sequential ones')
+
+    # Many sessions at once, with a single background thread: each lookup runs on threads of its own,
+    # so all of them take about two round-trips (autocomplete, then details)
+    geocoder = ConcurrentGeocoder(GeocodingClient('key', base_url=base_url), max_workers=1)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=geocoder.lookup, args=({f'{i}:origin': (f'penn {i}', None),
+                                                                  f'{i}:destination': (f'jfk {i}', None)},))
+               for i in range(SESSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sessions_seconds = time.perf_counter() - start
+    logger.info(f"{SESSIONS} sessions at once: {sessions_seconds * 1000:.0f} ms")
+    limit = MAX_SLOWDOWN * 2 * latency + OVERHEAD_SECONDS
+    if sessions_seconds > limit:
+        failures.append(f"{SESSIONS} concurrent sessions took {sessions_seconds * 1000:.0f} ms, "
+                        f"more than {limit * 1000:.0f} ms")
+
+    # One worker and a burst of keystrokes: queued lookups of outdated text make no requests. The
+    # first may start before newer text arrives, the last is never stale
+    geocoder = ConcurrentGeocoder(GeocodingClient('key', base_url=base_url), max_workers=1)
+    before = dict(counts)
+    keystrokes = ('t', 'ti', 'tim', 'time', 'times')
+    futures = [geocoder.submit('session:origin', text) for text in keystrokes]
+    outcomes = [future.result() for future in futures]
+    stale = sum(outcome is None for outcome in outcomes)
+    sent = counts['autocomplete'] - before['autocomplete']
+    logger.info(f"{len(keystrokes)} keystrokes: {stale} lookups dropped as stale, {sent} autocomplete requests sent")
+    if stale < len(keystrokes) - 2 or outcomes[-1] is None or sent > 2:
+        failures.append(f"stale lookups were not dropped: {stale} stale, {sent} autocomplete requests")
+
+    # Picking the second suggestion prefetches the top one's details, switching back is a cache hit
+    client = GeocodingClient('key', base_url=base_url)
+    geocoder = ConcurrentGeocoder(client)
+    geocoder.lookup({'origin': ('penn station', 'penn station 1, New York, NY')})
+    time.sleep(latency * 2)
+    hits = client.stats['hits']
+    start = time.perf_counter()
+    geocoder.lookup({'origin': ('penn station', None)})
+    hits = client.stats['hits'] - hits
+    logger.info(f"Back to the top suggestion after the prefetch: {(time.perf_counter() - start) * 1000:.1f} ms, "
+                f"{hits} cache hits")
+    if hits != 2:
+        failures.append(f"switching back to the top suggestion made {2 - hits} requests")
+    server.shutdown()
+
+    for failure in failures:
+        logger.info(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
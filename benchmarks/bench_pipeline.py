@@ -0,0 +1,207 @@
+"""
+Benchmark every src.functions pipeline stage on synthetic data.
+
+For each size the synthetic trips are written to a temporary CSV and pushed through the
+pipeline in main.py order, several times. Wall time, throughput and peak memory are recorded
+per stage, as the median over the repeats. Results can be saved as a JSON baseline and
+compared against a stored one: a stage whose time or peak memory grew by more than the
+threshold, and by more than a small absolute amount (so that noise on stages taking a few
+milliseconds is ignored), is reported as a regression and the command exits with status 1.
+No real dataset or network access is needed.
+
+Usage:
+    python -m benchmarks.bench_pipeline --sizes 1e4 1e5 --save baseline.json
+    python -m benchmarks.bench_pipeline --sizes 1e4 1e5 --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import sklearn
+from src.functions import (load_data, drop_nulls_and_columns, create_time_features, remove_outliers,
+                           create_geo_features, split_data, train_tree, make_prediction, logger)
+from src.instrument import configure, rss_kb, reset_peak_rss
+from benchmarks.synthetic import generate_trips
+
+SIZES: list = [10_000, 100_000, 1_000_000]
+REPEATS: int = 3
+# Growth below these is noise, whatever the relative change
+MIN_SECONDS_DELTA: float = 0.05
+MIN_PEAK_MB_DELTA: float = 16.0
+DROP_COLUMNS: list = ['store_and_fwd_flag']
+OUTLIER_COLUMNS: list = ['pickup_longitude', 'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude']
+FEATURES: list = ['start_hour', 'start_minute', 'passenger_count', 'pickup_longitude', 'pickup_latitude',
+                  'dropoff_longitude', 'dropoff_latitude', 'rate_code', 'day_of_week', 'gps_distance']
+TARGET: str = 'fare_amount'
+MAX_DEPTH: int = 10
+PREDICTION_CALLS: int = 1000
+
+def measure(stage: str, size: int, rows: int, func, *args, **kwargs):
+    """
+    Run one stage, recording wall time, throughput and peak memory.
+
+    Peak memory is the growth of the resident set's high-water mark during the stage on Linux,
+    and the peak of tracemalloc elsewhere (which slows Python-heavy stages down).
+
+    Args:
+        stage (str): Stage name.
+        size (int): The benchmark size the stage belongs to.
+        rows (int): Rows (or calls) processed by the stage, for the throughput.
+        func (callable): The stage to run with args and kwargs.
+
+    Returns:
+        tuple: The stage's return value and its result record (dict).
+    """
+    use_rss = reset_peak_rss()
+    if use_rss:
+        before = rss_kb('VmRSS:')
+    else:
+        tracemalloc.start()
+    start = time.perf_counter()
+    output = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    if use_rss:
+        peak = (rss_kb('VmHWM:') - before) * 1024
+    else:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    record = {'size': size, 'stage': stage, 'rows': rows, 'seconds': seconds,
+              'rows_per_second': rows / seconds if seconds > 0 else float('inf'), 'peak_mb': peak / 2 ** 20}
+    logger.info(f"{size:>10} {stage:<24} {seconds:9.3f}s {record['rows_per_second']:14,.0f} rows/s {record['peak_mb']:9.1f} MB")
+    return output, record
+
+def _predict_many(tree, reg, rows: pd.DataFrame) -> None:
+    for row in rows.itertuples():
+        make_prediction(row.start_hour, row.start_minute, row.day_of_week, row.pickup_latitude, row.pickup_longitude,
+                        row.dropoff_latitude, row.dropoff_longitude, [TARGET], [tree], ['tip_amount'], [reg])
+
+def run_stages(csv_path: str, size: int) -> list:
+    """
+    Run the pipeline stages once over a trips CSV.
+
+    Returns:
+        list: One result record per stage.
+    """
+    from sklearn.linear_model import LinearRegression
+
+    records = []
+    df, record = measure('load_data', size, size, load_data, csv_path, 1.0)
+    records.append(record)
+    df, record = measure('drop_nulls_and_columns', size, len(df), drop_nulls_and_columns, df, DROP_COLUMNS)
+    records.append(record)
+    df, record = measure('create_time_features', size, len(df), create_time_features, df)
+    records.append(record)
+    df, record = measure('remove_outliers', size, len(df), remove_outliers, df, OUTLIER_COLUMNS)
+    records.append(record)
+    df, record = measure('create_geo_features', size, len(df), create_geo_features, df)
+    records.append(record)
+    splits, record = measure('split_data', size, len(df), split_data, df, FEATURES, TARGET)
+    records.append(record)
+    X_train, X_val, X_test, y_train, y_val, y_test = splits
+    tree, record = measure('train_tree', size, len(X_train), train_tree, X_train, y_train, X_val, y_val, MAX_DEPTH)
+    records.append(record)
+
+    reg = LinearRegression().fit(df[['start_hour', 'day_of_week', 'gps_distance', 'pickup_latitude', 'pickup_longitude']].to_numpy(), df['tip_amount'])
+    calls = df.head(PREDICTION_CALLS)
+    _, record = measure('make_prediction', size, len(calls), _predict_many, tree, reg, calls)
+    records.append(record)
+    return records
+
+def run_size(size: int, work_dir: str, seed: int = 0, repeats: int = REPEATS) -> list:
+    """
+    Benchmark all stages for one synthetic dataset size.
+
+    Args:
+        size (int): Number of synthetic trips.
+        work_dir (str): Directory for the temporary CSV.
+        seed (int): Seed for the data generator (default: 0).
+        repeats (int): Runs of the pipeline, the records hold the median of each metric (default: 3).
+
+    Returns:
+        list: One result record per stage.
+    """
+    csv_path = os.path.join(work_dir, f'trips_{size}.csv')
+    generate_trips(size, seed).to_csv(csv_path, index=False)
+    runs = [run_stages(csv_path, size) for _ in range(repeats)]
+    os.remove(csv_path)
+
+    records = []
+    for stage_runs in zip(*runs):
+        record = dict(stage_runs[0], repeats=repeats)
+        for metric in ('seconds', 'rows_per_second', 'peak_mb'):
+            record[metric] = float(np.median([run[metric] for run in stage_runs]))
+        records.append(record)
+    return records
+
+def compare(results: list, baseline: dict, threshold: float, min_seconds: float = MIN_SECONDS_DELTA,
+            min_peak_mb: float = MIN_PEAK_MB_DELTA) -> list:
+    """
+    Find stages that got slower or used more memory than the baseline allows.
+
+    Args:
+        results (list): Records from this run.
+        baseline (dict): A report saved by a previous run.
+        threshold (float): Allowed relative growth, e.g. 0.25 for 25%.
+        min_seconds (float): Time growth ignored whatever the relative change (default: 0.05).
+        min_peak_mb (float): Peak memory growth ignored whatever the relative change (default: 16.0).
+
+    Returns:
+        list: One message per regression.
+    """
+    reference = {(r['size'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for record in results:
+        base = reference.get((record['size'], record['stage']))
+        if base is None:
+            continue
+        for metric, floor in (('seconds', min_seconds), ('peak_mb', min_peak_mb)):
+            if base[metric] > 0 and record[metric] > base[metric] * (1 + threshold) and record[metric] - base[metric] > floor:
+                regressions.append(f"{record['stage']} at {record['size']} rows: {metric} "
+                                   f"{base[metric]:.3f} -> {record[metric]:.3f} (+{record[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+def environment() -> dict:
+    """
+    Describe the machine and library versions, stored with the results for context.
+    """
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'sklearn': sklearn.__version__}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the training pipeline stages on synthetic trips.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=SIZES, help='numbers of synthetic trips')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='runs per size, the median of each metric is kept')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against this JSON file of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative growth before flagging a regression')
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS_DELTA, help='time growth always ignored')
+    parser.add_argument('--min-peak-mb', type=float, default=MIN_PEAK_MB_DELTA, help='peak memory growth always ignored')
+    args = parser.parse_args()
+    # measure() takes its own readings, the stage records would reset the peak under it
+    configure(enabled=False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in args.sizes:
+            results.extend(run_size(int(size), work_dir, args.seed, args.repeats))
+
+    report = {'environment': environment(), 'results': results}
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2)
+        logger.info(f"Saved benchmark results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_seconds, args.min_peak_mb)
+        for message in regressions:
+            logger.warning(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+        logger.info("No regressions against the baseline")
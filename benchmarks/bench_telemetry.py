@@ -0,0 +1,54 @@
+"""
+Measure the overhead of the telemetry instrumentation.
+
+Times an empty telemetry.timer block and a counter increment, and make_prediction with the
+metrics switched on and off, with the models in outputs/models/.
+
+Usage:
+    python -m benchmarks.bench_telemetry --repeat 200
+"""
+import argparse
+import time
+import numpy as np
+from src import telemetry
+from src.functions import make_prediction, load_model, load_tree_models, logger
+from src.score import MODELS_PATH, TREE_TARGETS, REG_TARGETS
+
+def per_call(function, repeat: int) -> float:
+    """
+    Median seconds per call of function over repeat calls, in 5 rounds.
+    """
+    rounds = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        rounds.append((time.perf_counter() - start) / repeat)
+    return float(np.median(rounds))
+
+def empty_timer():
+    with telemetry.timer('bench_seconds', step='empty'):
+        pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the overhead of src.telemetry.')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    timer_seconds = per_call(empty_timer, args.repeat * 100)
+    count_seconds = per_call(lambda: telemetry.count('bench_total', step='empty'), args.repeat * 100)
+    logger.info(f"timer {timer_seconds * 1e6:.2f} us, counter {count_seconds * 1e6:.2f} us per call")
+
+    tree_targets, tree_models = load_tree_models(MODELS_PATH, TREE_TARGETS)
+    reg_models = [load_model(f'{MODELS_PATH}{target}_model.pkl') for target in REG_TARGETS]
+    quote = lambda: make_prediction(8, 30, 1, 40.75, -73.98, 40.64, -73.78,
+                                    tree_targets, tree_models, REG_TARGETS, reg_models)
+    # Alternate between the two settings so drift of the machine affects both alike
+    results = {False: [], True: []}
+    for _ in range(20):
+        for enabled in (False, True):
+            telemetry.configure(enabled=enabled)
+            results[enabled].append(per_call(quote, args.repeat))
+    results = {enabled: float(np.median(seconds)) for enabled, seconds in results.items()}
+    logger.info(f"make_prediction: {results[False] * 1e6:.1f} us without metrics, {results[True] * 1e6:.1f} us with "
+                f"({100 * (results[True] / results[False] - 1):+.1f}%)")
@@ -0,0 +1,81 @@
+"""
+Build the historical trip index over synthetic trips and measure query latency.
+
+Synthetic trips are written to a temporary CSV and indexed with build_trip_index. Queries use
+the day, hour and coordinates of randomly drawn trips, jittered by a few hundred metres. The
+first queries are checked against a brute-force scan of the same slot.
+
+Usage:
+    python -m benchmarks.bench_trip_index --size 5e6 --queries 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from src.functions import logger
+from src.timestamps import parse_timestamps, time_features
+from src.trip_index import TripIndex, build_trip_index, project
+from benchmarks.synthetic import generate_trips
+
+def brute_force(points: np.ndarray, query: np.ndarray, k: int, radius: float) -> np.ndarray:
+    """
+    4-D distances of the k nearest points with both ends within radius, by scanning all points.
+    """
+    pickup = np.hypot(points[:, 0] - query[0], points[:, 1] - query[1])
+    dropoff = np.hypot(points[:, 2] - query[2], points[:, 3] - query[3])
+    within = (pickup <= radius) & (dropoff <= radius)
+    return np.sort(np.hypot(pickup[within], dropoff[within]))[:k]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the latency of the historical trip index.')
+    parser.add_argument('--size', type=float, default=2_000_000, help='number of synthetic trips')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--checks', type=int, default=50, help='queries compared with a brute-force scan')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--radius', type=float, default=1.0, help='miles')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    trips = generate_trips(int(args.size), args.seed)
+    rng = np.random.default_rng(args.seed)
+    sample = trips.iloc[rng.choice(len(trips), args.queries, replace=False)]
+    features = time_features(parse_timestamps(sample['pickup_datetime']))
+    coordinates = sample[['pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude']].to_numpy()
+    coordinates = coordinates + rng.normal(0, 0.003, coordinates.shape)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, 'trips.csv')
+        trips.to_csv(csv_path, index=False)
+        del trips
+        start = time.perf_counter()
+        build_trip_index(os.path.join(work_dir, 'index'), [csv_path])
+        build_seconds = time.perf_counter() - start
+
+        index = TripIndex(os.path.join(work_dir, 'index'))
+        start = time.perf_counter()
+        for slot in range(len(index.offsets) - 1):
+            if index.offsets[slot + 1] > index.offsets[slot]:
+                index._tree(slot)
+        load_seconds = time.perf_counter() - start
+
+        latencies, found = [], []
+        for day_of_week, hour, query in zip(features['day_of_week'], features['start_hour'], coordinates):
+            start = time.perf_counter()
+            result = index.nearest(int(day_of_week), int(hour), *query, k=args.k, radius=args.radius)
+            latencies.append(time.perf_counter() - start)
+            found.append(len(result))
+
+        mismatches = 0
+        for day_of_week, hour, query in list(zip(features['day_of_week'], features['start_hour'], coordinates))[:args.checks]:
+            slot = int(day_of_week) * 24 + int(hour)
+            points = np.asarray(index._tree(slot).data)
+            expected = brute_force(points, project(*query)[0], args.k, args.radius)
+            result = index.nearest(int(day_of_week), int(hour), *query, k=args.k, radius=args.radius)
+            mismatches += not np.allclose(np.hypot(result['pickup_miles'], result['dropoff_miles']), expected)
+
+    latencies = np.array(latencies) * 1000
+    logger.info(f"{len(index):,} trips indexed in {build_seconds:.1f}s, all trees loaded in {load_seconds:.2f}s")
+    logger.info(f"{args.queries} queries: p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms, "
+                f"max {latencies.max():.2f} ms, {np.mean(found):.1f} trips found on average")
+    logger.info(f"{args.checks} queries checked against a brute-force scan, {mismatches} mismatches")
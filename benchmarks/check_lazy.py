@@ -0,0 +1,52 @@
+"""
+Check that the Polars lazy backend produces the same training matrix as the pandas pipeline,
+and time both.
+
+Synthetic trips are written to two temporary CSVs and run through main.py's pandas stages and
+through run_lazy. The frames of features and targets must be identical: values, dtypes and the
+row-number index. Needs polars.
+
+Usage:
+    python -m benchmarks.check_lazy --size 1e6
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+from src.functions import logger
+from src.instrument import configure
+from src.lazy import run_lazy
+from benchmarks.check_partitioned import single_process, DROP_COLUMNS, OUTLIER_COLUMNS, KEEP_COLUMNS
+from benchmarks.synthetic import generate_trips
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the Polars lazy backend with the pandas pipeline.')
+    parser.add_argument('--size', type=float, default=200_000, help='number of synthetic trips')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    configure(enabled=False)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        trips = generate_trips(int(args.size), args.seed)
+        half = len(trips) // 2
+        paths = [os.path.join(work_dir, 'part-1.csv'), os.path.join(work_dir, 'part-2.csv')]
+        trips.iloc[:half].to_csv(paths[0], index=False)
+        trips.iloc[half:].to_csv(paths[1], index=False)
+        del trips
+
+        start = time.perf_counter()
+        expected = single_process(paths, chunksize=1_000_000)
+        pandas_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = run_lazy(paths, 1.0, DROP_COLUMNS, OUTLIER_COLUMNS, keep_columns=KEEP_COLUMNS)
+        lazy_seconds = time.perf_counter() - start
+
+    logger.info(f"pandas {pandas_seconds:.2f}s, polars lazy {lazy_seconds:.2f}s, {len(expected)} vs {len(actual)} rows")
+    try:
+        pd.testing.assert_frame_equal(expected, actual)
+    except AssertionError as error:
+        logger.info(f"MISMATCH: {error}")
+        sys.exit(1)
+    logger.info("Lazy backend matches the pandas pipeline")
@@ -0,0 +1,73 @@
+"""
+Check that the partitioned pipeline reproduces the single-process one, and time both.
+
+Synthetic trips are written to a temporary CSV, split into two files to cover the multi-file
+case, and run through main.py's single-process stages and through run_partitioned with small
+partitions. The feature frames must be identical row for row.
+
+Usage:
+    python -m benchmarks.check_partitioned --size 1e6 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+from src.functions import (TAXI_SCHEMA, load_data, drop_nulls_and_columns, create_time_features, remove_outliers,
+                           create_geo_features, logger)
+from src.instrument import configure
+from src.partitioned import run_partitioned
+from benchmarks.synthetic import generate_trips
+
+DROP_COLUMNS: list = ['store_and_fwd_flag']
+OUTLIER_COLUMNS: list = ['pickup_longitude', 'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude']
+KEEP_COLUMNS: list = ['start_hour', 'start_minute', 'passenger_count', 'pickup_longitude', 'pickup_latitude',
+                      'dropoff_longitude', 'dropoff_latitude', 'rate_code', 'day_of_week', 'gps_distance',
+                      'fare_amount', 'trip_duration']
+
+def single_process(paths: list, chunksize: int) -> pd.DataFrame:
+    """
+    The main.py pipeline over all rows of the files.
+    """
+    columns = [column for column in TAXI_SCHEMA if column not in DROP_COLUMNS]
+    df = load_data(paths, 1.0, chunksize=chunksize, columns=columns)
+    df = drop_nulls_and_columns(df, DROP_COLUMNS)
+    df = create_time_features(df)
+    df = remove_outliers(df, OUTLIER_COLUMNS)
+    df = create_geo_features(df)
+    return df[KEEP_COLUMNS]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the partitioned pipeline with the single-process one.')
+    parser.add_argument('--size', type=float, default=200_000, help='number of synthetic trips')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--partition-mb', type=float, default=4.0)
+    args = parser.parse_args()
+    configure(enabled=False)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        trips = generate_trips(int(args.size), args.seed)
+        half = len(trips) // 2
+        paths = [os.path.join(work_dir, 'part-1.csv'), os.path.join(work_dir, 'part-2.csv')]
+        trips.iloc[:half].to_csv(paths[0], index=False)
+        trips.iloc[half:].to_csv(paths[1], index=False)
+        del trips
+
+        start = time.perf_counter()
+        expected = single_process(paths, chunksize=1_000_000)
+        single_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = run_partitioned(paths, 1.0, DROP_COLUMNS, OUTLIER_COLUMNS, keep_columns=KEEP_COLUMNS,
+                                 partition_bytes=int(args.partition_mb * 2 ** 20), workers=args.workers)
+        partitioned_seconds = time.perf_counter() - start
+
+    logger.info(f"single process {single_seconds:.2f}s, partitioned {partitioned_seconds:.2f}s, "
+                f"{len(expected)} vs {len(actual)} rows")
+    try:
+        pd.testing.assert_frame_equal(expected, actual)
+    except AssertionError as error:
+        logger.info(f"MISMATCH: {error}")
+        sys.exit(1)
+    logger.info("Partitioned output matches the single-process pipeline")
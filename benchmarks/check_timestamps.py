@@ -0,0 +1,80 @@
+"""
+Check that the fixed-format timestamp parser and the integer-math time features match the
+pandas implementation of create_time_features they replace, and time both.
+
+The time features are derived from the timestamp strings of synthetic trips (as read from a
+CSV without parse_dates) and from already parsed datetime64 columns (as load_data returns them
+with the taxi schema). Timestamps spanning 1901-2096, including leap days, are checked as well.
+
+Usage:
+    python -m benchmarks.check_timestamps --size 1e6
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.functions import create_time_features, logger
+from src.instrument import configure
+from src.timestamps import parse_timestamps
+from benchmarks.synthetic import generate_trips
+
+FEATURES: list = ['start_hour', 'start_minute', 'trip_duration', 'day_of_week']
+
+def reference_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    create_time_features as it was before src.timestamps, with pandas datetime accessors.
+    """
+    df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
+    df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
+
+    df['start_hour'] = df['pickup_datetime'].dt.hour
+    df['start_minute'] = df['pickup_datetime'].dt.minute
+    df['trip_duration'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
+    df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    return df
+
+def timed(function, *args) -> tuple:
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the fast time features with the pandas implementation.')
+    parser.add_argument('--size', type=float, default=1_000_000, help='number of synthetic trips')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    configure(enabled=False)
+
+    trips = generate_trips(int(args.size), args.seed)[['pickup_datetime', 'dropoff_datetime']]
+    parsed = trips.astype('datetime64[s]')
+    mismatches = 0
+    for name, frame in (('strings', trips), ('datetime64', parsed)):
+        expected, reference_seconds = timed(reference_time_features, frame.copy())
+        actual, fast_seconds = timed(create_time_features, frame.copy())
+        try:
+            pd.testing.assert_frame_equal(expected[FEATURES], actual[FEATURES])
+        except AssertionError as error:
+            logger.info(f"MISMATCH on {name}: {error}")
+            mismatches += 1
+        logger.info(f"{name}: pandas {reference_seconds:.3f}s, integer math {fast_seconds:.3f}s "
+                    f"({reference_seconds / fast_seconds:.1f}x)")
+
+    # Object strings with each value repeated 100 times, where memoizing pays off
+    repeated = np.repeat(trips['pickup_datetime'].to_numpy(dtype=object)[:len(trips) // 100], 100)
+    memoized, memoized_seconds = timed(parse_timestamps, repeated, True)
+    plain, plain_seconds = timed(parse_timestamps, repeated)
+    logger.info(f"repeated object strings: parse {plain_seconds:.3f}s, memoized {memoized_seconds:.3f}s")
+    mismatches += int((memoized != plain).any())
+
+    # Wide range of dates, including leap days and dates before the epoch
+    rng = np.random.default_rng(args.seed)
+    seconds = rng.integers(-2_177_452_800, 3_993_465_600, 1_000_000)
+    wide = pd.Series(np.datetime_as_string(seconds.astype('datetime64[s]'), unit='s')).str.replace('T', ' ')
+    if not (parse_timestamps(wide) == seconds).all():
+        logger.info("MISMATCH on the 1901-2096 timestamps")
+        mismatches += 1
+
+    if mismatches:
+        sys.exit(1)
+    logger.info("Time features match the pandas implementation")
@@ -0,0 +1,93 @@
+"""
+Check that FlatTree predicts exactly what sklearn's DecisionTreeRegressor.predict does for
+the stored tree models, and time both.
+
+Every model is compared as exported from the pickle and as loaded from its .npz, on a seeded
+batch of synthetic trips run through the feature pipeline, on rows drawn uniformly over the
+feature ranges and on rows sitting exactly on split thresholds (where the float32 cast and the
+<= rule matter), in one batch and one row at a time.
+
+Usage:
+    python -m benchmarks.check_tree_engine --size 1e5
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.functions import (load_model, drop_nulls_and_columns, create_time_features, create_geo_features, logger)
+from src.instrument import configure
+from src.tree_engine import FlatTree, LEAF
+from benchmarks.synthetic import generate_trips
+
+MODELS: list = ['outputs/models/tree_fare_amount.pkl', 'outputs/models/tree_trip_duration.pkl']
+FEATURES: list = ['start_hour', 'start_minute', 'passenger_count', 'pickup_longitude', 'pickup_latitude',
+                  'dropoff_longitude', 'dropoff_latitude', 'rate_code', 'day_of_week', 'gps_distance']
+SINGLE_ROWS: int = 1000
+
+def trip_features(size: int, seed: int) -> np.ndarray:
+    """
+    The model features of synthetic trips, as main.py computes them.
+    """
+    df = drop_nulls_and_columns(generate_trips(size, seed), ['store_and_fwd_flag'])
+    df = create_geo_features(create_time_features(df))
+    return df[FEATURES].to_numpy(dtype=np.float64)
+
+def threshold_rows(model, base: np.ndarray) -> np.ndarray:
+    """
+    Copies of base rows with one feature set to a split threshold of the tree, one per split node.
+    """
+    tree = model.tree_
+    splits = np.flatnonzero(tree.children_left != LEAF)
+    rows = base[np.arange(len(splits)) % len(base)].copy()
+    rows[np.arange(len(splits)), tree.feature[splits]] = tree.threshold[splits]
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare FlatTree predictions with sklearn for the stored trees.')
+    parser.add_argument('models', nargs='*', default=MODELS, help='pickled DecisionTreeRegressor files')
+    parser.add_argument('--size', type=float, default=100_000, help='number of synthetic trips')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    configure(enabled=False)
+
+    trips = trip_features(int(args.size), args.seed)
+    rng = np.random.default_rng(args.seed)
+    uniform = rng.uniform(trips.min(axis=0), trips.max(axis=0), (len(trips) // 10, trips.shape[1]))
+    mismatches = 0
+    for model_path in args.models:
+        model = load_model(model_path)
+        flat_trees = {'exported': FlatTree.from_model(model)}
+        npz_path = os.path.splitext(model_path)[0] + '.npz'
+        if os.path.exists(npz_path):
+            flat_trees['npz'] = FlatTree.load(npz_path)
+        batches = {'trips': trips, 'uniform': uniform, 'thresholds': threshold_rows(model, trips)}
+
+        for batch_name, X in batches.items():
+            frame = pd.DataFrame(X, columns=model.feature_names_in_) if hasattr(model, 'feature_names_in_') else X
+            start = time.perf_counter()
+            expected = model.predict(frame)
+            sklearn_seconds = time.perf_counter() - start
+            for tree_name, flat in flat_trees.items():
+                start = time.perf_counter()
+                actual = flat.predict(X)
+                flat_seconds = time.perf_counter() - start
+                if not np.array_equal(actual, expected):
+                    logger.info(f"MISMATCH {model_path} {tree_name} on {batch_name}: "
+                                f"{int((actual != expected).sum())} of {len(X)} predictions differ")
+                    mismatches += 1
+                logger.info(f"{os.path.basename(model_path)} {tree_name} {batch_name} ({len(X)} rows): "
+                            f"sklearn {sklearn_seconds:.3f}s, flat {flat_seconds:.3f}s")
+
+                # One row at a time, as make_prediction calls it
+                rows = X[:SINGLE_ROWS]
+                singles = np.array([flat.predict(row[None, :])[0] for row in rows])
+                walked = np.array([flat.predict_one(row) for row in rows])
+                if not (np.array_equal(singles, expected[:SINGLE_ROWS]) and np.array_equal(walked, expected[:SINGLE_ROWS])):
+                    logger.info(f"MISMATCH {model_path} {tree_name} on single rows of {batch_name}")
+                    mismatches += 1
+
+    if mismatches:
+        sys.exit(1)
+    logger.info("FlatTree predictions match sklearn")
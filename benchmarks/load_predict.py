@@ -0,0 +1,136 @@
+"""
+Load generator for the prediction service (src/serve.py).
+
+Opens a number of keep-alive connections and has each send single-trip POST /predict requests
+back to back, with trips drawn from the synthetic generator. Reports throughput and the p50,
+p99 and max latency, and the batching the service achieved.
+
+Usage:
+    python -m src.serve &
+    python -m benchmarks.load_predict --concurrency 64 --requests 20000
+
+    python -m benchmarks.load_predict --serve   # starts and stops the service itself
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+from src.serve import HOST, PORT, REQUIRED_FIELDS
+from src.timestamps import parse_timestamps, time_features
+from benchmarks.synthetic import generate_trips
+
+def make_bodies(n: int, seed: int = 0) -> list:
+    """
+    Encode n synthetic trips as /predict request bodies.
+    """
+    trips = generate_trips(n, seed)
+    trips = trips.assign(**time_features(parse_timestamps(trips['pickup_datetime'])))
+    records = trips[REQUIRED_FIELDS + ['passenger_count', 'rate_code']].to_dict('records')
+    return [json.dumps({key: float(value) for key, value in record.items()}).encode() for record in records]
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, method: str,
+                   path: str, body: bytes = b'') -> tuple:
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    return status, await reader.readexactly(length)
+
+async def _client(host: str, port: int, bodies: list, latencies: list, errors: list) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, host, 'POST', '/predict', body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def run_load(host: str, port: int, concurrency: int, requests: int, seed: int = 0) -> dict:
+    """
+    Send requests single-trip predictions over concurrency connections.
+
+    Returns:
+        dict: Requests per second, latency percentiles in ms, error count and the service's batch statistics.
+    """
+    bodies = make_bodies(requests, seed)
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, bodies[i::concurrency], latencies, errors) for i in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await _request(reader, writer, host, 'GET', '/health')
+    writer.close()
+    stats = json.loads(stats)
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': seconds,
+        'throughput': len(latencies) / seconds,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'mean_batch_size': stats['trips'] / max(stats['batches'], 1),
+    }
+
+async def _wait_until_up(host: str, port: int, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+async def main(args) -> dict:
+    await _wait_until_up(args.host, args.port)
+    return await run_load(args.host, args.port, args.concurrency, args.requests, args.seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure throughput and latency of the prediction service.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--concurrency', type=int, default=64, help='number of concurrent connections')
+    parser.add_argument('--requests', type=int, default=20_000, help='total number of requests')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--serve', action='store_true', help='start the service in a subprocess for the run')
+    parser.add_argument('--max-batch-size', type=int, default=None, help='with --serve, passed to the service')
+    parser.add_argument('--max-wait-ms', type=float, default=None, help='with --serve, passed to the service')
+    args = parser.parse_args()
+
+    service = None
+    if args.serve:
+        command = [sys.executable, '-m', 'src.serve', '--host', args.host, '--port', str(args.port)]
+        if args.max_batch_size is not None:
+            command += ['--max-batch-size', str(args.max_batch_size)]
+        if args.max_wait_ms is not None:
+            command += ['--max-wait-ms', str(args.max_wait_ms)]
+        service = subprocess.Popen(command)
+    try:
+        result = asyncio.run(main(args))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    print(f"{result['requests']} requests over {args.concurrency} connections in {result['seconds']:.2f}s, "
+          f"{result['errors']} errors")
+    print(f"throughput {result['throughput']:,.0f} req/s, p50 {result['p50_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms, mean batch {result['mean_batch_size']:.1f} trips")
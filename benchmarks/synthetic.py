@@ -0,0 +1,118 @@
+"""
+Synthetic NYC-taxi-shaped trips for benchmarking without the real dataset.
+
+The frame has the columns of outputs/csvdata/JFK_trips.csv. Pickups are drawn from a mixture
+of Manhattan, Brooklyn, Queens and airport hotspots, dropoffs lie at a log-normally distributed
+distance in a random direction, pickup times follow a daily demand curve over 2014 and
+durations follow the distance at a rush-hour-dependent speed. A small share of rows carries the
+defects the pipeline has to clean: zero coordinates, zero distances, reversed timestamps and
+missing store_and_fwd_flag values.
+"""
+import numpy as np
+import pandas as pd
+
+# (latitude, longitude, spread in degrees, weight)
+HOTSPOTS: list = [
+    (40.7580, -73.9855, 0.015, 0.45),  # Midtown
+    (40.7128, -74.0060, 0.012, 0.20),  # Downtown
+    (40.7831, -73.9712, 0.015, 0.15),  # Upper West/East Side
+    (40.6782, -73.9442, 0.020, 0.08),  # Brooklyn
+    (40.7282, -73.7949, 0.030, 0.04),  # Queens
+    (40.6413, -73.7781, 0.004, 0.05),  # JFK
+    (40.7769, -73.8740, 0.003, 0.03),  # LaGuardia
+]
+# Relative taxi demand per hour of day
+HOURLY_DEMAND: np.ndarray = np.array([
+    5, 4, 3, 2, 1.5, 1.5, 3, 5, 6, 6, 5.5, 5.5, 6, 6, 6, 6, 5.5, 6.5, 8, 8.5, 8, 7.5, 7, 6
+])
+COLUMNS: list = [
+    'vendor_id', 'pickup_datetime', 'dropoff_datetime', 'passenger_count', 'trip_distance',
+    'pickup_longitude', 'pickup_latitude', 'rate_code', 'store_and_fwd_flag', 'dropoff_longitude',
+    'dropoff_latitude', 'payment_type', 'fare_amount', 'surcharge', 'mta_tax', 'tip_amount',
+    'tolls_amount', 'total_amount', 'trip_duration',
+]
+
+def _format_timestamps(seconds: np.ndarray) -> np.ndarray:
+    # 'YYYY-MM-DD HH:MM:SS' strings, the layout of the taxi CSVs
+    return np.char.replace(np.datetime_as_string(seconds.astype('datetime64[s]'), unit='s'), 'T', ' ')
+
+def generate_trips(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate n synthetic taxi trips.
+
+    Args:
+        n (int): Number of trips.
+        seed (int): Random seed (default: 0).
+
+    Returns:
+        pd.DataFrame: The trips, with the columns of JFK_trips.csv.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(n)
+
+    weights = np.array([h[3] for h in HOTSPOTS])
+    spot = rng.choice(len(HOTSPOTS), size=n, p=weights / weights.sum())
+    centers = np.array([h[:3] for h in HOTSPOTS])[spot]
+    pickup_lat = centers[:, 0] + rng.normal(0, 1, n) * centers[:, 2]
+    pickup_lon = centers[:, 1] + rng.normal(0, 1, n) * centers[:, 2]
+
+    trip_distance = np.round(np.clip(rng.lognormal(0.6, 0.75, n), 0.1, 60), 2)
+    airport = spot >= 5
+    trip_distance[airport] = np.round(np.clip(rng.normal(17, 3, airport.sum()), 8, 40), 2)
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    # Straight-line displacement is about 75% of the driven distance, 1 degree latitude is 69 miles
+    dropoff_lat = pickup_lat + 0.75 * trip_distance * np.cos(bearing) / 69.0
+    dropoff_lon = pickup_lon + 0.75 * trip_distance * np.sin(bearing) / (69.0 * np.cos(np.radians(40.75)))
+
+    day = rng.integers(0, 365, n)
+    hour = rng.choice(24, size=n, p=HOURLY_DEMAND / HOURLY_DEMAND.sum())
+    pickup = (np.datetime64('2014-01-01T00:00:00', 's').astype(np.int64)
+              + day * 86400 + hour * 3600 + rng.integers(0, 3600, n))
+    rush = np.isin(hour, [8, 9, 17, 18, 19])
+    speed_mph = np.clip(rng.normal(np.where(rush, 9, 14), 3), 3, 40)
+    duration_seconds = np.round(trip_distance / speed_mph * 3600 + rng.exponential(60, n)).astype(np.int64)
+    dropoff = pickup + duration_seconds
+
+    rate_code = np.where(airport & (rng.random(n) < 0.6), 2, 1)
+    rare = rng.random(n) < 0.005
+    rate_code[rare] = rng.choice([3, 4, 5, 6], size=rare.sum())
+    fare_amount = np.round(np.where(rate_code == 2, 52.0,
+                                    2.5 + 2.5 * trip_distance + 0.4 * duration_seconds / 60 * rush), 1)
+    payment_type = np.where(rng.random(n) < 0.55, 'CRD', 'CSH')
+    tip_amount = np.where(payment_type == 'CRD', np.round(fare_amount * rng.uniform(0.1, 0.3, n), 2), 0.0)
+    surcharge = np.where((hour >= 20) | (hour < 6), 0.5, np.where(rush, 1.0, 0.0))
+    mta_tax = np.full(n, 0.5)
+    tolls_amount = np.where(airport & (rng.random(n) < 0.7), 5.33, 0.0)
+    total_amount = np.round(fare_amount + surcharge + mta_tax + tip_amount + tolls_amount, 2)
+    vendor_id = np.where(rng.random(n) < 0.5, 'VTS', 'CMT')
+    store_and_fwd_flag = np.where(vendor_id == 'CMT', np.where(rng.random(n) < 0.03, 'Y', 'N'), None)
+
+    # Dirty rows, as found in the raw data
+    zero = rng.random(n) < 0.015
+    pickup_lat[zero], pickup_lon[zero] = 0.0, 0.0
+    trip_distance[rng.random(n) < 0.01] = 0.0
+    reversed_times = rng.random(n) < 0.001
+    dropoff[reversed_times] = pickup[reversed_times] - 60
+
+    df = pd.DataFrame({
+        'vendor_id': vendor_id,
+        'pickup_datetime': _format_timestamps(pickup),
+        'dropoff_datetime': _format_timestamps(dropoff),
+        'passenger_count': rng.choice([1, 2, 3, 4, 5, 6], size=n, p=[0.7, 0.14, 0.04, 0.02, 0.06, 0.04]),
+        'trip_distance': trip_distance,
+        'pickup_longitude': np.round(pickup_lon, 6),
+        'pickup_latitude': np.round(pickup_lat, 6),
+        'rate_code': rate_code,
+        'store_and_fwd_flag': store_and_fwd_flag,
+        'dropoff_longitude': np.round(dropoff_lon, 6),
+        'dropoff_latitude': np.round(dropoff_lat, 6),
+        'payment_type': payment_type,
+        'fare_amount': fare_amount,
+        'surcharge': surcharge,
+        'mta_tax': mta_tax,
+        'tip_amount': tip_amount,
+        'tolls_amount': tolls_amount,
+        'total_amount': total_amount,
+        'trip_duration': (dropoff - pickup) / 60,
+    })
+    return df[COLUMNS]
@@ -1,10 +1,28 @@
 from src.functions import *
+from src.cache import cache_key, load_features, save_features
+from src.tree_engine import FlatTree
+from src.sweep import sweep
+from src.incremental import update_store, load_store
+from src.partitioned import run_partitioned
+from src.lazy import run_lazy
+from src.instrument import configure, write_report
 
 if __name__ == '__main__':
     DATA_PATH: str = '../data/ny_cab_csv/nyc_taxi_data_2014.csv'
     OUT_PATH: str = '../models/'
+    CACHE_PATH: str = '../cache/'
+    STORE_PATH: str = '../features/'
+    INCREMENTAL: bool = False
+    PARTITIONED: bool = False
+    WORKERS: int = None
+    BACKEND: str = 'pandas'  # or 'polars', one lazy query instead of the eager pandas stages
+    PROFILE: bool = False
     SAMPLE:float = 3e-2
+    CHUNK_SIZE: int = 1_000_000
+    RANDOM_STATE: int = 42
     DROP_COLUMNS: list = ['store_and_fwd_flag']
+    # Dropped columns are not read at all
+    LOAD_COLUMNS: list = [column for column in TAXI_SCHEMA if column not in DROP_COLUMNS]
     OUTLIER_COLUMNS: list = ['pickup_longitude', 'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude']
     FEATURES: list = [
         'start_hour',
@@ -25,16 +43,67 @@ if __name__ == '__main__':
     TRAIN_SIZE: float = 6e-1
     VAL_TEST_SPLIT: float = 5e-1
     MAX_DEPTH = 10
+    SWEEP: bool = False
+    MULTI_OUTPUT: bool = False  # one joint tree for all TARGETS instead of one tree per target
+    SWEEP_MAX_DEPTHS: list = [6, 8, 10, 12, 14, 16]
+    SWEEP_MIN_SAMPLES_LEAF: list = [1, 5, 20, 50]
     
-    df = load_data(DATA_PATH, SAMPLE)
-    df = drop_nulls_and_columns(df, DROP_COLUMNS)
-    df = create_time_features(df)
-    df = remove_outliers(df, OUTLIER_COLUMNS)
-    df = create_geo_features(df)
+    PARAMS: dict = {
+        'SAMPLE': SAMPLE,
+        'CHUNK_SIZE': CHUNK_SIZE,
+        'RANDOM_STATE': RANDOM_STATE,
+        'DROP_COLUMNS': DROP_COLUMNS,
+        'OUTLIER_COLUMNS': OUTLIER_COLUMNS,
+        'FEATURES': FEATURES,
+        'TARGETS': TARGETS,
+    }
+
+    configure(enabled=True, profile=PROFILE, trace_memory=PROFILE)
+
+    if INCREMENTAL:
+        # DATA_PATH may be a glob of monthly files, only the new ones are processed
+        update_store(DATA_PATH, STORE_PATH, PARAMS)
+        df = load_store(STORE_PATH)
+    else:
+        key = cache_key(DATA_PATH, {**PARAMS, 'PARTITIONED': PARTITIONED, 'BACKEND': BACKEND})
+        df = load_features(CACHE_PATH, key)
+        if df is None and BACKEND == 'polars':
+            df = run_lazy(DATA_PATH, SAMPLE, DROP_COLUMNS, OUTLIER_COLUMNS, keep_columns=FEATURES + TARGETS,
+                          random_state=RANDOM_STATE, columns=LOAD_COLUMNS)
+            save_features(df, CACHE_PATH, key)
+        elif df is None and PARTITIONED:
+            # Byte ranges of DATA_PATH on a process pool, sampled per partition
+            df = run_partitioned(DATA_PATH, SAMPLE, DROP_COLUMNS, OUTLIER_COLUMNS, keep_columns=FEATURES + TARGETS,
+                                 random_state=RANDOM_STATE, columns=LOAD_COLUMNS, workers=WORKERS)
+            save_features(df, CACHE_PATH, key)
+        elif df is None:
+            df = load_data(DATA_PATH, SAMPLE, chunksize=CHUNK_SIZE, random_state=RANDOM_STATE, columns=LOAD_COLUMNS)
+            df = drop_nulls_and_columns(df, DROP_COLUMNS)
+            df = create_time_features(df)
+            df = remove_outliers(df, OUTLIER_COLUMNS)
+            df = create_geo_features(df)
+            df = df[FEATURES + TARGETS]
+            save_features(df, CACHE_PATH, key)
     X_train, X_val, X_test, y_train, y_val, y_test = split_data(df, FEATURES, TARGETS, TRAIN_SIZE, VAL_TEST_SPLIT, random_state=42, shuffle=True)
     
-    for target in TARGETS:
-        tree = train_tree(X_train, y_train[target], X_val, y_val[target], MAX_DEPTH)
-        file_name = 'tree_' + str(target) + '.pkl'
-        file_path = OUT_PATH + file_name
-        pickle_model(tree, file_path)
\ No newline at end of file
+    multi_output_report = None
+    if SWEEP:
+        sweep(X_train, y_train, X_val, y_val, TARGETS, SWEEP_MAX_DEPTHS, SWEEP_MIN_SAMPLES_LEAF, OUT_PATH)
+    elif MULTI_OUTPUT:
+        tree = train_tree(X_train, y_train[TARGETS], X_val, y_val[TARGETS], MAX_DEPTH)
+        file_path = joint_tree_path(OUT_PATH, TARGETS)
+        pickle_model(tree, file_path)
+        FlatTree.from_model(tree).save(file_path[:-len('.pkl')] + '.npz')
+        write_tree_manifest(OUT_PATH, [TARGETS], [file_path])
+        multi_output_report = compare_multi_output(X_train, y_train, X_val, y_val, TARGETS, MAX_DEPTH)
+    else:
+        for target in TARGETS:
+            tree = train_tree(X_train, y_train[target], X_val, y_val[target], MAX_DEPTH)
+            file_name = 'tree_' + str(target) + '.pkl'
+            file_path = OUT_PATH + file_name
+            pickle_model(tree, file_path)
+            FlatTree.from_model(tree).save(OUT_PATH + 'tree_' + str(target) + '.npz')
+        write_tree_manifest(OUT_PATH, TARGETS, [OUT_PATH + 'tree_' + str(target) + '.pkl' for target in TARGETS])
+
+    write_report(OUT_PATH + 'run_report.json', {'params': PARAMS, 'sweep': SWEEP, 'incremental': INCREMENTAL, 'partitioned': PARTITIONED, 'backend': BACKEND,
+                                               'multi_output': multi_output_report})
@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import logging
+from src.functions import _resolve_paths
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler()
+stream_handler.setLevel(logging.INFO)
+logger.addHandler(stream_handler)
+
+# Modules whose code determines the contents of the feature matrix.
+PIPELINE_MODULES: list = ['functions.py', 'geo.py', 'timestamps.py', 'partitioned.py', 'lazy.py']
+
+def file_fingerprint(file_path) -> list:
+    """
+    Cheap fingerprint of the input files: absolute path, size and modification time of each.
+
+    Args:
+        file_path (str | list): A CSV path, a glob pattern, or a list of paths/globs.
+
+    Returns:
+        list: One [path, size, mtime_ns] entry per input file.
+    """
+    fingerprint = []
+    for path in _resolve_paths(file_path):
+        stat = os.stat(path)
+        fingerprint.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+def pipeline_code_version(modules: list = PIPELINE_MODULES) -> str:
+    """
+    Hash of the source code of the pipeline modules, so editing a stage invalidates the cache.
+
+    Args:
+        modules (list): File names of the src modules to hash (default: PIPELINE_MODULES).
+
+    Returns:
+        str: A hex digest of the pipeline source files.
+    """
+    digest = hashlib.sha256()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        with open(os.path.join(src_dir, module), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def cache_key(file_path, params: dict) -> str:
+    """
+    Content address of a feature matrix: a hash of the inputs, the parameters and the code version.
+
+    Args:
+        file_path (str | list): The input CSV path(s) given to load_data.
+        params (dict): The pipeline parameters (sample size, column lists, ...). Must be JSON serializable.
+
+    Returns:
+        str: The cache key.
+    """
+    payload = {
+        'inputs': file_fingerprint(file_path),
+        'params': params,
+        'code': pipeline_code_version(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def save_features(df: pd.DataFrame, cache_dir: str, key: str) -> str:
+    """
+    Save a feature matrix to the cache as one .npy file per column plus a metadata file.
+
+    The entry is written to a temporary directory and renamed into place, so a crashed run
+    never leaves a partial entry behind.
+
+    Args:
+        df (pd.DataFrame): The feature/target matrix to cache.
+        cache_dir (str): The cache root directory.
+        key (str): The cache key from cache_key.
+
+    Returns:
+        str: The directory of the cache entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, key)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+    for i, column in enumerate(df.columns):
+        np.save(os.path.join(tmp_dir, f'{i}.npy'), df[column].to_numpy())
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+        json.dump({'columns': list(df.columns), 'rows': len(df)}, file)
+
+    if os.path.exists(entry_dir):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, entry_dir)
+    logger.info(f"Cached features {df.shape} to {entry_dir}")
+    return entry_dir
+
+def load_features(cache_dir: str, key: str):
+    """
+    Load a cached feature matrix, memory-mapping its columns instead of reading them.
+
+    Args:
+        cache_dir (str): The cache root directory.
+        key (str): The cache key from cache_key.
+
+    Returns:
+        pd.DataFrame: The cached feature matrix, or None if there is no entry for the key.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    meta_path = os.path.join(entry_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as file:
+        meta = json.load(file)
+    columns = {column: np.load(os.path.join(entry_dir, f'{i}.npy'), mmap_mode='r')
+               for i, column in enumerate(meta['columns'])}
+    df = pd.DataFrame(columns, copy=False)
+    logger.info(f"Loaded cached features {df.shape} from {entry_dir}")
+    return df
@@ -3,9 +3,16 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.linear_model import LinearRegression
-from geopy.distance import geodesic
+from src.geo import gps_distance
+from src.timestamps import parse_timestamps, time_features
+from src.instrument import stage
+from src import telemetry
 import pickle
+import json
 import logging
+import glob
+import os
+import time
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -15,79 +22,258 @@ logger.addHandler(stream_handler)
 
 import pandas as pd
 
-def load_data(file_path: str, sample_size: float) -> pd.DataFrame:
+def _resolve_paths(file_path) -> list:
     """
-    Load data from a CSV file and return a sample of the specified size.
+    Expand a path, glob pattern or list of either into a sorted list of file paths.
 
     Args:
-        file_path (str): The path to the CSV file.
+        file_path (str | list): A CSV path, a glob such as 'yellow_tripdata_2014-*.csv', or a list of those.
+
+    Returns:
+        list: The matching file paths, in the order they should be read.
+    """
+    if isinstance(file_path, (list, tuple)):
+        return [path for item in file_path for path in _resolve_paths(item)]
+    if glob.has_magic(file_path):
+        paths = sorted(glob.glob(file_path))
+        if not paths:
+            raise FileNotFoundError(f'No files match {file_path}')
+        return paths
+    return [file_path]
+
+# Column types of the NYC taxi trip CSVs: 4-byte floats for coordinates and amounts (the trees
+# split in float32 anyway), nullable small integers for the codes, categoricals for the strings
+TAXI_SCHEMA: dict = {
+    'vendor_id': 'category',
+    'pickup_datetime': 'datetime64[s]',
+    'dropoff_datetime': 'datetime64[s]',
+    'passenger_count': 'Int8',
+    'trip_distance': 'float32',
+    'pickup_longitude': 'float32',
+    'pickup_latitude': 'float32',
+    'rate_code': 'Int8',
+    'store_and_fwd_flag': 'category',
+    'dropoff_longitude': 'float32',
+    'dropoff_latitude': 'float32',
+    'payment_type': 'category',
+    'fare_amount': 'float32',
+    'surcharge': 'float32',
+    'mta_tax': 'float32',
+    'tip_amount': 'float32',
+    'tolls_amount': 'float32',
+    'total_amount': 'float32',
+}
+TAXI_DATETIME_FORMAT: str = '%Y-%m-%d %H:%M:%S'
+
+def _read_options(path: str, columns: list, schema: dict) -> dict:
+    """
+    read_csv keyword arguments projecting a file onto the wanted columns of a schema. Without a
+    schema only the column selection applies and the dtypes are inferred.
+    """
+    if schema is None and columns is None:
+        return {}
+    wanted = set(columns if columns is not None else schema)
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [column for column in header if column in wanted]
+    if schema is None:
+        return {'usecols': usecols}
+    dates = [column for column in usecols if str(schema.get(column, '')).startswith('datetime64')]
+    dtype = {column: schema[column] for column in usecols if column in schema and column not in dates}
+    return {'usecols': usecols, 'dtype': dtype, 'parse_dates': dates, 'date_format': TAXI_DATETIME_FORMAT}
+
+@stage
+def load_data(file_path, sample_size: float, chunksize: int = None, random_state: int = None,
+              columns: list = None, schema: dict = TAXI_SCHEMA, engine: str = None) -> pd.DataFrame:
+    """
+    Load data from one or more CSV files and return a sample of the specified size.
+
+    Without a chunksize the files are read whole and sampled afterwards. With a chunksize
+    the files are streamed and every row is kept with probability sample_size (seeded
+    Bernoulli sampling), so peak memory is bounded by the sample plus a single chunk.
+
+    Only the columns of the schema (or the requested subset of them) are read, with the schema's
+    compact dtypes and the datetimes parsed with their fixed format.
+
+    Args:
+        file_path (str | list): The path to the CSV file, a glob pattern, or a list of paths/globs (e.g. monthly files).
         sample_size (float): The proportion of the data to sample. Should be a value between 0 and 1.
+        chunksize (int): Number of rows to read at a time. None reads each file in one go (default: None).
+        random_state (int | np.random.Generator): Seed or generator for the sampling, for reproducible samples (default: None).
+        columns (list): The columns to read. None reads every column of the schema present in the file (default: None).
+        schema (dict): Column name to dtype, datetime64 columns are parsed as datetimes. None reads the
+            columns with inferred dtypes (default: TAXI_SCHEMA).
+        engine (str): The read_csv parser, e.g. 'pyarrow' for multi-threaded parsing of whole files.
+            pandas does not support it together with a chunksize (default: None, the C parser).
 
     Returns:
         pd.DataFrame: A DataFrame containing the sampled data.
     """
-    df = pd.read_csv(file_path)
-    df = df.sample(int(len(df) * sample_size))
-    logger.info(f'Finished loading data. Shape: {df.shape}')
+    paths = _resolve_paths(file_path)
+
+    if chunksize is None:
+        df = pd.concat([pd.read_csv(path, engine=engine, **_read_options(path, columns, schema)) for path in paths],
+                       ignore_index=len(paths) > 1)
+        df = df.sample(int(len(df) * sample_size), random_state=random_state)
+    else:
+        rng = np.random.default_rng(random_state)
+        samples = []
+        for path in paths:
+            for chunk in pd.read_csv(path, chunksize=chunksize, engine=engine, **_read_options(path, columns, schema)):
+                samples.append(chunk[rng.random(len(chunk)) < sample_size])
+        df = pd.concat(samples, ignore_index=len(paths) > 1)
+
+    if schema is not None:
+        # Chunks with different category sets concatenate to strings, restore the categoricals
+        df = df.astype({column: 'category' for column in df.columns if schema.get(column) == 'category'})
+    logger.info(f'Finished loading data from {len(paths)} file(s). Shape: {df.shape}')
     return df
 
+@stage
 def drop_nulls_and_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame:
     """
     Drop specified columns and remove rows with null values from a DataFrame.
 
     Args:
         df (pd.DataFrame): The input DataFrame.
-        columns (list): A list of column names to be dropped.
+        columns (list): A list of column names to be dropped. Columns that were not loaded are ignored.
 
     Returns:
         pd.DataFrame: The modified DataFrame with dropped columns and removed rows with null values.
     """
-    df = df.drop(columns, axis=1)
+    df = df.drop(columns, axis=1, errors='ignore')
     df = df.dropna()
     logger.info("Dropped columns")
     return df
 
-def remove_outliers(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+def _quantile(values: np.ndarray, mask: np.ndarray, q: float) -> float:
     """
-    Remove outliers from the given DataFrame based on the specified columns.
+    Quantile of the values selected by mask, computed the same way as pd.Series.quantile.
+    """
+    return np.nanpercentile(values[mask], q * 100)
+
+def _iqr_bounds(column: str, lower_q: float = 0.08, upper_q: float = 0.92):
+    """
+    Threshold function for a widened inter-quantile range filter on column.
+    """
+    def bounds(quantile) -> tuple:
+        Q1 = quantile(column, lower_q)
+        Q3 = quantile(column, upper_q)
+        IQR = Q3 - Q1
+        return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+    return bounds
+
+def _quantile_bounds(column: str, lower_q: float = None, upper_q: float = None):
+    """
+    Threshold function returning the lower_q and upper_q quantiles of column.
+    """
+    def bounds(quantile) -> tuple:
+        lower = quantile(column, lower_q) if lower_q is not None else None
+        upper = quantile(column, upper_q) if upper_q is not None else None
+        return lower, upper
+    return bounds
+
+def outlier_rules(columns: list) -> list:
+    """
+    Build the ordered outlier rule set used by remove_outliers.
+
+    The rules are grouped into stages. Every quantile threshold in a stage is computed on the
+    rows that survived all previous stages, then the stage's rules are applied in order.
+    Each rule is a (name, columns, bounds, predicate) tuple: bounds is None for row-local rules
+    or, for data-dependent ones, a function quantile -> thresholds where quantile(column, q)
+    returns a quantile of the surviving rows. predicate is a function (arrays, thresholds) ->
+    boolean keep array. bounds and predicate only use operators, so they also build Polars
+    expressions when given expressions instead of arrays (see src.lazy).
+
+    Args:
+        columns (list): The columns to filter with the 8%/92% IQR rule.
+
+    Returns:
+        list: A list of stages, each a list of rules.
+    """
+    stages = [[('impossible_dates', ['pickup_datetime', 'dropoff_datetime'], None,
+                lambda a, t: ~(a['pickup_datetime'] > a['dropoff_datetime']))]]
+    for column in columns:
+        stages.append([(f'iqr_{column}', [column], _iqr_bounds(column),
+                        lambda a, t, column=column: (a[column] >= t[0]) & (a[column] <= t[1]))])
+    stages.append([
+        ('trip_distance_positive', ['trip_distance'], None, lambda a, t: a['trip_distance'] > 0),
+        ('fare_amount_max', ['fare_amount'], None, lambda a, t: a['fare_amount'] < 100),
+        ('trip_distance_max', ['trip_distance'], None, lambda a, t: a['trip_distance'] < 60),
+        ('tip_ratio', ['tip_amount', 'fare_amount'], None, lambda a, t: a['tip_amount'] / a['fare_amount'] < .4),
+    ])
+    stages.append([
+        ('dropoff_longitude_quantile', ['dropoff_longitude'], _quantile_bounds('dropoff_longitude', 0.02, 0.98),
+         lambda a, t: (a['dropoff_longitude'] < t[1]) & (a['dropoff_longitude'] > t[0])),
+        ('trip_duration_quantile', ['trip_duration'], _quantile_bounds('trip_duration', upper_q=.995),
+         lambda a, t: a['trip_duration'] < t[1]),
+        ('rate_code', ['rate_code'], None, lambda a, t: (a['rate_code'] == 1) | (a['rate_code'] == 2) |
+                                                         (a['rate_code'] == 3) | (a['rate_code'] == 4)),
+    ])
+    return stages
+
+def outlier_mask(df: pd.DataFrame, columns: list, thresholds: dict = None, rules: str = 'all') -> tuple:
+    """
+    Evaluate the outlier rule set as one boolean mask over the DataFrame's column arrays.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the data.
         columns (list): A list of column names to consider for outlier removal.
+        thresholds (dict): Precomputed thresholds per rule name. Missing ones are computed from the data (default: None).
+        rules (str): 'all', or only the 'row'-local or only the 'quantile' rules (default: 'all').
 
     Returns:
-        pd.DataFrame: The DataFrame with outliers removed.
+        tuple: The keep mask (np.ndarray), the number of rows each rule dropped (dict) and the thresholds used (dict).
     """
-    impossible_dates = df.query('pickup_datetime > dropoff_datetime').index
-    df = df.drop(impossible_dates, axis=0)
+    stages = [[rule for rule in stage if rules == 'all' or (rule[2] is None) == (rules == 'row')]
+              for stage in outlier_rules(columns)]
+    needed = {column for stage in stages for rule in stage for column in rule[1]}
+    arrays = {column: df[column].to_numpy() for column in needed}
+    thresholds = dict(thresholds or {})
+    mask = np.ones(len(df), dtype=bool)
+    drops = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for stage in stages:
+            for name, _, bounds, _ in stage:
+                if bounds is not None and name not in thresholds:
+                    thresholds[name] = bounds(lambda column, q: _quantile(arrays[column], mask, q))
+            for name, _, _, predicate in stage:
+                keep = mask & predicate(arrays, thresholds.get(name))
+                drops[name] = int(mask.sum() - keep.sum())
+                mask = keep
+    return mask, drops, thresholds
+
+@stage
+def remove_outliers(df: pd.DataFrame, columns: list, return_report: bool = False):
+    """
+    Remove outliers from the given DataFrame based on the specified columns.
 
-    for column in columns:
-        Q1 = df[column].quantile(0.08)
-        Q3 = df[column].quantile(0.92)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        df = df[(df[column] >= lower_bound) & (df[column] <= upper_bound)]
-    
-    df = df[df['trip_distance'] > 0]
-    df = df[df['fare_amount'] < 100]
-    df = df[df['trip_distance'] < 60]
-    df = df[df['tip_amount'] / df['fare_amount']<.4]
-    
-    trip_quant = df['trip_duration'].quantile(.995)
-    dropoff_max = df['dropoff_longitude'].quantile(0.98)
-    dropoff_min = df['dropoff_longitude'].quantile(0.02)
-    
-    df = df.query("dropoff_longitude < @dropoff_max and dropoff_longitude > @dropoff_min")
-    df = df.query("trip_duration < @trip_quant")
-    df = df.query("rate_code == 1 or rate_code == 2 or rate_code == 3 or rate_code == 4")
-    logger.info("Removed outliers")
+    All rules are combined into a single mask and the filtered DataFrame is built once.
+    Quantile thresholds are still computed on the rows left by the preceding rules.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the data.
+        columns (list): A list of column names to consider for outlier removal.
+        return_report (bool): Also return the number of rows dropped by each rule (default: False).
+
+    Returns:
+        pd.DataFrame: The DataFrame with outliers removed, or a (DataFrame, dict) tuple if return_report is True.
+    """
+    mask, drops, _ = outlier_mask(df, columns)
+    df = df[mask]
+    logger.info(f"Removed outliers: {len(mask) - len(df)} rows dropped ({drops})")
+    if return_report:
+        return df, drops
     return df
 
+@stage
 def create_time_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Create time-related features from the given DataFrame.
 
+    The datetimes (or their 'YYYY-MM-DD HH:MM:SS' strings) are reduced to epoch seconds and the
+    features derived with integer arithmetic, see src.timestamps.
+
     Args:
         df (pd.DataFrame): The input DataFrame containing pickup and dropoff datetime columns.
 
@@ -95,31 +281,40 @@ def create_time_features(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: The DataFrame with additional time-related features.
 
     """
-    df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
-    df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
-
-    df['start_hour'] = df['pickup_datetime'].dt.hour
-    df['start_minute'] = df['pickup_datetime'].dt.minute
-    df['trip_duration'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
-    df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    pickup = parse_timestamps(df['pickup_datetime'])
+    dropoff = parse_timestamps(df['dropoff_datetime'])
+    for column, seconds in (('pickup_datetime', pickup), ('dropoff_datetime', dropoff)):
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = seconds.view('datetime64[s]')
+
+    features = time_features(pickup, dropoff)
+    for column in ('start_hour', 'start_minute', 'trip_duration', 'day_of_week'):
+        df[column] = features[column]
     logger.info("Created time features")
     return df
 
-def create_geo_features(df: pd.DataFrame) -> pd.DataFrame:
+@stage
+def create_geo_features(df: pd.DataFrame, method: str = 'geodesic') -> pd.DataFrame:
     """
     Create geo features based on pickup and dropoff coordinates.
 
     Args:
         df (pd.DataFrame): The input DataFrame containing pickup and dropoff coordinates.
+        method (str): Distance kernel, 'geodesic' or 'haversine' (default: 'geodesic').
 
     Returns:
         pd.DataFrame: The DataFrame with additional geo features.
 
     """
-    df['gps_distance'] = df.apply(lambda x: geodesic((x['pickup_latitude'], x['pickup_longitude']), (x['dropoff_latitude'], x['dropoff_longitude'])).miles, axis=1)
+    df['gps_distance'] = gps_distance(df['pickup_latitude'].to_numpy(),
+                                      df['pickup_longitude'].to_numpy(),
+                                      df['dropoff_latitude'].to_numpy(),
+                                      df['dropoff_longitude'].to_numpy(),
+                                      method=method)
     logger.info("Created geo features")
     return df
 
+@stage
 def split_data(df: pd.DataFrame, features: list, target: str, train_size:float = 0.6, val_test_split:float = 0.5, random_state=42, shuffle=True) -> tuple:
     """
     Split the data into training, validation, and test sets.
@@ -149,6 +344,7 @@ def split_data(df: pd.DataFrame, features: list, target: str, train_size:float =
     logger.info("Split data")
     return X_train, X_val, X_test, y_train, y_val, y_test
 
+@stage
 def train_tree(X_train: pd.DataFrame, y_train: pd.Series, X_val: pd.DataFrame, y_val: pd.Series, max_depth: int) -> DecisionTreeRegressor:
     """
     Trains a decision tree regressor model using the provided training data and returns the trained model.
@@ -169,6 +365,7 @@ def train_tree(X_train: pd.DataFrame, y_train: pd.Series, X_val: pd.DataFrame, y
     logger.info(f"Trained Tree Regressor with r² score of {score:.2f}")
     return tree
 
+@stage
 def pickle_model(tree: DecisionTreeRegressor, file_path: str) -> None:
     """
     Pickles a DecisionTreeRegressor object and saves it to a file.
@@ -199,6 +396,139 @@ def load_model(file_path: str) -> DecisionTreeRegressor:
         tree = pickle.load(file)
     return tree
 
+TREE_MANIFEST: str = 'tree_models.json'
+
+def joint_tree_path(models_path: str, targets: list) -> str:
+    """
+    Path of the multi-output tree predicting all of targets, e.g. tree_fare_amount_trip_duration.pkl.
+    """
+    return os.path.join(models_path, 'tree_' + '_'.join(targets) + '.pkl')
+
+def write_tree_manifest(models_path: str, tree_targets: list, file_paths: list) -> None:
+    """
+    Record which tree files serve which targets, so loaders never guess from the files present.
+
+    Parameters:
+        models_path (str): Directory holding the trees.
+        tree_targets (list): A target name per tree, or a list of names for a multi-output tree.
+        file_paths (list): The tree files, in the same order as tree_targets.
+    """
+    models = [{'targets': [target] if isinstance(target, str) else list(target), 'file': os.path.basename(file_path)}
+              for target, file_path in zip(tree_targets, file_paths)]
+    manifest_path = os.path.join(models_path, TREE_MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump({'models': models}, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    logger.info(f"Tree manifest saved to {manifest_path}")
+
+def tree_model_paths(models_path: str, targets: list) -> tuple:
+    """
+    The tree files to load for targets, as recorded by write_tree_manifest.
+
+    Without a manifest (models trained before it existed) one tree_<target>.pkl per target is used.
+
+    Parameters:
+        models_path (str): Directory holding the trees and tree_models.json.
+        targets (list): The target names.
+
+    Returns:
+        tuple: tree_targets as make_prediction expects them and the path of each tree.
+    """
+    manifest_path = os.path.join(models_path, TREE_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return list(targets), [os.path.join(models_path, f'tree_{target}.pkl') for target in targets]
+    with open(manifest_path) as file:
+        models = [model for model in json.load(file)['models'] if set(model['targets']) & set(targets)]
+    missing = set(targets).difference(*[model['targets'] for model in models])
+    if missing:
+        raise ValueError(f"{manifest_path} has no tree for {', '.join(sorted(missing))}")
+    return ([model['targets'] if len(model['targets']) > 1 else model['targets'][0] for model in models],
+            [os.path.join(models_path, model['file']) for model in models])
+
+def load_tree_models(models_path: str, targets: list, load=load_model) -> tuple:
+    """
+    Load the tree models for targets, one multi-output tree or one tree per target as the manifest says.
+
+    Parameters:
+        models_path (str): Directory holding the trees and tree_models.json.
+        targets (list): The target names.
+        load (callable): Loads one tree file (default: load_model), e.g. a cached loader.
+
+    Returns:
+        tuple: tree_targets and tree_models as make_prediction expects them.
+    """
+    tree_targets, file_paths = tree_model_paths(models_path, targets)
+    return tree_targets, [load(file_path) for file_path in file_paths]
+
+def compare_multi_output(X_train: pd.DataFrame, y_train: pd.DataFrame, X_val: pd.DataFrame, y_val: pd.DataFrame,
+                         targets: list, max_depth: int, random_state: int = 42, single_rows: int = 200) -> dict:
+    """
+    Compare one multi-output tree with one tree per target on validation r², fit and predict time.
+
+    Parameters:
+    - X_train (pd.DataFrame): The training features.
+    - y_train (pd.DataFrame): The training targets, one column per target.
+    - X_val (pd.DataFrame): The validation features.
+    - y_val (pd.DataFrame): The validation targets, one column per target.
+    - targets (list): The targets predicted together.
+    - max_depth (int): The maximum depth of every tree.
+    - random_state (int): Seed of the trees (default: 42).
+    - single_rows (int): Number of one-row predictions timed, as make_prediction does them (default: 200).
+
+    Returns:
+    - dict: Per setup ('separate', 'joint'): r2 per target, fit_seconds, batch_predict_seconds over X_val and
+      single_predict_us per quote.
+    """
+    setups = {
+        'separate': [(target, DecisionTreeRegressor(max_depth=max_depth, random_state=random_state)) for target in targets],
+        'joint': [(list(targets), DecisionTreeRegressor(max_depth=max_depth, random_state=random_state))],
+    }
+    rows = [X_val.iloc[i:i + 1] for i in range(min(single_rows, len(X_val)))]
+    report = {}
+    for setup, models in setups.items():
+        start = time.perf_counter()
+        for target, model in models:
+            model.fit(X_train, y_train[target])
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predictions = {}
+        for target, model in models:
+            output = model.predict(X_val)
+            predictions.update(zip(target, output.T) if isinstance(target, list) else [(target, output)])
+        batch_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for row in rows:
+            for _, model in models:
+                model.predict(row)
+        single_us = (time.perf_counter() - start) / max(len(rows), 1) * 1e6
+
+        r2 = {target: 1 - ((y_val[target] - predictions[target]) ** 2).sum() / ((y_val[target] - y_val[target].mean()) ** 2).sum()
+              for target in targets}
+        report[setup] = {'r2': {target: float(value) for target, value in r2.items()}, 'fit_seconds': fit_seconds,
+                         'batch_predict_seconds': batch_seconds, 'single_predict_us': single_us}
+        logger.info(f"{setup} trees: r² {', '.join(f'{t} {v:.3f}' for t, v in r2.items())}, fit {fit_seconds:.2f}s, "
+                    f"predict {batch_seconds * 1000:.1f} ms batch / {single_us:.0f} µs per quote")
+    return report
+
+def _model_inputs(hour, minute, day_of_week, pickup_lat, pickup_long, dropoff_lat, dropoff_long,
+                  passenger_count=1, rate_code=1, method: str = 'geodesic', distance=None) -> tuple:
+    """
+    Build the tree and regression input matrices for scalars or whole arrays of trips.
+    distance is computed with gps_distance unless it is given.
+
+    Returns:
+        tuple: The tree input (n, 10) and the regression input (n, 5) as np.ndarrays.
+    """
+    if distance is None:
+        distance = gps_distance(pickup_lat, pickup_long, dropoff_lat, dropoff_long, method=method)
+    columns = np.broadcast_arrays(hour, minute, passenger_count, pickup_long, pickup_lat,
+                                  dropoff_long, dropoff_lat, rate_code, day_of_week, distance)
+    tree_input = np.column_stack(columns).astype(np.float64)
+    regression_input = tree_input[:, [0, 8, 9, 4, 3]]
+    return tree_input, regression_input
+
 def make_prediction(hour: int,
                     minute: int,
                     day_of_week: int,
@@ -212,6 +542,7 @@ def make_prediction(hour: int,
                     reg_models: list):
     """
     Make a prediction using the given input parameters and return the predictions for each target.
+    The feature construction and every model's predict are timed into src.telemetry.
 
     Parameters:
     hour (int): The hour of the pickup time.
@@ -221,8 +552,10 @@ def make_prediction(hour: int,
     pickup_long (float): The longitude of the pickup location.
     dropoff_lat (float): The latitude of the dropoff location.
     dropoff_long (float): The longitude of the dropoff location.
-    targets (list): A list of target names.
-    models (list): A list of machine learning models.
+    tree_targets (list): A list of target names, or of lists of names for multi-output trees.
+    tree_models (list): The tree models, in the same order as tree_targets.
+    reg_targets (list): A list of target names for the regression models.
+    reg_models (list): The regression models, in the same order as reg_targets.
 
     Returns:
     dict: A dictionary containing the predictions for each target, where the target name is the key and the prediction is the value.
@@ -230,41 +563,70 @@ def make_prediction(hour: int,
     
     output = {}
 
-    gps_distance = geodesic((pickup_lat, pickup_long), (dropoff_lat, dropoff_long)).miles
-    passenger_count = 1
-    rate_code = 1
-
-    tree_input = np.array(
-        [
-            hour,
-            minute,
-            passenger_count,
-            pickup_long,
-            pickup_lat,
-            dropoff_long,
-            dropoff_lat,
-            rate_code,
-            day_of_week,
-            gps_distance
-        ]
-    ).reshape(1, -1)
-
-    regression_input = np.array(
-        [
-            hour,
-            day_of_week,
-            gps_distance,
-            pickup_lat,
-            pickup_long,
-        ]
-    ).reshape(1, -1)
-
-    for model, target in zip(tree_models, tree_targets):    
-        predictions = model.predict(tree_input)
-        output[target] = predictions[0] 
+    with telemetry.timer('prediction_step_seconds', step='features'):
+        tree_input, regression_input = _model_inputs(hour, minute, day_of_week,
+                                                     pickup_lat, pickup_long, dropoff_lat, dropoff_long)
+
+    for model, target in zip(tree_models, tree_targets):
+        multi_output = isinstance(target, (list, tuple))
+        with telemetry.timer('model_predict_seconds', target='+'.join(target) if multi_output else target):
+            predictions = model.predict(tree_input)
+        if multi_output:
+            # A multi-output tree gives all of its targets from one traversal
+            output.update(zip(target, predictions[0]))
+        else:
+            output[target] = predictions[0] 
 
     for model, target in zip(reg_models, reg_targets):
-        predictions = model.predict(regression_input)
+        with telemetry.timer('model_predict_seconds', target=target):
+            predictions = model.predict(regression_input)
         output[target] = predictions[0]
     
-    return output
\ No newline at end of file
+    return output
+
+def make_predictions(trips,
+                     tree_targets: list,
+                     tree_models: list,
+                     reg_targets: list,
+                     reg_models: list,
+                     method: str = 'geodesic') -> pd.DataFrame:
+    """
+    Make predictions for many trips at once, with a single predict call per model.
+
+    Parameters:
+    trips (pd.DataFrame | dict): Trips with the columns start_hour, start_minute, day_of_week, pickup_latitude,
+        pickup_longitude, dropoff_latitude and dropoff_longitude (arrays or columns of equal length).
+        passenger_count and rate_code are used when present and default to 1 like in make_prediction.
+        A gps_distance column, when present, is used instead of recomputing the distances.
+    tree_targets (list): A list of target names for the tree models, or of lists of names for multi-output trees.
+    tree_models (list): The tree models, in the same order as tree_targets.
+    reg_targets (list): A list of target names for the regression models.
+    reg_models (list): The regression models, in the same order as reg_targets.
+    method (str): Distance kernel used for gps_distance (default: 'geodesic').
+
+    Returns:
+    pd.DataFrame: One column of predictions per target, aligned with the input trips.
+    """
+    tree_input, regression_input = _model_inputs(np.asarray(trips['start_hour']),
+                                                 np.asarray(trips['start_minute']),
+                                                 np.asarray(trips['day_of_week']),
+                                                 np.asarray(trips['pickup_latitude']),
+                                                 np.asarray(trips['pickup_longitude']),
+                                                 np.asarray(trips['dropoff_latitude']),
+                                                 np.asarray(trips['dropoff_longitude']),
+                                                 np.asarray(trips['passenger_count']) if 'passenger_count' in trips else 1,
+                                                 np.asarray(trips['rate_code']) if 'rate_code' in trips else 1,
+                                                 method=method,
+                                                 distance=np.asarray(trips['gps_distance']) if 'gps_distance' in trips else None)
+    output = {}
+    for model, target in zip(tree_models, tree_targets):
+        predictions = model.predict(tree_input)
+        if isinstance(target, (list, tuple)):
+            output.update(zip(target, predictions.T))
+        else:
+            output[target] = predictions
+    for model, target in zip(reg_models, reg_targets):
+        output[target] = model.predict(regression_input)
+
+    index = trips.index if isinstance(trips, pd.DataFrame) else None
+    return pd.DataFrame(output, index=index)
@@ -0,0 +1,237 @@
+"""
+Incremental training pipeline over monthly trip files.
+
+Each input file is one partition, named after the file and a hash of its absolute path so
+files with the same name in different directories (2015/01.csv, 2016/01.csv) do not collide.
+A partition is featurized once: the row-local outlier rules are applied, the features are
+stored under the store's partitions/ directory, and histogram sketches of the columns behind
+the quantile-based outlier rules are saved next to them. A manifest records which files (by
+path, size and mtime) were processed, so a new month only costs processing that month, and
+partitions whose file was deleted are dropped from the store.
+
+Retraining reads only the stored features. The quantile thresholds come from the merged
+sketches of all partitions. They approximate remove_outliers: each quantile is taken over the
+rows passing the row-local rules that precede it (not over rows already cut by earlier
+quantile rules) and is accurate to one sketch bin.
+"""
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from src.functions import _resolve_paths, TAXI_SCHEMA, load_data, drop_nulls_and_columns, create_time_features, \
+    create_geo_features, outlier_rules, outlier_mask, logger
+from src.cache import file_fingerprint, pipeline_code_version, save_features, load_features
+from src.sketch import HistogramSketch
+
+# Modules whose code determines the stored partitions. Other pipeline modules (lazy.py,
+# partitioned.py) can change without rebuilding the store
+STORE_MODULES: list = ['functions.py', 'geo.py', 'timestamps.py', 'sketch.py', 'incremental.py']
+
+# Histogram range and bin count per column used by a quantile rule (bins of 5e-5 deg, about 5 m, and 0.05 min)
+SKETCH_BINS: dict = {
+    'pickup_latitude': (40.0, 42.0, 40_000),
+    'dropoff_latitude': (40.0, 42.0, 40_000),
+    'pickup_longitude': (-75.0, -72.0, 60_000),
+    'dropoff_longitude': (-75.0, -72.0, 60_000),
+    'trip_duration': (0.0, 600.0, 12_000),
+}
+
+def _manifest_path(store_path: str) -> str:
+    return os.path.join(store_path, 'manifest.json')
+
+def read_manifest(store_path: str) -> dict:
+    """
+    Read the store manifest, or an empty one for a new store.
+
+    Args:
+        store_path (str): The feature store directory.
+
+    Returns:
+        dict: The manifest with the pipeline params and one entry per processed partition.
+    """
+    if not os.path.exists(_manifest_path(store_path)):
+        return {'params': None, 'partitions': {}}
+    with open(_manifest_path(store_path)) as file:
+        return json.load(file)
+
+def _write_manifest(store_path: str, manifest: dict) -> None:
+    tmp_path = _manifest_path(store_path) + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, _manifest_path(store_path))
+
+def partition_name(path: str) -> str:
+    """
+    Store name of an input file: its base name and a hash of its absolute path.
+
+    Args:
+        path (str): The input file.
+
+    Returns:
+        str: The partition name, e.g. '01-3f2a9c1b04de' for 2015/01.csv.
+    """
+    source = os.path.normcase(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{stem}-{hashlib.sha256(source.encode()).hexdigest()[:12]}"
+
+def prune_store(store_path: str, manifest: dict) -> list:
+    """
+    Drop the partitions whose input file no longer exists, with their features and sketches.
+
+    Args:
+        store_path (str): The feature store directory.
+        manifest (dict): The store manifest, updated in place and written back when a partition is dropped.
+
+    Returns:
+        list: The names of the dropped partitions.
+    """
+    # Entries without a source predate path-based names and would duplicate their file's new partition
+    pruned = [name for name, entry in manifest['partitions'].items()
+              if 'source' not in entry or not os.path.exists(entry['source'])]
+    for name in pruned:
+        del manifest['partitions'][name]
+        shutil.rmtree(os.path.join(store_path, 'partitions', name), ignore_errors=True)
+        sketch_path = os.path.join(store_path, 'sketches', f'{name}.npz')
+        if os.path.exists(sketch_path):
+            os.remove(sketch_path)
+        logger.info(f"Dropped partition {name}, its input file is gone")
+    if pruned:
+        _write_manifest(store_path, manifest)
+    return pruned
+
+def partition_sketches(df: pd.DataFrame, columns: list) -> dict:
+    """
+    Sketch, for every quantile-based outlier rule, its column over the rows kept by the preceding row-local rules.
+
+    Args:
+        df (pd.DataFrame): A partition after create_time_features.
+        columns (list): The outlier columns passed to remove_outliers.
+
+    Returns:
+        dict: A HistogramSketch per rule name.
+    """
+    stages = outlier_rules(columns)
+    needed = {column for stage in stages for rule in stage for column in rule[1]}
+    arrays = {column: df[column].to_numpy() for column in needed}
+    mask = np.ones(len(df), dtype=bool)
+    sketches = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for stage in stages:
+            for name, rule_columns, bounds, _ in stage:
+                if bounds is not None:
+                    column = rule_columns[0]
+                    sketches[name] = HistogramSketch(*SKETCH_BINS[column]).update(arrays[column][mask])
+            for name, _, bounds, predicate in stage:
+                if bounds is None:
+                    mask &= predicate(arrays, None)
+    return sketches
+
+def sketch_thresholds(sketches: dict, columns: list) -> dict:
+    """
+    Turn merged sketches into the thresholds outlier_mask expects.
+
+    Args:
+        sketches (dict): A HistogramSketch per quantile rule name.
+        columns (list): The outlier columns passed to remove_outliers.
+
+    Returns:
+        dict: Thresholds per rule name.
+    """
+    thresholds = {}
+    for stage in outlier_rules(columns):
+        for name, _, bounds, _ in stage:
+            if bounds is not None:
+                thresholds[name] = bounds(lambda column, q, name=name: float(sketches[name].quantile(q)))
+    return thresholds
+
+def update_store(file_path, store_path: str, params: dict) -> list:
+    """
+    Featurize every input partition that is new or changed since the last run, and drop the
+    partitions whose input file was deleted.
+
+    Args:
+        file_path (str | list): The monthly CSV files, as a path, glob or list.
+        store_path (str): The feature store directory.
+        params (dict): Pipeline parameters with SAMPLE, CHUNK_SIZE, RANDOM_STATE, DROP_COLUMNS,
+            OUTLIER_COLUMNS, FEATURES and TARGETS.
+
+    Returns:
+        list: The names of the partitions processed in this run.
+    """
+    manifest = read_manifest(store_path)
+    version = {'params': params, 'code': pipeline_code_version(STORE_MODULES)}
+    if manifest['params'] is not None and manifest['params'] != version:
+        raise ValueError(f'Pipeline parameters or code changed since {store_path} was built, use a new store')
+    manifest['params'] = version
+    os.makedirs(os.path.join(store_path, 'sketches'), exist_ok=True)
+    prune_store(store_path, manifest)
+
+    quantile_columns = [rule[1][0] for stage in outlier_rules(params['OUTLIER_COLUMNS']) for rule in stage if rule[2] is not None]
+    keep_columns = list(dict.fromkeys(params['FEATURES'] + params['TARGETS'] + quantile_columns))
+
+    processed = []
+    for path in _resolve_paths(file_path):
+        name = partition_name(path)
+        fingerprint = file_fingerprint(path)[0]
+        entry = manifest['partitions'].get(name)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            continue
+
+        # Each partition draws its own sample, months of similar length would otherwise keep the same rows
+        seed = int(hashlib.sha256(name.encode()).hexdigest()[:8], 16)
+        rng = np.random.default_rng(None if params['RANDOM_STATE'] is None else [params['RANDOM_STATE'], seed])
+        df = load_data(path, params['SAMPLE'], chunksize=params['CHUNK_SIZE'], random_state=rng,
+                       columns=[column for column in TAXI_SCHEMA if column not in params['DROP_COLUMNS']])
+        df = drop_nulls_and_columns(df, params['DROP_COLUMNS'])
+        df = create_time_features(df)
+        sketches = partition_sketches(df, params['OUTLIER_COLUMNS'])
+        mask, _, _ = outlier_mask(df, params['OUTLIER_COLUMNS'], rules='row')
+        df = create_geo_features(df[mask])[keep_columns]
+
+        shutil.rmtree(os.path.join(store_path, 'partitions', name), ignore_errors=True)
+        save_features(df, os.path.join(store_path, 'partitions'), name)
+        arrays = {}
+        for rule, sketch in sketches.items():
+            arrays.update(sketch.to_arrays(rule))
+        np.savez_compressed(os.path.join(store_path, 'sketches', f'{name}.npz'), **arrays)
+
+        manifest['partitions'][name] = {'source': fingerprint[0], 'fingerprint': fingerprint, 'rows': len(df)}
+        _write_manifest(store_path, manifest)
+        processed.append(name)
+        logger.info(f"Stored partition {name} with {len(df)} rows")
+
+    logger.info(f"Feature store has {len(manifest['partitions'])} partitions, {len(processed)} new")
+    return processed
+
+def load_store(store_path: str) -> pd.DataFrame:
+    """
+    Assemble the training frame from the stored partitions, without touching the raw CSVs.
+
+    Args:
+        store_path (str): The feature store directory.
+
+    Returns:
+        pd.DataFrame: The features and targets of all partitions, with the quantile outlier rules applied.
+    """
+    manifest = read_manifest(store_path)
+    names = sorted(manifest['partitions'])
+    if not names:
+        raise FileNotFoundError(f'No partitions in feature store {store_path}')
+    columns = manifest['params']['params']['OUTLIER_COLUMNS']
+
+    sketches = {}
+    for name in names:
+        with np.load(os.path.join(store_path, 'sketches', f'{name}.npz')) as arrays:
+            for stage in outlier_rules(columns):
+                for rule, _, bounds, _ in stage:
+                    if bounds is not None:
+                        sketch = HistogramSketch.from_arrays(arrays, rule)
+                        sketches[rule] = sketches[rule].merge(sketch) if rule in sketches else sketch
+    thresholds = sketch_thresholds(sketches, columns)
+
+    df = pd.concat([load_features(os.path.join(store_path, 'partitions'), name) for name in names], ignore_index=True)
+    mask, drops, _ = outlier_mask(df, columns, thresholds=thresholds, rules='quantile')
+    logger.info(f"Removed outliers with stored thresholds: {len(mask) - int(mask.sum())} rows dropped ({drops})")
+    return df[mask].reset_index(drop=True)
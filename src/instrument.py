@@ -0,0 +1,175 @@
+"""
+Per-stage timing and memory instrumentation for the training pipeline.
+
+Decorating a pipeline function with @stage records, for every call, the elapsed time, the
+rows going in and out, the resident memory before and after and, for stages not nested in
+another one, the peak resident growth. Recording is off until configure(enabled=True) is
+called, so long-lived processes calling decorated functions (the app, the prediction service)
+keep nothing. cProfile and tracemalloc captures can be switched on with configure() as well.
+The records of a run are written as a JSON report with write_report.
+"""
+import cProfile
+import functools
+from collections import deque
+import io
+import json
+import os
+import platform
+import pstats
+import time
+import tracemalloc
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler()
+stream_handler.setLevel(logging.INFO)
+logger.addHandler(stream_handler)
+
+# Most recent stage records kept, a bound for processes that record for a long time
+MAX_RECORDS: int = 10_000
+
+_settings = {'enabled': False, 'profile': False, 'trace_memory': False, 'top': 15}
+_records = deque(maxlen=MAX_RECORDS)
+_state = {'depth': 0}
+
+def configure(enabled: bool = True, profile: bool = False, trace_memory: bool = False, top: int = 15) -> None:
+    """
+    Set what the @stage decorator captures. Nothing is recorded before this is called.
+
+    Args:
+        enabled (bool): Record stages at all (default: True).
+        profile (bool): Run each stage under cProfile and keep its top functions (default: False).
+        trace_memory (bool): Run each stage under tracemalloc and keep the peak and top allocation sites (default: False).
+        top (int): Number of functions / allocation sites kept per stage (default: 15).
+    """
+    _settings.update(enabled=enabled, profile=profile, trace_memory=trace_memory, top=top)
+
+def reset() -> None:
+    """
+    Forget the records collected so far.
+    """
+    _records.clear()
+
+def records() -> list:
+    """
+    The stage records collected so far, in call order.
+    """
+    return list(_records)
+
+def rss_kb(field: str = 'VmRSS:') -> int:
+    """
+    A memory figure of this process from /proc/self/status, in kB (Linux only).
+
+    Args:
+        field (str): 'VmRSS:' for the resident set, 'VmHWM:' for its high-water mark (default: 'VmRSS:').
+
+    Returns:
+        int: The value in kB, or 0 where /proc is not available.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the resident-set high-water mark so the next VmHWM reading covers only what follows.
+
+    Returns:
+        bool: Whether the platform supports it (Linux).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def _rows(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return len(value) if hasattr(value, 'shape') and hasattr(value, '__len__') else None
+
+def stage(func):
+    """
+    Decorator recording timing, row counts and memory of every call of a pipeline function.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _settings['enabled']:
+            return func(*args, **kwargs)
+
+        record = {'stage': func.__name__, 'rows_in': _rows(args[0]) if args else None}
+        record['depth'] = _state['depth']
+        outermost = record['depth'] == 0
+        # A nested stage would clear the outer one's high-water mark, only outermost stages measure the peak
+        peak_supported = outermost and reset_peak_rss()
+        rss_before = rss_kb()
+        # Only the outermost stage is profiled, cProfile cannot nest
+        profiler = cProfile.Profile() if _settings['profile'] and outermost else None
+        tracing = _settings['trace_memory'] and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        _state['depth'] += 1
+        try:
+            output = func(*args, **kwargs)
+        finally:
+            _state['depth'] -= 1
+            if profiler is not None:
+                profiler.disable()
+            record['seconds'] = time.perf_counter() - start
+
+        rss_after = rss_kb()
+        record.update(
+            rows_out=_rows(output),
+            rss_before_mb=rss_before / 1024,
+            rss_after_mb=rss_after / 1024,
+            rss_delta_mb=(rss_after - rss_before) / 1024,
+            peak_rss_delta_mb=(rss_kb('VmHWM:') - rss_before) / 1024 if peak_supported else None,
+        )
+        if tracing:
+            snapshot = tracemalloc.take_snapshot()
+            record['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            record['tracemalloc_top'] = [str(stat) for stat in snapshot.statistics('lineno')[:_settings['top']]]
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(_settings['top'])
+            record['profile'] = stream.getvalue()
+
+        _records.append(record)
+        logger.info(f"{func.__name__}: {record['seconds']:.3f}s, rows {record['rows_in']} -> {record['rows_out']}, "
+                    f"rss {record['rss_delta_mb']:+.1f} MB")
+        return output
+    return wrapper
+
+def write_report(file_path: str, extra: dict = None) -> None:
+    """
+    Write the collected stage records as a JSON run report.
+
+    Args:
+        file_path (str): The JSON file to write.
+        extra (dict): Additional fields to include, e.g. the pipeline parameters (default: None).
+    """
+    stages = records()
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        # Nested stages are part of their outer stage's time
+        'total_seconds': sum(record['seconds'] for record in stages if record.get('depth', 0) == 0),
+        'stages': stages,
+        **(extra or {}),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, 'w') as file:
+        json.dump(report, file, indent=2, default=str)
+    logger.info(f"Run report saved to {file_path}")
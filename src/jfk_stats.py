@@ -0,0 +1,164 @@
+"""
+Offline 7x24 (day_of_week x hour) statistics cube for the JFK trip-duration chart.
+
+The cube keeps, per cell, mergeable count/mean/variance and a histogram sketch for the
+approximate median of trip_duration and total_amount. It is built by streaming the trips
+CSV in chunks and records how many bytes of the file it has consumed, so `update` only reads
+trips appended since the last build.
+
+Usage:
+    python -m src.jfk_stats build outputs/csvdata/JFK_trips.csv outputs/stats/jfk_cube.npz
+    python -m src.jfk_stats update outputs/stats/jfk_cube.npz
+"""
+import argparse
+import io
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from src.functions import logger
+from src.sketch import HistogramSketch, RunningMoments
+from src.timestamps import parse_timestamps, time_features
+
+SHAPE: tuple = (7, 24)
+# (output prefix, source column, histogram range and bin count for the median sketch)
+MEASURES: list = [
+    ('duration', 'trip_duration', (0.0, 240.0, 960)),
+    ('fare', 'total_amount', (0.0, 300.0, 1200)),
+]
+
+def empty_cube() -> dict:
+    """
+    Create a cube with no trips in it.
+
+    Returns:
+        dict: Moments and median sketch per measure, plus the source bookkeeping.
+    """
+    cube = {'source': '', 'offset': 0, 'header': []}
+    for prefix, _, (lo, hi, bins) in MEASURES:
+        cube[prefix] = (RunningMoments(SHAPE), HistogramSketch(lo, hi, bins, SHAPE))
+    return cube
+
+def update_cube(cube: dict, trips: pd.DataFrame) -> dict:
+    """
+    Add a batch of trips to the cube.
+
+    Args:
+        cube (dict): The cube to update in place.
+        trips (pd.DataFrame): Trips with pickup_datetime, trip_duration and total_amount.
+
+    Returns:
+        dict: The updated cube.
+    """
+    features = time_features(parse_timestamps(trips['pickup_datetime']))
+    cells = (features['day_of_week'], features['start_hour'])
+    for prefix, column, _ in MEASURES:
+        moments, sketch = cube[prefix]
+        values = trips[column].to_numpy(dtype=np.float64)
+        moments.update(values, cells)
+        sketch.update(values, cells)
+    return cube
+
+def build_cube(file_path: str, chunksize: int = 1_000_000, cube: dict = None) -> dict:
+    """
+    Stream a trips CSV into a cube, starting after the bytes the cube has already consumed.
+
+    Args:
+        file_path (str): The trips CSV.
+        chunksize (int): Rows read per chunk (default: 1000000).
+        cube (dict): An existing cube built from the same file, to extend with appended trips (default: None).
+
+    Returns:
+        dict: The cube covering the whole file.
+    """
+    cube = cube if cube is not None else empty_cube()
+    rows = 0
+    with open(file_path, 'rb') as file:
+        if cube['offset'] == 0:
+            header = file.readline()
+            cube['header'] = pd.read_csv(io.BytesIO(header)).columns.tolist()
+            cube['offset'] = len(header)
+        file.seek(cube['offset'])
+        while True:
+            lines = list(itertools.islice(file, chunksize))
+            # Only consume whole lines, a writer may still be appending the last one
+            if lines and not lines[-1].endswith(b'\n'):
+                lines.pop()
+            if not lines:
+                break
+            update_cube(cube, pd.read_csv(io.BytesIO(b''.join(lines)), header=None, names=cube['header']))
+            cube['offset'] += sum(len(line) for line in lines)
+            rows += len(lines)
+    cube['source'] = file_path
+    logger.info(f"Added {rows} trips to the JFK cube")
+    return cube
+
+def save_cube(cube: dict, file_path: str) -> None:
+    """
+    Save a cube as a compressed .npz file.
+
+    Args:
+        cube (dict): The cube.
+        file_path (str): The file to write.
+    """
+    arrays = {'source': np.array(cube['source']), 'offset': np.array(cube['offset']), 'header': np.array(cube['header'])}
+    for prefix, _, _ in MEASURES:
+        moments, sketch = cube[prefix]
+        arrays.update(moments.to_arrays(prefix))
+        arrays.update(sketch.to_arrays(f'{prefix}_median'))
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    np.savez_compressed(file_path, **arrays)
+    logger.info(f"JFK cube saved to {file_path}")
+
+def load_cube(file_path: str) -> dict:
+    """
+    Load a cube saved with save_cube.
+
+    Args:
+        file_path (str): The .npz file.
+
+    Returns:
+        dict: The cube.
+    """
+    with np.load(file_path) as arrays:
+        cube = {'source': str(arrays['source']), 'offset': int(arrays['offset']), 'header': arrays['header'].tolist()}
+        for prefix, _, _ in MEASURES:
+            cube[prefix] = (RunningMoments.from_arrays(arrays, prefix), HistogramSketch.from_arrays(arrays, f'{prefix}_median'))
+    return cube
+
+def cube_frame(cube: dict) -> pd.DataFrame:
+    """
+    Flatten a cube into the per-(day_of_week, hour) table the app plots.
+
+    Args:
+        cube (dict): The cube.
+
+    Returns:
+        pd.DataFrame: Columns day_of_week, hour and <measure>_mean/_median/_std, one row per non-empty cell.
+    """
+    day_of_week, hour = np.indices(SHAPE)
+    frame = {'day_of_week': day_of_week.ravel(), 'hour': hour.ravel()}
+    for prefix, _, _ in MEASURES:
+        moments, sketch = cube[prefix]
+        frame[f'{prefix}_mean'] = moments.mean.ravel()
+        frame[f'{prefix}_median'] = sketch.quantile(0.5).ravel()
+        frame[f'{prefix}_std'] = moments.std().ravel()
+    frame = pd.DataFrame(frame)
+    return frame[cube[MEASURES[0][0]][0].count.ravel() > 0].reset_index(drop=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or update the JFK day-of-week x hour statistics cube.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='build a cube from a trips CSV')
+    build.add_argument('input')
+    build.add_argument('output')
+    update = subparsers.add_parser('update', help='add trips appended to the source CSV since the last build')
+    update.add_argument('cube')
+    update.add_argument('--input', help='source CSV, if it moved since the cube was built')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        save_cube(build_cube(args.input), args.output)
+    else:
+        cube = load_cube(args.cube)
+        save_cube(build_cube(args.input or cube['source'], cube=cube), args.cube)
@@ -0,0 +1,113 @@
+"""
+Polars LazyFrame backend for the feature pipeline.
+
+The load, drop_nulls_and_columns, create_time_features and remove_outliers steps are built as a
+single lazy query over the CSV scan, so Polars pushes the column projection and the row filters
+into the multithreaded reader and never materializes the intermediate frames. The outlier
+rules are not restated: the bounds and predicates of outlier_rules are evaluated on Polars
+expressions, and every stage becomes one filter whose quantiles are aggregated over that
+filter's input, which keeps the stage-by-stage semantics of remove_outliers.
+create_geo_features then runs on the collected frame.
+
+Polars is optional, it is only imported when this backend is used (pip install polars).
+"""
+import pandas as pd
+from src.functions import _resolve_paths, TAXI_SCHEMA, TAXI_DATETIME_FORMAT, create_geo_features, outlier_rules, logger
+from src.instrument import stage
+
+def _polars():
+    try:
+        import polars as pl
+    except ImportError as error:
+        raise ImportError('The lazy backend needs polars, install it with pip install polars') from error
+    return pl
+
+def _polars_dtype(pl, dtype: str):
+    return {'category': pl.Categorical, 'Int8': pl.Int8, 'float32': pl.Float32}.get(dtype, pl.String)
+
+def lazy_features(file_path, sample_size: float, drop_columns: list, outlier_columns: list,
+                  random_state: int = None, columns: list = None, schema: dict = TAXI_SCHEMA):
+    """
+    Build the lazy query from the CSV scan to the outlier-free trips with time features.
+
+    Args:
+        file_path (str | list): The CSV files, as a path, glob or list.
+        sample_size (float): The proportion of rows to keep, as a hash-based Bernoulli sample of the row numbers.
+        drop_columns (list): Columns dropped by drop_nulls_and_columns.
+        outlier_columns (list): The outlier columns passed to remove_outliers.
+        random_state (int): Seed of the sample (default: None, which means 0).
+        columns (list): The columns to read, as in load_data (default: None).
+        schema (dict): The column dtypes, as in load_data (default: TAXI_SCHEMA).
+
+    Returns:
+        pl.LazyFrame: The query, with a row_number column numbering the input rows across files.
+    """
+    pl = _polars()
+    wanted = [column for column in (columns if columns is not None else schema) if column not in drop_columns]
+    dates = [column for column in wanted if str(schema.get(column, '')).startswith('datetime64')]
+    lf = pl.scan_csv(_resolve_paths(file_path), schema_overrides={column: _polars_dtype(pl, schema.get(column)) for column in wanted},
+                     row_index_name='row_number')
+    lf = lf.select(['row_number'] + wanted)
+    if sample_size < 1:
+        lf = lf.filter(pl.col('row_number').hash(random_state or 0) < int(sample_size * 2 ** 64))
+
+    # drop_nulls_and_columns: pandas treats NaN as missing too
+    lf = lf.drop_nulls().filter(~pl.any_horizontal(pl.col(pl.Float32, pl.Float64).is_nan()))
+
+    # create_time_features
+    lf = lf.with_columns(pl.col(dates).str.strptime(pl.Datetime('us'), TAXI_DATETIME_FORMAT))
+    pickup = pl.col('pickup_datetime')
+    lf = lf.with_columns(
+        start_hour=pickup.dt.hour().cast(pl.Int32),
+        start_minute=pickup.dt.minute().cast(pl.Int32),
+        trip_duration=(pl.col('dropoff_datetime') - pickup).dt.total_microseconds() / 60e6,
+        day_of_week=(pickup.dt.weekday() - 1).cast(pl.Int32),
+    )
+
+    # remove_outliers, one filter per stage
+    for rules in outlier_rules(outlier_columns):
+        needed = {column for rule in rules for column in rule[1]}
+        expressions = {column: pl.col(column) for column in needed}
+        keep = pl.lit(True)
+        for _, _, bounds, predicate in rules:
+            thresholds = bounds(lambda column, q: pl.col(column).quantile(q, 'linear')) if bounds is not None else None
+            keep = keep & predicate(expressions, thresholds)
+        lf = lf.filter(keep)
+    return lf
+
+@stage
+def run_lazy(file_path, sample_size: float, drop_columns: list, outlier_columns: list,
+             keep_columns: list = None, random_state: int = None, columns: list = None,
+             schema: dict = TAXI_SCHEMA, method: str = 'geodesic') -> pd.DataFrame:
+    """
+    Run the feature pipeline with the Polars lazy backend.
+
+    Parameters:
+    - file_path (str | list): The CSV files, as a path, glob or list.
+    - sample_size (float): The proportion of rows to keep.
+    - drop_columns (list): Columns dropped by drop_nulls_and_columns.
+    - outlier_columns (list): The outlier columns passed to remove_outliers.
+    - keep_columns (list): The columns to return, e.g. features and targets. None keeps all (default: None).
+    - random_state (int): Seed of the sample (default: None).
+    - columns (list): The columns to read, as in load_data (default: None).
+    - schema (dict): The column dtypes, as in load_data (default: TAXI_SCHEMA).
+    - method (str): Distance kernel of create_geo_features (default: 'geodesic').
+
+    Returns:
+    - pd.DataFrame: The features without outliers, indexed by row number in the input as in load_data.
+    """
+    lf = lazy_features(file_path, sample_size, drop_columns, outlier_columns, random_state, columns, schema)
+    if keep_columns is not None:
+        geo_columns = ['pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude']
+        lf = lf.select([column for column in dict.fromkeys(['row_number'] + keep_columns + geo_columns)
+                        if column != 'gps_distance'])
+    df = lf.collect().to_pandas()
+    df.index = pd.Index(df.pop('row_number').to_numpy(dtype='int64'))
+    # The pandas dtypes load_data would give, e.g. nullable Int8 and categoricals
+    df = df.astype({column: schema[column] for column in df.columns
+                    if column in schema and not str(schema[column]).startswith('datetime64')})
+    df = create_geo_features(df, method=method)
+    if keep_columns is not None:
+        df = df[keep_columns]
+    logger.info(f"Lazy pipeline kept {len(df)} rows")
+    return df
@@ -0,0 +1,197 @@
+"""
+Partitioned, multi-core execution of the feature pipeline.
+
+The input files are cut into byte ranges at line boundaries, one task per range. Each task runs
+on a process pool (map):
+
+    read range -> drop_nulls_and_columns -> create_time_features -> row-local outlier rules -> create_geo_features
+
+and writes its surviving rows to a temporary directory, together with the columns behind the
+quantile-based outlier rules (for all of its rows) and, per row, the stage of outlier_rules at
+which a row-local rule first dropped it. The reduce step concatenates those small arrays and
+computes the quantile thresholds exactly as remove_outliers would on the whole frame: every
+quantile sees the rows left by all preceding rules. The thresholds are then applied to the
+stored partitions, which are concatenated in file order with their original row numbers as the
+index.
+
+With the same rows (sample_size=1) the result equals the single-process pipeline. With sampling,
+each partition draws its own seeded Bernoulli sample, so the rows differ from load_data's.
+
+Byte ranges assume no quoted newlines inside fields, which holds for the taxi CSVs.
+"""
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.functions import _resolve_paths, _quantile, _read_options, TAXI_SCHEMA, drop_nulls_and_columns, \
+    create_time_features, create_geo_features, outlier_rules, outlier_mask, logger
+from src.instrument import configure, stage
+
+PARTITION_BYTES: int = 64 * 2 ** 20
+
+_shared = {}
+
+def byte_ranges(file_path, partition_bytes: int = PARTITION_BYTES) -> list:
+    """
+    Cut the input files into byte ranges that start and end on line boundaries.
+
+    Args:
+        file_path (str | list): The CSV files, as a path, glob or list.
+        partition_bytes (int): Approximate size of a range (default: 64 MiB).
+
+    Returns:
+        list: (path, start, end) tuples in file order; the header line is never part of a range.
+    """
+    ranges = []
+    for path in _resolve_paths(file_path):
+        size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            start = len(file.readline())
+            while start < size:
+                file.seek(min(start + partition_bytes, size))
+                if file.tell() < size:
+                    file.readline()
+                end = min(file.tell(), size)
+                ranges.append((path, start, end))
+                start = end
+    return ranges
+
+def _init_worker(work_dir: str, params: dict) -> None:
+    # Stage records of worker processes would be lost anyway
+    configure(enabled=False)
+    _shared['work_dir'] = work_dir
+    _shared['params'] = params
+
+def _row_drop_stage(df: pd.DataFrame, stages: list) -> np.ndarray:
+    """
+    Per row, the index of the first stage whose row-local rules drop it, len(stages) if none does.
+    """
+    needed = {column for stage in stages for rule in stage if rule[2] is None for column in rule[1]}
+    arrays = {column: df[column].to_numpy() for column in needed}
+    drop_stage = np.full(len(df), len(stages), dtype=np.int8)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, stage in enumerate(stages):
+            for _, _, bounds, predicate in stage:
+                if bounds is None:
+                    drop_stage[~predicate(arrays, None) & (drop_stage == len(stages))] = i
+    return drop_stage
+
+def _map_partition(task: tuple) -> int:
+    task_id, path, start, end = task
+    params = _shared['params']
+    with open(path, 'rb') as file:
+        header = pd.read_csv(file, nrows=0).columns.tolist()
+        file.seek(start)
+        data = file.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=header,
+                     **_read_options(path, params['columns'], params['schema']))
+    rows = len(df)
+    if params['sample_size'] < 1:
+        rng = np.random.default_rng(None if params['random_state'] is None else [params['random_state'], task_id])
+        df = df[rng.random(rows) < params['sample_size']]
+
+    df = drop_nulls_and_columns(df, params['drop_columns'])
+    df = create_time_features(df)
+    stages = outlier_rules(params['outlier_columns'])
+    drop_stage = _row_drop_stage(df, stages)
+    prefix = os.path.join(_shared['work_dir'], f'{task_id:06d}')
+    np.save(f'{prefix}_drop_stage.npy', drop_stage)
+    for column in params['quantile_columns']:
+        np.save(f'{prefix}_{column}.npy', df[column].to_numpy())
+
+    df = create_geo_features(df[drop_stage == len(stages)], method=params['method'])
+    if params['keep_columns'] is not None:
+        df = df[list(dict.fromkeys(params['keep_columns'] + params['quantile_columns']))]
+    df.to_pickle(f'{prefix}.pkl')
+    return rows
+
+def global_thresholds(arrays: dict, drop_stage: np.ndarray, columns: list) -> dict:
+    """
+    Compute the quantile thresholds of outlier_rules from the quantile columns of all rows.
+
+    Args:
+        arrays (dict): The values of every column used by a quantile rule, over all rows.
+        drop_stage (np.ndarray): Per row, the first stage whose row-local rules drop it.
+        columns (list): The outlier columns passed to remove_outliers.
+
+    Returns:
+        dict: Thresholds per rule name, as outlier_mask expects them.
+    """
+    mask = np.ones(len(drop_stage), dtype=bool)
+    thresholds = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, stage in enumerate(outlier_rules(columns)):
+            mask &= drop_stage >= i
+            quantile_rules = [rule for rule in stage if rule[2] is not None]
+            for name, _, bounds, _ in quantile_rules:
+                thresholds[name] = bounds(lambda column, q: _quantile(arrays[column], mask, q))
+            for name, _, _, predicate in quantile_rules:
+                mask &= predicate(arrays, thresholds[name])
+    return thresholds
+
+@stage
+def run_partitioned(file_path, sample_size: float, drop_columns: list, outlier_columns: list,
+                    keep_columns: list = None, random_state: int = None, columns: list = None,
+                    schema: dict = TAXI_SCHEMA, method: str = 'geodesic',
+                    partition_bytes: int = PARTITION_BYTES, workers: int = None) -> pd.DataFrame:
+    """
+    Run the feature pipeline over byte-range partitions of the input on a process pool.
+
+    Parameters:
+    - file_path (str | list): The CSV files, as a path, glob or list.
+    - sample_size (float): The proportion of rows to keep, sampled per partition.
+    - drop_columns (list): Columns dropped by drop_nulls_and_columns.
+    - outlier_columns (list): The outlier columns passed to remove_outliers.
+    - keep_columns (list): The columns to return, e.g. features and targets. None keeps all (default: None).
+    - random_state (int): Seed of the per-partition sampling (default: None).
+    - columns (list): The columns to read, as in load_data (default: None).
+    - schema (dict): The column dtypes, as in load_data (default: TAXI_SCHEMA).
+    - method (str): Distance kernel of create_geo_features (default: 'geodesic').
+    - partition_bytes (int): Approximate size of a partition (default: 64 MiB).
+    - workers (int): Number of worker processes (default: os.cpu_count()).
+
+    Returns:
+    - pd.DataFrame: The features without outliers, indexed by row number in the input as in load_data.
+    """
+    quantile_columns = list(dict.fromkeys(rule[1][0] for stage in outlier_rules(outlier_columns)
+                                          for rule in stage if rule[2] is not None))
+    params = {'sample_size': sample_size, 'random_state': random_state, 'columns': columns, 'schema': schema,
+              'drop_columns': drop_columns, 'outlier_columns': outlier_columns, 'method': method,
+              'keep_columns': keep_columns, 'quantile_columns': quantile_columns}
+    ranges = byte_ranges(file_path, partition_bytes)
+    tasks = [(i, path, start, end) for i, (path, start, end) in enumerate(ranges)]
+    work_dir = tempfile.mkdtemp(prefix='partitioned-')
+    try:
+        logger.info(f"Processing {len(tasks)} partitions on {workers or os.cpu_count()} workers")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(work_dir, params)) as pool:
+            rows = list(pool.map(_map_partition, tasks))
+        logger.info(f"Mapped {sum(rows)} rows in {time.perf_counter() - start:.1f}s")
+
+        prefixes = [os.path.join(work_dir, f'{task_id:06d}') for task_id, _, _, _ in tasks]
+        drop_stage = np.concatenate([np.load(f'{prefix}_drop_stage.npy') for prefix in prefixes])
+        arrays = {column: np.concatenate([np.load(f'{prefix}_{column}.npy') for prefix in prefixes])
+                  for column in quantile_columns}
+        thresholds = global_thresholds(arrays, drop_stage, outlier_columns)
+        del arrays, drop_stage
+
+        # Row numbers continue across partitions and files, like load_data's index
+        offsets = np.cumsum([0] + rows[:-1])
+        frames = []
+        for prefix, offset in zip(prefixes, offsets):
+            df = pd.read_pickle(f'{prefix}.pkl')
+            mask, _, _ = outlier_mask(df, outlier_columns, thresholds=thresholds, rules='quantile')
+            df = df[mask] if keep_columns is None else df.loc[mask, keep_columns]
+            df.index = df.index + offset
+            frames.append(df)
+        df = pd.concat(frames)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    df = df.astype({column: 'category' for column in df.columns if schema is not None and schema.get(column) == 'category'})
+    logger.info(f"Partitioned pipeline kept {len(df)} of {sum(rows)} rows")
+    return df
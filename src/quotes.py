@@ -0,0 +1,303 @@
+"""
+Precomputed origin-destination quote table.
+
+Pickup and dropoff coordinates are snapped to a square lat/lon grid over the city. The build
+step keeps the cells that contain at least min_points known trip endpoints, plus the airports,
+and predicts fare, duration and tip for every (day_of_week, hour, origin cell, destination
+cell) combination with passenger_count and rate_code at 1, as make_prediction does. Each cell
+is represented by the mean position of its endpoints and each hour by QUOTE_MINUTE. The
+predictions are stored as a float32 .npy array of shape (7, 24, cells, cells, targets) next to
+a cells.npy grid lookup and a meta.json.
+
+QuoteTable answers from the memory-mapped table with two grid lookups and one array read.
+Quoting needs only numpy: scikit-learn and the models are needed to build the table and for
+the error report, which compares the quotes with exact model predictions on a trips file.
+
+Usage:
+    python -m src.quotes build outputs/quotes --points outputs/csvdata/VisualizeLocations.csv outputs/csvdata/JFK_trips.csv
+    python -m src.quotes report outputs/quotes outputs/csvdata/JFK_trips.csv
+"""
+import argparse
+import json
+import math
+import os
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler()
+stream_handler.setLevel(logging.INFO)
+logger.addHandler(stream_handler)
+
+# (lat_min, lon_min, lat_max, lon_max) of the grid, the five boroughs
+BOUNDS: tuple = (40.49, -74.27, 40.92, -73.68)
+CELL_DEG: float = 0.01
+MIN_POINTS: int = 5
+QUOTE_MINUTE: int = 30
+# Cells always kept even without enough endpoints in the points files: JFK and LaGuardia
+LANDMARKS: list = [(40.6413, -73.7781), (40.7769, -73.8740)]
+TREE_TARGETS: list = ['fare_amount', 'trip_duration']
+REG_TARGETS: list = ['tip_amount']
+
+class QuoteTable:
+    """
+    Constant-time fare, duration and tip quotes from a table built with build_quote_table.
+
+    Args:
+        path (str): The directory the table was built into.
+    """
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        self.targets = self.meta['targets']
+        self.table = np.load(os.path.join(path, 'quotes.npy'), mmap_mode='r')
+        self.cells = np.load(os.path.join(path, 'cells.npy'))
+        self._lat_min, self._lon_min = self.meta['bounds'][:2]
+        self._cell_deg = self.meta['cell_deg']
+        self._rows, self._cols = self.meta['grid_shape']
+
+    def cell(self, lat, lon) -> np.ndarray:
+        """
+        Index of the table cell of each coordinate, -1 outside the grid or in a cell without trips.
+        """
+        row = np.floor((np.asarray(lat, dtype=np.float64) - self._lat_min) / self._cell_deg)
+        col = np.floor((np.asarray(lon, dtype=np.float64) - self._lon_min) / self._cell_deg)
+        inside = (row >= 0) & (row < self._rows) & (col >= 0) & (col < self._cols)
+        flat = np.where(inside, row * self._cols + col, 0).astype(np.int64)
+        return np.where(inside, self.cells[flat], -1)
+
+    def _cell_scalar(self, lat: float, lon: float) -> int:
+        # Plain float math, numpy's per-call overhead dominates for a single coordinate. A missing
+        # (NaN) or infinite coordinate, e.g. from a failed geocode, is in no cell
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return -1
+        row = math.floor((lat - self._lat_min) / self._cell_deg)
+        col = math.floor((lon - self._lon_min) / self._cell_deg)
+        if not (0 <= row < self._rows and 0 <= col < self._cols):
+            return -1
+        return int(self.cells[row * self._cols + col])
+
+    def quote_many(self, hour, day_of_week, pickup_lat, pickup_long, dropoff_lat, dropoff_long) -> dict:
+        """
+        Quote arrays of trips.
+
+        Returns:
+            dict: One array per target, NaN for trips with an endpoint outside the table.
+
+        Raises:
+            ValueError: If an hour is not in 0-23 or a day_of_week not in 0-6.
+        """
+        hour, day_of_week = np.asarray(hour), np.asarray(day_of_week)
+        # Out-of-range (or negative, which numpy would wrap around) indices would quote another slot
+        for name, values, size in (('hour', hour, 24), ('day_of_week', day_of_week, 7)):
+            if not np.issubdtype(values.dtype, np.integer):
+                raise ValueError(f'{name} must be integers, got {values.dtype}')
+            if values.size and (values.min() < 0 or values.max() >= size):
+                raise ValueError(f'{name} must be in 0-{size - 1}, got values from {values.min()} to {values.max()}')
+        origin = self.cell(pickup_lat, pickup_long)
+        destination = self.cell(dropoff_lat, dropoff_long)
+        found = (origin >= 0) & (destination >= 0)
+        values = np.asarray(self.table[day_of_week, hour, origin, destination], dtype=np.float64)
+        values[~found] = np.nan
+        return {target: values[..., i] for i, target in enumerate(self.targets)}
+
+    def quote(self, hour: int, minute: int, day_of_week: int, pickup_lat: float, pickup_long: float,
+              dropoff_lat: float, dropoff_long: float):
+        """
+        Quote one trip with make_prediction's arguments. The minute is not part of the table.
+
+        Returns:
+            dict: The quote per target, or None when an endpoint is outside the table.
+
+        Raises:
+            ValueError: If hour is not an integer in 0-23 or day_of_week not one in 0-6.
+        """
+        for name, value, size in (('hour', hour, 24), ('day_of_week', day_of_week, 7)):
+            if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, np.integer)):
+                raise ValueError(f'{name} must be an integer, got {value!r}')
+            if not 0 <= value < size:
+                raise ValueError(f'{name} must be in 0-{size - 1}, got {value}')
+        origin = self._cell_scalar(pickup_lat, pickup_long)
+        destination = self._cell_scalar(dropoff_lat, dropoff_long)
+        if origin < 0 or destination < 0:
+            return None
+        values = self.table[day_of_week, hour, origin, destination]
+        return {target: float(value) for target, value in zip(self.targets, values)}
+
+def grid_cells(points_lat: np.ndarray, points_lon: np.ndarray, bounds: tuple = BOUNDS,
+               cell_deg: float = CELL_DEG, min_points: int = MIN_POINTS, landmarks: list = LANDMARKS) -> tuple:
+    """
+    Pick the grid cells with at least min_points trip endpoints, plus the cells of the landmarks.
+    A landmark cell without endpoints is placed at the landmark.
+
+    Returns:
+        tuple: The flat grid index, mean latitude and mean longitude of each kept cell, and the grid shape.
+    """
+    lat_min, lon_min, lat_max, lon_max = bounds
+    shape = (int(np.ceil((lat_max - lat_min) / cell_deg)), int(np.ceil((lon_max - lon_min) / cell_deg)))
+    row = np.floor((points_lat - lat_min) / cell_deg)
+    col = np.floor((points_lon - lon_min) / cell_deg)
+    inside = (row >= 0) & (row < shape[0]) & (col >= 0) & (col < shape[1])
+    flat = (row[inside] * shape[1] + col[inside]).astype(np.int64)
+    size = shape[0] * shape[1]
+    counts = np.bincount(flat, minlength=size)
+    sum_lat = np.bincount(flat, weights=points_lat[inside], minlength=size)
+    sum_lon = np.bincount(flat, weights=points_lon[inside], minlength=size)
+    selected = counts >= min_points
+    for lat, lon in landmarks:
+        cell = int(np.floor((lat - lat_min) / cell_deg)) * shape[1] + int(np.floor((lon - lon_min) / cell_deg))
+        selected[cell] = True
+        if counts[cell] == 0:
+            counts[cell], sum_lat[cell], sum_lon[cell] = 1, lat, lon
+    keep = np.flatnonzero(selected)
+    return keep, sum_lat[keep] / counts[keep], sum_lon[keep] / counts[keep], shape
+
+def read_points(file_paths: list) -> tuple:
+    """
+    Read trip endpoints from CSVs with latitude/longitude or pickup_/dropoff_ coordinate columns.
+
+    Returns:
+        tuple: The latitudes and longitudes as np.ndarrays.
+    """
+    import pandas as pd
+    lats, lons = [], []
+    for file_path in file_paths:
+        df = pd.read_csv(file_path)
+        prefixes = [''] if 'latitude' in df else ['pickup_', 'dropoff_']
+        for prefix in prefixes:
+            points = df[[f'{prefix}latitude', f'{prefix}longitude']].dropna()
+            lats.append(points[f'{prefix}latitude'].to_numpy(dtype=np.float64))
+            lons.append(points[f'{prefix}longitude'].to_numpy(dtype=np.float64))
+    return np.concatenate(lats), np.concatenate(lons)
+
+def build_quote_table(out_path: str, points_lat: np.ndarray, points_lon: np.ndarray, models_path: str = 'outputs/models/',
+                      bounds: tuple = BOUNDS, cell_deg: float = CELL_DEG, min_points: int = MIN_POINTS,
+                      minute: int = QUOTE_MINUTE) -> QuoteTable:
+    """
+    Predict every (day_of_week, hour, origin cell, destination cell) combination into a memory-mapped table.
+
+    Args:
+        out_path (str): Directory to write quotes.npy, cells.npy and meta.json to.
+        points_lat (np.ndarray): Latitudes of known trip endpoints, choosing and placing the cells.
+        points_lon (np.ndarray): Their longitudes.
+        models_path (str): Directory holding the pickled models (default: 'outputs/models/').
+        bounds (tuple): (lat_min, lon_min, lat_max, lon_max) of the grid (default: the five boroughs).
+        cell_deg (float): Cell size in degrees (default: 0.01).
+        min_points (int): Endpoints a cell needs to be kept (default: 5).
+        minute (int): The minute every hour is quoted at (default: 30).
+
+    Returns:
+        QuoteTable: The built table.
+    """
+    from src.functions import load_model, load_tree_models, make_predictions
+    from src.geo import gps_distance
+    tree_targets, tree_models = load_tree_models(models_path, TREE_TARGETS)
+    reg_models = [load_model(os.path.join(models_path, f'{target}_model.pkl')) for target in REG_TARGETS]
+
+    keep, cell_lat, cell_lon, shape = grid_cells(points_lat, points_lon, bounds, cell_deg, min_points)
+    n = len(keep)
+    origin, destination = (index.ravel() for index in np.indices((n, n)))
+    trips = {
+        'pickup_latitude': cell_lat[origin], 'pickup_longitude': cell_lon[origin],
+        'dropoff_latitude': cell_lat[destination], 'dropoff_longitude': cell_lon[destination],
+        'start_minute': np.full(n * n, minute),
+    }
+    # The distance does not depend on the time, compute it once for all 168 slots
+    trips['gps_distance'] = gps_distance(trips['pickup_latitude'], trips['pickup_longitude'],
+                                         trips['dropoff_latitude'], trips['dropoff_longitude'])
+
+    os.makedirs(out_path, exist_ok=True)
+    targets = TREE_TARGETS + REG_TARGETS
+    table = np.lib.format.open_memmap(os.path.join(out_path, 'quotes.npy'), mode='w+', dtype=np.float32,
+                                      shape=(7, 24, n, n, len(targets)))
+    start = time.perf_counter()
+    for day_of_week in range(7):
+        for hour in range(24):
+            trips['day_of_week'] = np.full(n * n, day_of_week)
+            trips['start_hour'] = np.full(n * n, hour)
+            predictions = make_predictions(trips, tree_targets, tree_models, REG_TARGETS, reg_models)
+            table[day_of_week, hour] = predictions[targets].to_numpy(dtype=np.float32).reshape(n, n, len(targets))
+    table.flush()
+    del table
+
+    cells = np.full(shape[0] * shape[1], -1, dtype=np.int32)
+    cells[keep] = np.arange(n, dtype=np.int32)
+    np.save(os.path.join(out_path, 'cells.npy'), cells)
+    meta = {'bounds': list(bounds), 'cell_deg': cell_deg, 'grid_shape': list(shape), 'min_points': min_points,
+            'minute': minute, 'targets': targets, 'cells': n, 'models_path': os.path.abspath(models_path)}
+    with open(os.path.join(out_path, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+    logger.info(f"Built quote table of {n} cells ({7 * 24 * n * n:,} slots) in {time.perf_counter() - start:.1f}s to {out_path}")
+    return QuoteTable(out_path)
+
+def error_report(table: QuoteTable, trips_path: str, models_path: str = 'outputs/models/') -> dict:
+    """
+    Compare the table's quotes with exact model predictions on the trips of a file, both with
+    passenger_count and rate_code at 1 as in make_prediction.
+
+    Args:
+        table (QuoteTable): The quote table.
+        trips_path (str): A trips CSV or Parquet file, as accepted by src.score.
+        models_path (str): Directory holding the pickled models (default: 'outputs/models/').
+
+    Returns:
+        dict: Coverage, and per target the mean, median, 95th percentile and maximum absolute error
+        and the mean absolute error relative to the mean prediction, over the covered trips.
+    """
+    import pandas as pd
+    from src.functions import load_model, load_tree_models, make_predictions
+    from src.score import read_chunks, prepare_trips
+    tree_targets, tree_models = load_tree_models(models_path, TREE_TARGETS)
+    reg_models = [load_model(os.path.join(models_path, f'{target}_model.pkl')) for target in REG_TARGETS]
+
+    trips = prepare_trips(pd.concat(read_chunks(trips_path, 1_000_000), ignore_index=True))
+    # The table covers make_prediction's domain, passenger_count and rate_code at 1
+    trips = trips.drop(columns=['passenger_count', 'rate_code'], errors='ignore')
+    exact = make_predictions(trips, tree_targets, tree_models, REG_TARGETS, reg_models)
+    start = time.perf_counter()
+    quotes = table.quote_many(trips['start_hour'].to_numpy(), trips['day_of_week'].to_numpy(),
+                              trips['pickup_latitude'].to_numpy(), trips['pickup_longitude'].to_numpy(),
+                              trips['dropoff_latitude'].to_numpy(), trips['dropoff_longitude'].to_numpy())
+    lookup_seconds = time.perf_counter() - start
+
+    covered = ~np.isnan(quotes[table.targets[0]])
+    report = {'trips': len(trips), 'coverage': float(covered.mean()),
+              'lookup_us_per_trip': lookup_seconds / max(len(trips), 1) * 1e6, 'targets': {}}
+    for target in table.targets:
+        error = np.abs(quotes[target][covered] - exact[target].to_numpy()[covered])
+        report['targets'][target] = {
+            'mae': float(error.mean()),
+            'p50': float(np.percentile(error, 50)),
+            'p95': float(np.percentile(error, 95)),
+            'max': float(error.max()),
+            'relative_mae': float(error.mean() / np.abs(exact[target].to_numpy()[covered]).mean()),
+        }
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or evaluate the origin-destination quote table.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='predict every grid cell pair and hour into a table')
+    build.add_argument('output', help='directory for the table')
+    build.add_argument('--points', nargs='+', default=['outputs/csvdata/VisualizeLocations.csv', 'outputs/csvdata/JFK_trips.csv'],
+                       help='CSVs of trip endpoints that choose the cells')
+    build.add_argument('--models', default='outputs/models/')
+    build.add_argument('--cell-deg', type=float, default=CELL_DEG)
+    build.add_argument('--min-points', type=int, default=MIN_POINTS)
+    report = subparsers.add_parser('report', help='compare the quotes with exact model predictions')
+    report.add_argument('table', help='directory of the table')
+    report.add_argument('trips', help='CSV or Parquet file of trips')
+    report.add_argument('--models', default='outputs/models/')
+    report.add_argument('--output', help='JSON file for the report (default: <table>/error_report.json)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_quote_table(args.output, *read_points(args.points), args.models, cell_deg=args.cell_deg, min_points=args.min_points)
+    else:
+        result = error_report(QuoteTable(args.table), args.trips, args.models)
+        output = args.output or os.path.join(args.table, 'error_report.json')
+        with open(output, 'w') as file:
+            json.dump(result, file, indent=2)
+        logger.info(json.dumps(result, indent=2))
@@ -0,0 +1,105 @@
+"""
+Batch-score a CSV or Parquet file of trips with the pickled models.
+
+Usage:
+    python -m src.score trips.csv predictions.csv --chunksize 500000
+
+Every input chunk is scored with one predict call per model and appended to the output,
+so memory stays bounded by the chunk size whatever the file size.
+"""
+import argparse
+import os
+import pandas as pd
+from src.functions import make_predictions, load_model, load_tree_models, logger
+from src.timestamps import parse_timestamps, time_features
+
+MODELS_PATH: str = 'outputs/models/'
+TREE_TARGETS: list = ['fare_amount', 'trip_duration']
+REG_TARGETS: list = ['tip_amount']
+PREFIX: str = 'pred_'
+
+def _is_parquet(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in ('.parquet', '.pq')
+
+def read_chunks(file_path: str, chunksize: int):
+    """
+    Iterate over a CSV or Parquet file in DataFrame chunks of at most chunksize rows.
+
+    Args:
+        file_path (str): The input file. Parquet is detected from the .parquet/.pq extension and needs pyarrow.
+        chunksize (int): The maximum number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next chunk of trips.
+    """
+    if _is_parquet(file_path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+
+def prepare_trips(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive start_hour, start_minute and day_of_week from pickup_datetime when they are not given.
+
+    Args:
+        chunk (pd.DataFrame): Raw trips.
+
+    Returns:
+        pd.DataFrame: The trips with the time columns make_predictions expects.
+    """
+    if 'start_hour' not in chunk:
+        features = time_features(parse_timestamps(chunk['pickup_datetime']))
+        chunk = chunk.assign(**features)
+    return chunk
+
+def score_file(input_path: str, output_path: str, chunksize: int = 500_000, models_path: str = MODELS_PATH) -> int:
+    """
+    Score every trip in input_path and write the trips with pred_<target> columns to output_path.
+
+    Args:
+        input_path (str): The CSV or Parquet file of trips.
+        output_path (str): The CSV or Parquet file to write.
+        chunksize (int): Rows scored per batch (default: 500000).
+        models_path (str): Directory holding the pickled models (default: 'outputs/models/').
+
+    Returns:
+        int: The number of trips scored.
+    """
+    tree_targets, tree_models = load_tree_models(models_path, TREE_TARGETS)
+    reg_models = [load_model(os.path.join(models_path, f'{target}_model.pkl')) for target in REG_TARGETS]
+
+    writer = None
+    rows = 0
+    try:
+        for i, chunk in enumerate(read_chunks(input_path, chunksize)):
+            chunk = prepare_trips(chunk)
+            predictions = make_predictions(chunk, tree_targets, tree_models, REG_TARGETS, reg_models)
+            out = pd.concat([chunk, predictions.add_prefix(PREFIX)], axis=1)
+            if _is_parquet(output_path):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(out, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+            else:
+                out.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            rows += len(out)
+            logger.info(f"Scored {rows} trips")
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch-score trips with the fare, duration and tip models.')
+    parser.add_argument('input', help='CSV or Parquet file of trips')
+    parser.add_argument('output', help='CSV or Parquet file to write the predictions to')
+    parser.add_argument('--chunksize', type=int, default=500_000, help='trips scored per batch')
+    parser.add_argument('--models', default=MODELS_PATH, help='directory with the pickled models')
+    args = parser.parse_args()
+    score_file(args.input, args.output, args.chunksize, args.models)
@@ -0,0 +1,283 @@
+"""
+Async HTTP prediction service with micro-batching.
+
+The fare, duration and tip models are loaded once. Concurrent requests are queued and a single
+batching loop collects them into micro-batches, closed when max_batch_size trips are waiting or
+max_wait_ms after the first one arrived. Each batch is scored with one make_predictions call
+(one vectorized predict per model), on a worker thread so the event loop keeps accepting
+requests and gathering the next batch meanwhile.
+
+Endpoints:
+    POST /predict  a JSON trip, or a JSON list of trips, with the make_predictions columns
+                   (start_hour, start_minute, day_of_week, pickup_latitude, pickup_longitude,
+                   dropoff_latitude, dropoff_longitude, optional passenger_count and rate_code).
+                   Answers with the predictions per target, or a list of them.
+    GET  /health   batching statistics.
+    GET  /metrics  request and batch latency histograms and counters in the Prometheus text
+                   format (src.telemetry).
+
+Usage:
+    python -m src.serve --port 8502 --max-batch-size 256 --max-wait-ms 2
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.functions import make_predictions, load_model, load_tree_models, logger
+from src import telemetry
+from src.score import MODELS_PATH, TREE_TARGETS, REG_TARGETS
+
+HOST: str = '127.0.0.1'
+PORT: int = 8502
+MAX_BATCH_SIZE: int = 256
+MAX_WAIT_MS: float = 2.0
+SCORING_THREADS: int = 1
+REQUIRED_FIELDS: list = ['start_hour', 'start_minute', 'day_of_week', 'pickup_latitude', 'pickup_longitude',
+                         'dropoff_latitude', 'dropoff_longitude']
+OPTIONAL_FIELDS: list = ['passenger_count', 'rate_code']
+REASONS: dict = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                 500: 'Internal Server Error'}
+MAX_BODY_BYTES: int = 2 ** 20
+
+class MicroBatcher:
+    """
+    Collect trips from concurrent callers and score them together.
+
+    Args:
+        models_path (str): Directory holding the pickled models (default: 'outputs/models/').
+        max_batch_size (int): Trips per batch at most; a single larger request is scored alone (default: 256).
+        max_wait_ms (float): How long a batch waits for more trips after its first one (default: 2.0).
+    """
+    def __init__(self, models_path: str = MODELS_PATH, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.tree_targets, self.tree_models = load_tree_models(models_path, TREE_TARGETS)
+        self.reg_models = [load_model(os.path.join(models_path, f'{target}_model.pkl')) for target in REG_TARGETS]
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = {'requests': 0, 'trips': 0, 'batches': 0, 'predict_seconds': 0.0}
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._scoring = set()
+        # One thread, so batches are scored in order while the loop gathers the next one
+        self._executor = ThreadPoolExecutor(max_workers=SCORING_THREADS, thread_name_prefix='predict')
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        # A gathered batch waits for a free scoring thread, so batches never pile up in the executor
+        self._slots = asyncio.Semaphore(SCORING_THREADS)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.gather(*self._scoring, return_exceptions=True)
+        self._executor.shutdown()
+
+    async def predict(self, trips: list) -> list:
+        """
+        Queue trips for the next batch and wait for their predictions.
+
+        Args:
+            trips (list): Dicts with the make_predictions columns.
+
+        Returns:
+            list: One dict of predictions per target for every trip.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((trips, future))
+        return await future
+
+    def _score(self, trips: list) -> list:
+        columns = {field: np.array([trip[field] for trip in trips], dtype=np.float64) for field in REQUIRED_FIELDS}
+        for field in OPTIONAL_FIELDS:
+            columns[field] = np.array([trip.get(field, 1) for trip in trips], dtype=np.float64)
+        predictions = make_predictions(columns, self.tree_targets, self.tree_models, REG_TARGETS, self.reg_models)
+        return predictions.to_dict('records')
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            await self._slots.acquire()
+            task = loop.create_task(self._score_batch(batch))
+            self._scoring.add(task)
+            task.add_done_callback(self._scoring.discard)
+
+    async def _score_batch(self, batch: list) -> None:
+        # Score a gathered batch on the executor and answer its callers, then free the scoring slot
+        loop = asyncio.get_running_loop()
+        try:
+            trips = [trip for item, _ in batch for trip in item]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._score, trips)
+            except Exception:
+                # Score each request on its own, so one that fails the model does not fail the others
+                for item, future in batch:
+                    try:
+                        result = await loop.run_in_executor(self._executor, self._score, item)
+                    except Exception as error:
+                        if not future.done():
+                            future.set_exception(error)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                return
+            seconds = time.perf_counter() - start
+            self.stats['predict_seconds'] += seconds
+            self.stats['batches'] += 1
+            self.stats['requests'] += len(batch)
+            self.stats['trips'] += len(trips)
+            telemetry.observe('serve_batch_seconds', seconds)
+            telemetry.count('serve_trips_total', len(trips))
+
+            offset = 0
+            for item, future in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(item)])
+                offset += len(item)
+        finally:
+            self._slots.release()
+
+def _validate(body: bytes) -> tuple:
+    """
+    Parse a /predict body into a list of trips.
+
+    Returns:
+        tuple: The trips and whether a single trip (not a list) was sent.
+    """
+    payload = json.loads(body)
+    single = isinstance(payload, dict)
+    trips = [payload] if single else payload
+    if not isinstance(trips, list) or not trips:
+        raise ValueError('expected a trip object or a non-empty list of trips')
+    for trip in trips:
+        if not isinstance(trip, dict):
+            raise ValueError('every trip must be a JSON object')
+        missing = [field for field in REQUIRED_FIELDS if field not in trip]
+        if missing:
+            raise ValueError(f'missing fields: {", ".join(missing)}')
+        for field in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+            if field in trip and (isinstance(trip[field], bool) or not isinstance(trip[field], (int, float))
+                                  or not math.isfinite(trip[field])):
+                raise ValueError(f'{field} must be a finite number')
+    return trips, single
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool,
+                   content_type: str = 'application/json') -> None:
+    body = json.dumps(payload).encode() if content_type == 'application/json' else payload.encode()
+    telemetry.count('serve_responses_total', status=status)
+    head = (f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+async def handle_connection(batcher: MicroBatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Serve the HTTP/1.1 requests of one connection, keeping it open between requests.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY_BYTES:
+                await _respond(writer, 413, {'error': 'request body too large'}, False)
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            start = time.perf_counter()
+            if path == '/health':
+                await _respond(writer, 200, batcher.stats, keep_alive)
+            elif path == '/metrics':
+                await _respond(writer, 200, telemetry.to_prometheus(), keep_alive, 'text/plain; version=0.0.4')
+            elif path != '/predict':
+                await _respond(writer, 404, {'error': f'unknown path {path}'}, keep_alive)
+            elif method != 'POST':
+                await _respond(writer, 405, {'error': 'use POST'}, keep_alive)
+            else:
+                try:
+                    trips, single = _validate(body)
+                except ValueError as error:
+                    await _respond(writer, 400, {'error': str(error)}, keep_alive)
+                else:
+                    try:
+                        predictions = await batcher.predict(trips)
+                    except Exception as error:
+                        logger.error(f"Prediction failed: {error!r}")
+                        await _respond(writer, 500, {'error': 'prediction failed'}, keep_alive)
+                    else:
+                        await _respond(writer, 200, predictions[0] if single else predictions, keep_alive)
+            telemetry.observe('serve_request_seconds', time.perf_counter() - start,
+                              path=path if path in ('/predict', '/health', '/metrics') else 'other')
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str = HOST, port: int = PORT, models_path: str = MODELS_PATH,
+                max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS) -> None:
+    """
+    Run the prediction service until cancelled.
+
+    Args:
+        host (str): Interface to listen on (default: '127.0.0.1').
+        port (int): Port to listen on (default: 8502).
+        models_path (str): Directory holding the pickled models (default: 'outputs/models/').
+        max_batch_size (int): Trips per batch at most (default: 256).
+        max_wait_ms (float): How long a batch waits for more trips after its first one (default: 2.0).
+    """
+    batcher = MicroBatcher(models_path, max_batch_size, max_wait_ms)
+    batcher.start()
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(batcher, reader, writer), host, port)
+    logger.info(f"Serving predictions on http://{host}:{port}/predict (batches of up to {max_batch_size}, {max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve fare, duration and tip predictions over HTTP.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--models', default=MODELS_PATH, help='directory holding the pickled models')
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.models, args.max_batch_size, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,226 @@
+import numpy as np
+
+class HistogramSketch:
+    """
+    Mergeable fixed-bin histogram for approximate quantiles, optionally one histogram per cell of a grid.
+
+    Values are counted into `bins` equal-width bins over [lo, hi), plus one underflow and one
+    overflow bin. Two sketches with the same bins merge exactly by adding their counts, so
+    sketches of separate partitions or of newly appended data combine without rescanning.
+    Quantiles inside [lo, hi) are accurate to one bin width; quantiles that fall in the
+    underflow/overflow bins are clamped to lo/hi.
+
+    Args:
+        lo (float): Lower edge of the first bin.
+        hi (float): Upper edge of the last bin.
+        bins (int): Number of bins between lo and hi.
+        shape (tuple): Shape of the grid of histograms, () for a single one (default: ()).
+        counts (np.ndarray): Existing counts of shape shape + (bins + 2,) (default: zeros).
+    """
+
+    def __init__(self, lo: float, hi: float, bins: int, shape: tuple = (), counts: np.ndarray = None):
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.bins = int(bins)
+        self.shape = tuple(shape)
+        self.counts = np.zeros(self.shape + (self.bins + 2,), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def _bin(self, values: np.ndarray) -> np.ndarray:
+        width = (self.hi - self.lo) / self.bins
+        idx = np.floor((np.asarray(values, dtype=np.float64) - self.lo) / width) + 1
+        return np.clip(np.nan_to_num(idx, nan=0), 0, self.bins + 1).astype(np.intp)
+
+    def update(self, values, cells: tuple = ()) -> 'HistogramSketch':
+        """
+        Add values to the sketch. NaN values are ignored.
+
+        Args:
+            values (array-like): The values to add.
+            cells (tuple): One index array per grid dimension saying which histogram each value goes to.
+
+        Returns:
+            HistogramSketch: self, for chaining.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        cells = tuple(np.asarray(cell)[keep] for cell in cells)
+        np.add.at(self.counts, cells + (self._bin(values[keep]),), 1)
+        return self
+
+    def merge(self, other: 'HistogramSketch') -> 'HistogramSketch':
+        """
+        Add the counts of another sketch with identical bins.
+
+        Args:
+            other (HistogramSketch): The sketch to merge in.
+
+        Returns:
+            HistogramSketch: self, for chaining.
+        """
+        if (self.lo, self.hi, self.bins, self.shape) != (other.lo, other.hi, other.bins, other.shape):
+            raise ValueError('Cannot merge histogram sketches with different bins')
+        self.counts += other.counts
+        return self
+
+    def _order_statistic(self, cumulative: np.ndarray, k: np.ndarray) -> np.ndarray:
+        # Value of the k-th smallest element (0-based), assuming the elements of a bin are spread evenly across it
+        width = (self.hi - self.lo) / self.bins
+        idx = np.minimum((cumulative <= k).sum(axis=-1, keepdims=True), self.bins + 1)
+        in_bin = np.take_along_axis(self.counts, idx, axis=-1)
+        below = np.take_along_axis(cumulative, idx, axis=-1) - in_bin
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(in_bin > 0, (k - below + 0.5) / in_bin, 0.0)
+        return np.clip(self.lo + (idx - 1 + fraction) * width, self.lo, self.hi)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        Approximate q-quantile of every histogram.
+
+        Like pandas' default 'linear' method, the result interpolates between the order
+        statistics around rank q * (n - 1), each located within its bin.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            np.ndarray: The quantiles with the grid's shape (NaN for empty histograms).
+        """
+        cumulative = np.cumsum(self.counts, axis=-1)
+        total = cumulative[..., -1:]
+        rank = q * np.maximum(total - 1, 0)
+        lower = self._order_statistic(cumulative, np.floor(rank))
+        upper = self._order_statistic(cumulative, np.ceil(rank))
+        result = lower + (rank - np.floor(rank)) * (upper - lower)
+        return np.where(total > 0, result, np.nan)[..., 0]
+
+    def to_arrays(self, prefix: str) -> dict:
+        """
+        Serialize the sketch to a dict of arrays, for np.savez.
+
+        Args:
+            prefix (str): Prefix for the array names.
+
+        Returns:
+            dict: The arrays describing the sketch.
+        """
+        return {f'{prefix}_counts': self.counts, f'{prefix}_range': np.array([self.lo, self.hi, self.bins])}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'HistogramSketch':
+        """
+        Rebuild a sketch saved with to_arrays.
+
+        Args:
+            arrays (Mapping): The loaded arrays, e.g. an np.load result.
+            prefix (str): Prefix used when saving.
+
+        Returns:
+            HistogramSketch: The sketch.
+        """
+        lo, hi, bins = arrays[f'{prefix}_range']
+        counts = arrays[f'{prefix}_counts']
+        return cls(lo, hi, int(bins), counts.shape[:-1], counts)
+
+class RunningMoments:
+    """
+    Mergeable count, mean and variance, optionally one set per cell of a grid.
+
+    Batches are combined with Chan et al.'s parallel update, so statistics of separate
+    partitions or of newly appended data merge exactly without rescanning.
+
+    Args:
+        shape (tuple): Shape of the grid of statistics, () for a single one (default: ()).
+    """
+
+    def __init__(self, shape: tuple = ()):
+        self.shape = tuple(shape)
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.m2 = np.zeros(self.shape, dtype=np.float64)
+
+    def update(self, values, cells: tuple = ()) -> 'RunningMoments':
+        """
+        Add values to the statistics. NaN values are ignored.
+
+        Args:
+            values (array-like): The values to add.
+            cells (tuple): One index array per grid dimension saying which cell each value goes to.
+
+        Returns:
+            RunningMoments: self, for chaining.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        values = values[keep]
+        size = int(np.prod(self.shape))
+        flat = np.ravel_multi_index(tuple(np.asarray(cell)[keep] for cell in cells), self.shape) if self.shape else np.zeros(len(values), dtype=np.intp)
+
+        batch = RunningMoments(self.shape)
+        count = np.bincount(flat, minlength=size)
+        total = np.bincount(flat, weights=values, minlength=size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, total / count, 0.0)
+        m2 = np.bincount(flat, weights=(values - mean[flat]) ** 2, minlength=size)
+        batch.count, batch.mean, batch.m2 = count.reshape(self.shape), mean.reshape(self.shape), m2.reshape(self.shape)
+        return self.merge(batch)
+
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        """
+        Combine with the statistics of another batch.
+
+        Args:
+            other (RunningMoments): Statistics over other values, with the same grid shape.
+
+        Returns:
+            RunningMoments: self, for chaining.
+        """
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, self.mean + delta * other.count / count, 0.0)
+            m2 = np.where(count > 0, self.m2 + other.m2 + delta ** 2 * self.count * other.count / count, 0.0)
+        self.count, self.mean, self.m2 = count, mean, m2
+        return self
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        """
+        Standard deviation per cell, NaN where there are not more than ddof values (like pandas).
+
+        Args:
+            ddof (int): Delta degrees of freedom (default: 1).
+
+        Returns:
+            np.ndarray: The standard deviations.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > ddof, np.sqrt(self.m2 / (self.count - ddof)), np.nan)
+
+    def to_arrays(self, prefix: str) -> dict:
+        """
+        Serialize the statistics to a dict of arrays, for np.savez.
+
+        Args:
+            prefix (str): Prefix for the array names.
+
+        Returns:
+            dict: The arrays describing the statistics.
+        """
+        return {f'{prefix}_count': self.count, f'{prefix}_mean': self.mean, f'{prefix}_m2': self.m2}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'RunningMoments':
+        """
+        Rebuild statistics saved with to_arrays.
+
+        Args:
+            arrays (Mapping): The loaded arrays, e.g. an np.load result.
+            prefix (str): Prefix used when saving.
+
+        Returns:
+            RunningMoments: The statistics.
+        """
+        moments = cls(arrays[f'{prefix}_count'].shape)
+        moments.count = np.asarray(arrays[f'{prefix}_count'])
+        moments.mean = np.asarray(arrays[f'{prefix}_mean'])
+        moments.m2 = np.asarray(arrays[f'{prefix}_m2'])
+        return moments
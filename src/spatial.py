@@ -0,0 +1,99 @@
+"""
+Multi-resolution grid aggregation of map points.
+
+Points are binned into square lat/lon cells at several levels of detail, each level halving
+the cell size of the previous one. Every cell becomes one marker at the mean position of its
+points, carrying the point count. The map then draws the finest level that stays under a
+marker budget, so the browser payload is bounded whatever the number of points.
+
+Usage:
+    python -m src.spatial outputs/csvdata/VisualizeLocations.csv outputs/csvdata/VisualizeLocations_lod.csv
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from src.functions import logger
+
+BASE_CELL_DEG: float = 0.04
+LEVELS: int = 6
+MAX_MARKERS: int = 2000
+METERS_PER_DEG: float = 111_320.0
+
+def _aggregate(df: pd.DataFrame, levels: int, base_cell: float, group: str) -> pd.DataFrame:
+    # Partial sums per (level, group, cell) so chunks can be combined by adding them
+    partials = []
+    for level in range(levels):
+        size = base_cell / 2 ** level
+        keys = pd.DataFrame({
+            'level': level,
+            group: df[group].to_numpy(),
+            'cell_y': np.floor(df['latitude'].to_numpy() / size).astype(np.int64),
+            'cell_x': np.floor(df['longitude'].to_numpy() / size).astype(np.int64),
+            'lat_sum': df['latitude'].to_numpy(),
+            'lon_sum': df['longitude'].to_numpy(),
+            'count': 1,
+        })
+        partials.append(keys.groupby(['level', group, 'cell_y', 'cell_x'], sort=False).sum())
+    return pd.concat(partials)
+
+def build_pyramid(file_path: str, levels: int = LEVELS, base_cell: float = BASE_CELL_DEG,
+                  group: str = 'color', chunksize: int = 1_000_000) -> pd.DataFrame:
+    """
+    Aggregate the points of a CSV into a grid pyramid, streaming the file in chunks.
+
+    Args:
+        file_path (str): CSV with latitude, longitude and the group column.
+        levels (int): Number of levels of detail (default: 6).
+        base_cell (float): Cell size of level 0, in degrees (default: 0.04).
+        group (str): Column whose values are aggregated separately, e.g. the marker color (default: 'color').
+        chunksize (int): Rows read per chunk (default: 1000000).
+
+    Returns:
+        pd.DataFrame: One row per non-empty cell with level, the group column, latitude, longitude and count.
+    """
+    totals = None
+    for chunk in pd.read_csv(file_path, usecols=['latitude', 'longitude', group], chunksize=chunksize):
+        chunk = chunk.dropna()
+        partial = _aggregate(chunk, levels, base_cell, group)
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+    totals = totals.sort_index().reset_index()
+    pyramid = pd.DataFrame({
+        'level': totals['level'].astype(np.int8),
+        group: totals[group],
+        'latitude': totals['lat_sum'] / totals['count'],
+        'longitude': totals['lon_sum'] / totals['count'],
+        'count': totals['count'].astype(np.int64),
+    })
+    logger.info(f"Built {levels}-level pyramid with {len(pyramid)} cells from {int(pyramid.loc[pyramid['level'] == 0, 'count'].sum())} points")
+    return pyramid
+
+def select_level(pyramid: pd.DataFrame, max_markers: int = MAX_MARKERS, base_cell: float = BASE_CELL_DEG) -> pd.DataFrame:
+    """
+    Pick the finest level of detail with at most max_markers cells and size its markers by count.
+
+    Args:
+        pyramid (pd.DataFrame): The output of build_pyramid.
+        max_markers (int): The marker budget (default: 2000).
+        base_cell (float): Cell size of level 0 used to build the pyramid, in degrees (default: 0.04).
+
+    Returns:
+        pd.DataFrame: The markers of the chosen level with an added size column in meters.
+    """
+    cells_per_level = pyramid.groupby('level').size()
+    fitting = cells_per_level[cells_per_level <= max_markers]
+    level = fitting.index.max() if len(fitting) else cells_per_level.index.min()
+    markers = pyramid[pyramid['level'] == level].copy()
+    # Marker area proportional to the count, the largest marker spans half a cell
+    radius = base_cell / 2 ** level * METERS_PER_DEG / 2
+    markers['size'] = radius * np.sqrt(markers['count'] / markers['count'].max())
+    return markers.reset_index(drop=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the level-of-detail pyramid for the location map.')
+    parser.add_argument('input', help='CSV with latitude, longitude and color columns')
+    parser.add_argument('output', help='CSV to write the pyramid to')
+    parser.add_argument('--levels', type=int, default=LEVELS)
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    args = parser.parse_args()
+    build_pyramid(args.input, args.levels, chunksize=args.chunksize).to_csv(args.output, index=False, float_format='%.6f')
@@ -0,0 +1,102 @@
+"""
+Parallel hyperparameter sweep for the decision tree regressors.
+
+The training and validation matrices are written once to .npy files and every worker
+memory-maps them, so the frames are never pickled to the workers and all processes share
+the same pages of the OS cache. Each (target, max_depth, min_samples_leaf) combination is
+one task on a process pool; the best model per target is kept and saved with pickle_model.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeRegressor
+from src.functions import pickle_model, load_model, write_tree_manifest, logger
+from src.tree_engine import FlatTree
+
+_shared = {}
+
+def _init_worker(work_dir: str, features: list, targets: list) -> None:
+    # Runs once per worker process: map the shared arrays instead of receiving copies
+    _shared['X_train'] = pd.DataFrame(np.load(os.path.join(work_dir, 'X_train.npy'), mmap_mode='r'), columns=features, copy=False)
+    _shared['X_val'] = pd.DataFrame(np.load(os.path.join(work_dir, 'X_val.npy'), mmap_mode='r'), columns=features, copy=False)
+    _shared['y_train'] = np.load(os.path.join(work_dir, 'y_train.npy'), mmap_mode='r')
+    _shared['y_val'] = np.load(os.path.join(work_dir, 'y_val.npy'), mmap_mode='r')
+    _shared['targets'] = targets
+    _shared['work_dir'] = work_dir
+
+def _fit_one(task: tuple) -> dict:
+    task_id, target, max_depth, min_samples_leaf, random_state = task
+    column = _shared['targets'].index(target)
+    start = time.perf_counter()
+    tree = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=random_state)
+    tree.fit(_shared['X_train'], _shared['y_train'][:, column])
+    fit_seconds = time.perf_counter() - start
+    score = tree.score(_shared['X_val'], _shared['y_val'][:, column])
+
+    model_path = os.path.join(_shared['work_dir'], f'model_{task_id}.pkl')
+    with open(model_path, 'wb') as file:
+        pickle.dump(tree, file)
+    return {'target': target, 'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf,
+            'r2': score, 'fit_seconds': fit_seconds, 'model_path': model_path}
+
+def sweep(X_train: pd.DataFrame, y_train: pd.DataFrame, X_val: pd.DataFrame, y_val: pd.DataFrame,
+          targets: list, max_depths: list, min_samples_leafs: list, out_path: str,
+          workers: int = None, random_state: int = 42) -> pd.DataFrame:
+    """
+    Grid-search max_depth and min_samples_leaf for every target on a process pool.
+
+    Parameters:
+    - X_train (pd.DataFrame): The training features.
+    - y_train (pd.DataFrame): The training targets, one column per target.
+    - X_val (pd.DataFrame): The validation features.
+    - y_val (pd.DataFrame): The validation targets, one column per target.
+    - targets (list): The target columns to sweep.
+    - max_depths (list): Values of max_depth to try.
+    - min_samples_leafs (list): Values of min_samples_leaf to try.
+    - out_path (str): Directory for sweep_results.csv, the best tree_<target>.pkl per target and the tree manifest.
+    - workers (int): Number of worker processes (default: os.cpu_count()).
+    - random_state (int): Seed for the trees, so reruns pick the same models (default: 42).
+
+    Returns:
+    - pd.DataFrame: One row per combination with r2 on the validation set and fit time, best first per target.
+    """
+    features = list(X_train.columns)
+    work_dir = tempfile.mkdtemp(prefix='sweep-')
+    try:
+        # sklearn trees work in float32, so storing X as float32 loses nothing and halves the shared memory
+        np.save(os.path.join(work_dir, 'X_train.npy'), X_train.to_numpy(dtype=np.float32))
+        np.save(os.path.join(work_dir, 'X_val.npy'), X_val.to_numpy(dtype=np.float32))
+        np.save(os.path.join(work_dir, 'y_train.npy'), y_train[targets].to_numpy(dtype=np.float64))
+        np.save(os.path.join(work_dir, 'y_val.npy'), y_val[targets].to_numpy(dtype=np.float64))
+
+        grid = itertools.product(targets, sorted(max_depths, reverse=True), sorted(min_samples_leafs))
+        # Deepest trees first so the slowest fits do not end up alone at the tail of the pool
+        tasks = [(i, target, depth, leaf, random_state) for i, (target, depth, leaf) in enumerate(grid)]
+        logger.info(f"Sweeping {len(tasks)} combinations on {workers or os.cpu_count()} workers")
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(work_dir, features, targets)) as pool:
+            results = pd.DataFrame(list(pool.map(_fit_one, tasks)))
+        logger.info(f"Sweep finished in {time.perf_counter() - start:.1f}s")
+
+        results = results.sort_values(['target', 'r2'], ascending=[True, False], kind='stable')
+        os.makedirs(out_path, exist_ok=True)
+        for target, best in results.groupby('target', sort=False).head(1).set_index('target').iterrows():
+            logger.info(f"Best {target}: max_depth={best['max_depth']}, min_samples_leaf={best['min_samples_leaf']}, r² {best['r2']:.2f}")
+            tree = load_model(best['model_path'])
+            pickle_model(tree, os.path.join(out_path, f'tree_{target}.pkl'))
+            FlatTree.from_model(tree).save(os.path.join(out_path, f'tree_{target}.npz'))
+        write_tree_manifest(out_path, targets, [os.path.join(out_path, f'tree_{target}.pkl') for target in targets])
+
+        results = results.drop(columns='model_path').reset_index(drop=True)
+        results.to_csv(os.path.join(out_path, 'sweep_results.csv'), index=False)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
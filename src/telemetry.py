@@ -0,0 +1,285 @@
+"""
+Lightweight latency and throughput metrics for the prediction path.
+
+Metrics live in a process-wide registry: counters, and latency histograms with fixed buckets
+(cumulative, as Prometheus expects them). Recording one observation is a perf_counter call, a
+bisect over the bucket bounds and an increment under a per-metric lock, a few microseconds,
+so the instrumentation is meant to stay on in production. The registry is exported as
+Prometheus text (the /metrics endpoint of src.serve, or a file for node_exporter's textfile
+collector) or as JSON.
+
+Usage:
+    from src import telemetry
+
+    with telemetry.timer('model_predict_seconds', target='fare_amount'):
+        model.predict(X)
+    telemetry.count('geocoding_cache_total', endpoint='details', result='hit')
+    telemetry.write_metrics('outputs/metrics/app.prom')
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds in seconds, from half a millisecond to ten seconds
+LATENCY_BUCKETS: tuple = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_settings = {'enabled': True}
+
+def configure(enabled: bool = True) -> None:
+    """
+    Switch recording on or off. Disabled timers and counters return immediately.
+
+    Args:
+        enabled (bool): Record metrics at all (default: True).
+    """
+    _settings['enabled'] = enabled
+
+class Counter:
+    """
+    Monotonic counter.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> dict:
+        return {'value': self.value}
+
+class Histogram:
+    """
+    Fixed-bucket histogram of observed values, with their count and sum.
+
+    Args:
+        buckets (tuple): Sorted upper bounds of the buckets; values above the last one go to +Inf
+            (default: LATENCY_BUCKETS).
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by linear interpolation within its bucket, like Prometheus'
+        histogram_quantile. Quantiles in the +Inf bucket are reported as the last bound.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimate, NaN without observations.
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return float('nan')
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        cumulative, buckets = 0, []
+        # The last bound as a string, JSON has no infinity
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        return {'count': total, 'sum': value_sum, 'buckets': buckets}
+
+class _Timer:
+    # A class rather than contextlib.contextmanager, which costs several microseconds per block
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class Registry:
+    """
+    Named, labelled counters and histograms, created on first use.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: type, name: str, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, kind())
+        if not isinstance(metric, kind):
+            raise TypeError(f"metric {name} is a {type(metric).__name__}, not a {kind.__name__}")
+        return metric
+
+    def count(self, name: str, amount: float = 1, **labels) -> None:
+        if _settings['enabled']:
+            self._get(Counter, name, labels).inc(amount)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if _settings['enabled']:
+            self._get(Histogram, name, labels).observe(value)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._get(Histogram, name, labels)
+
+    def timer(self, name: str, **labels) -> '_Timer':
+        """
+        Context manager timing the enclosed block into the histogram name. Exceptions are timed too and propagate.
+        """
+        return _Timer(self._get(Histogram, name, labels) if _settings['enabled'] else None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self) -> dict:
+        """
+        All metrics as plain data.
+
+        Returns:
+            dict: 'counters' and 'histograms', lists of dicts with the name, the labels and the values.
+        """
+        with self._lock:
+            items = sorted(self._metrics.items())
+        snapshot = {'counters': [], 'histograms': []}
+        for (name, labels), metric in items:
+            kind = 'counters' if isinstance(metric, Counter) else 'histograms'
+            snapshot[kind].append({'name': name, 'labels': dict(labels), **metric.snapshot()})
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines, typed = [], set()
+        snapshot = self.snapshot()
+        for kind, entries in (('counter', snapshot['counters']), ('histogram', snapshot['histograms'])):
+            for entry in entries:
+                name = entry['name']
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(entry['labels'])} {_number(entry['value'])}")
+                    continue
+                for bound, cumulative in entry['buckets']:
+                    lines.append(f"{name}_bucket{_labels({**entry['labels'], 'le': str(bound)})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(entry['labels'])} {_number(entry['sum'])}")
+                lines.append(f"{name}_count{_labels(entry['labels'])} {entry['count']}")
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+REGISTRY = Registry()
+
+def count(name: str, amount: float = 1, **labels) -> None:
+    """
+    Add amount to the counter name of the default registry.
+    """
+    REGISTRY.count(name, amount, **labels)
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    Record a value, in seconds for latencies, in the histogram name of the default registry.
+    """
+    REGISTRY.observe(name, value, **labels)
+
+def timer(name: str, **labels):
+    """
+    Context manager timing its block into the histogram name of the default registry.
+    """
+    return REGISTRY.timer(name, **labels)
+
+def snapshot() -> dict:
+    """
+    The metrics of the default registry as plain data, see Registry.snapshot.
+    """
+    return REGISTRY.snapshot()
+
+def to_prometheus() -> str:
+    """
+    The metrics of the default registry in the Prometheus text format.
+    """
+    return REGISTRY.to_prometheus()
+
+def write_metrics(file_path: str) -> None:
+    """
+    Write the metrics of the default registry to a file, as JSON for a .json path and as
+    Prometheus text otherwise. The file is replaced atomically, so readers never see half of it.
+
+    Args:
+        file_path (str): The file to write, e.g. a .prom file in node_exporter's textfile directory.
+    """
+    if file_path.endswith('.json'):
+        content = json.dumps({'created': time.time(), **snapshot()}, indent=2)
+    else:
+        content = to_prometheus()
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temporary = f"{file_path}.tmp"
+    with open(temporary, 'w') as file:
+        file.write(content)
+    os.replace(temporary, file_path)
+
+def export_periodically(file_path: str, interval: float = 15.0) -> threading.Thread:
+    """
+    Write the metrics to file_path every interval seconds from a daemon thread.
+
+    Args:
+        file_path (str): The file to write, see write_metrics.
+        interval (float): Seconds between writes (default: 15.0).
+
+    Returns:
+        threading.Thread: The started exporter thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_metrics(file_path)
+            except OSError:
+                pass
+    thread = threading.Thread(target=run, name='metrics-export', daemon=True)
+    thread.start()
+    return thread
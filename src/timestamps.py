@@ -0,0 +1,123 @@
+"""
+Fast parsing of the taxi timestamps and integer-math time features.
+
+The taxi CSVs always write timestamps as 'YYYY-MM-DD HH:MM:SS'. parse_timestamps reads the 19
+bytes of each value as digits and turns them into int64 seconds since the epoch with the
+days-from-civil formula, without format inference or per-value datetime objects. For
+pyarrow-backed string columns (the pandas default with pyarrow installed) the bytes are read
+straight from the Arrow buffer, without copying. time_features derives the hour, minute, day of
+week and trip duration from those seconds with vectorized integer arithmetic.
+"""
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_LENGTH: int = 19
+# Epoch seconds of missing timestamps, the int64 value numpy uses for NaT
+NAT: int = np.iinfo(np.int64).min
+# Positions and characters of the separators in 'YYYY-MM-DD HH:MM:SS'
+_SEPARATORS: dict = {4: ord('-'), 7: ord('-'), 10: ord(' '), 13: ord(':'), 16: ord(':')}
+_DIGITS: list = [i for i in range(TIMESTAMP_LENGTH) if i not in _SEPARATORS]
+
+def _arrow_bytes(values):
+    # Zero-copy (n, 19) view of a pyarrow-backed string column without nulls, or None
+    if not isinstance(getattr(values, 'array', values), pd.arrays.ArrowStringArray):
+        return None
+    import pyarrow as pa
+    array = pa.array(values)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if array.null_count or not len(array):
+        return None
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64 if pa.types.is_large_string(array.type) else np.int32)
+    offsets = offsets[array.offset:array.offset + len(array) + 1]
+    if offsets[-1] - offsets[0] != TIMESTAMP_LENGTH * len(array) or (np.diff(offsets) != TIMESTAMP_LENGTH).any():
+        return None
+    return np.frombuffer(data, dtype=np.uint8)[offsets[0]:offsets[-1]].reshape(-1, TIMESTAMP_LENGTH)
+
+def _parse_bytes(raw: np.ndarray) -> np.ndarray:
+    # raw: (n, 19) uint8 array of 'YYYY-MM-DD HH:MM:SS' values
+    separators = np.array(list(_SEPARATORS.values()), dtype=np.uint8)
+    digits = raw[:, _DIGITS].astype(np.int32) - ord('0')
+    if (raw[:, list(_SEPARATORS)] != separators).any() or ((digits < 0) | (digits > 9)).any():
+        raise ValueError("timestamps must use the 'YYYY-MM-DD HH:MM:SS' layout")
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+    second = digits[:, 12] * 10 + digits[:, 13]
+    if ((month < 1) | (month > 12) | (day < 1) | (day > 31) | (hour > 23) | (minute > 59) | (second > 59)).any():
+        raise ValueError('timestamp field out of range')
+
+    # Days since 1970-01-01 of the proleptic Gregorian date (H. Hinnant's days_from_civil)
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+    return days.astype(np.int64) * 86400 + (hour * 3600 + minute * 60 + second)
+
+def parse_timestamps(values, memoize: bool = False) -> np.ndarray:
+    """
+    Convert 'YYYY-MM-DD HH:MM:SS' timestamps to int64 seconds since the epoch.
+
+    Args:
+        values (array-like): The timestamp strings. datetime64 values are converted directly.
+        memoize (bool): Parse every distinct value once. Only pays off for object arrays with many
+            repeated values, hashing costs more than parsing an Arrow-backed column (default: False).
+
+    Returns:
+        np.ndarray: The epoch seconds, NAT where a value is missing.
+
+    Raises:
+        ValueError: If a value does not follow the layout.
+    """
+    if pd.api.types.is_datetime64_any_dtype(getattr(values, 'dtype', None)):
+        return np.asarray(values, dtype='datetime64[s]').view(np.int64)
+    if memoize:
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        seconds = parse_timestamps(uniques)
+        return np.where(codes >= 0, seconds[codes], NAT) if len(uniques) else np.full(len(codes), NAT)
+
+    raw = _arrow_bytes(values)
+    if raw is not None:
+        return _parse_bytes(raw)
+    values = np.asarray(values, dtype=object)
+    missing = pd.isna(values)
+    seconds = np.full(len(values), NAT, dtype=np.int64)
+    present = values[~missing]
+    if len(present):
+        if any(len(value) != TIMESTAMP_LENGTH for value in present):
+            raise ValueError("timestamps must use the 'YYYY-MM-DD HH:MM:SS' layout")
+        raw = np.frombuffer(np.asarray(present, dtype=f'S{TIMESTAMP_LENGTH}').tobytes(), dtype=np.uint8)
+        seconds[~missing] = _parse_bytes(raw.reshape(-1, TIMESTAMP_LENGTH))
+    return seconds
+
+def time_features(pickup: np.ndarray, dropoff: np.ndarray = None) -> dict:
+    """
+    Derive the time features from epoch seconds with integer arithmetic.
+
+    Args:
+        pickup (np.ndarray): Pickup times in epoch seconds, as returned by parse_timestamps.
+        dropoff (np.ndarray): Dropoff times in epoch seconds, for trip_duration (default: None).
+
+    Returns:
+        dict: start_hour, start_minute and day_of_week (Monday is 0) as int32 arrays, and
+        trip_duration in minutes when dropoff is given. Features of missing times are NaN (as floats).
+    """
+    features = {
+        'start_hour': (pickup // 3600 % 24).astype(np.int32),
+        'start_minute': (pickup // 60 % 60).astype(np.int32),
+        # 1970-01-01 was a Thursday
+        'day_of_week': ((pickup // 86400 + 3) % 7).astype(np.int32),
+    }
+    missing = pickup == NAT
+    if dropoff is not None:
+        features['trip_duration'] = (dropoff - pickup) / 60
+        features['trip_duration'][missing | (dropoff == NAT)] = np.nan
+    if missing.any():
+        for name in ('start_hour', 'start_minute', 'day_of_week'):
+            features[name] = np.where(missing, np.nan, features[name])
+    return features
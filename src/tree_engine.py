@@ -0,0 +1,141 @@
+"""
+Flat-array inference for the pickled decision trees.
+
+A fitted DecisionTreeRegressor is exported to plain node arrays (feature, threshold, left,
+right, value). FlatTree walks those arrays without sklearn's input validation, which is
+where most of the time of a single-row predict goes. It follows sklearn's split rule
+exactly: features are cast to float32 and a sample goes left when x[feature] <= threshold.
+
+Usage:
+    python -m src.tree_engine outputs/models/tree_fare_amount.pkl outputs/models/tree_trip_duration.pkl
+"""
+import sys
+import numpy as np
+from src.functions import load_model, logger
+
+LEAF: int = -1
+
+class FlatTree:
+    """
+    A decision tree stored as flat node arrays.
+
+    Args:
+        feature (np.ndarray): Split feature per node.
+        threshold (np.ndarray): Split threshold per node.
+        left (np.ndarray): Left child per node, -1 for leaves.
+        right (np.ndarray): Right child per node, -1 for leaves.
+        value (np.ndarray): Prediction per node, shape (n_nodes, n_outputs).
+    """
+
+    def __init__(self, feature, threshold, left, right, value):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64).reshape(len(self.feature), -1)
+        self.n_outputs = self.value.shape[1]
+        # Python lists make the single-row walk much cheaper than indexing numpy scalars.
+        self._nodes = list(zip(self.feature.tolist(), self.threshold.tolist(), self.left.tolist(), self.right.tolist()))
+        self._values = self.value[:, 0].tolist() if self.n_outputs == 1 else [tuple(v) for v in self.value.tolist()]
+
+    @classmethod
+    def from_model(cls, model) -> 'FlatTree':
+        """
+        Export a fitted sklearn decision tree.
+
+        Args:
+            model (DecisionTreeRegressor): The fitted tree.
+
+        Returns:
+            FlatTree: The same tree as flat arrays.
+        """
+        tree = model.tree_
+        return cls(tree.feature, tree.threshold, tree.children_left, tree.children_right, tree.value[:, :, 0])
+
+    @classmethod
+    def load(cls, file_path: str) -> 'FlatTree':
+        """
+        Load a tree saved with FlatTree.save.
+
+        Args:
+            file_path (str): The .npz file.
+
+        Returns:
+            FlatTree: The loaded tree.
+        """
+        with np.load(file_path) as arrays:
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'])
+
+    def save(self, file_path: str) -> None:
+        """
+        Save the node arrays to a .npz file.
+
+        Args:
+            file_path (str): The file path to write.
+        """
+        np.savez(file_path, feature=self.feature, threshold=self.threshold,
+                 left=self.left, right=self.right, value=self.value)
+        logger.info(f"Flat tree saved to {file_path}")
+
+    def predict_one(self, row):
+        """
+        Predict a single row by walking the tree in pure Python.
+
+        Args:
+            row (sequence): The feature values of one sample.
+
+        Returns:
+            float | tuple: The prediction, or one value per output for multi-output trees.
+        """
+        x = np.asarray(row, dtype=np.float32).tolist()
+        nodes = self._nodes
+        node = 0
+        feature, threshold, left, right = nodes[0]
+        while left != LEAF:
+            node = left if x[feature] <= threshold else right
+            feature, threshold, left, right = nodes[node]
+        return self._values[node]
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predict a batch of rows, advancing all samples one tree level at a time.
+
+        Args:
+            X (array-like): The samples, shape (n_samples, n_features).
+
+        Returns:
+            np.ndarray: Predictions of shape (n_samples,) or (n_samples, n_outputs) like sklearn.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] == 1:
+            return np.array([self.predict_one(X[0])])
+
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.flatnonzero(self.left[node] != LEAF)
+        while len(active):
+            current = node[active]
+            go_left = X[active, self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[node[active]] != LEAF]
+
+        value = self.value[node]
+        return value[:, 0] if self.n_outputs == 1 else value
+
+def export_tree(model_path: str, out_path: str = None) -> str:
+    """
+    Export a pickled tree model to a .npz file of flat node arrays.
+
+    Args:
+        model_path (str): The pickled DecisionTreeRegressor.
+        out_path (str): Where to write the arrays (default: model_path with a .npz extension).
+
+    Returns:
+        str: The path written.
+    """
+    out_path = out_path or model_path.rsplit('.', 1)[0] + '.npz'
+    FlatTree.from_model(load_model(model_path)).save(out_path)
+    return out_path
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        export_tree(path)
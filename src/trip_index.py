@@ -0,0 +1,222 @@
+"""
+Spatial index of historical trips for "similar past trips" lookups.
+
+Trips are split by the (day_of_week, hour) of their pickup and every slot gets a KD-tree over
+the 4-D origin-destination points (pickup y, pickup x, dropoff y, dropoff x), projected to
+miles around New York so Euclidean distances are in miles. The build step streams the trips
+CSVs once, sorts the trips by slot and pickles one tree per slot next to the fares, durations
+and pickup times of the trips (.npy, memory-mapped when loaded) and a meta.json.
+
+TripIndex loads the tree of a slot the first time it is queried. A query for the k nearest
+trips whose pickup and dropoff both lie within radius miles only visits the few tree leaves
+around the point, so it takes milliseconds whatever the number of trips.
+
+Usage:
+    python -m src.trip_index build outputs/trip_index outputs/csvdata/JFK_trips.csv
+    python -m src.trip_index query outputs/trip_index 40.7580 -73.9855 40.6413 -73.7781 --day 4 --hour 18
+"""
+import argparse
+import json
+import math
+import os
+import pickle
+import threading
+import time
+import logging
+import numpy as np
+import pandas as pd
+from src.quotes import BOUNDS
+from src.timestamps import parse_timestamps, time_features
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stream_handler = logging.StreamHandler()
+stream_handler.setLevel(logging.INFO)
+logger.addHandler(stream_handler)
+
+MILES_PER_DEG_LAT: float = 69.05
+# At the latitude of Manhattan, 40.73 degrees
+MILES_PER_DEG_LON: float = 52.39
+SLOTS: int = 7 * 24
+VALUE_COLUMNS: list = ['fare_amount', 'total_amount', 'trip_duration']
+READ_COLUMNS: list = ['pickup_datetime', 'dropoff_datetime', 'pickup_latitude', 'pickup_longitude',
+                      'dropoff_latitude', 'dropoff_longitude', 'fare_amount', 'total_amount']
+LEAF_SIZE: int = 40
+
+def project(pickup_lat, pickup_long, dropoff_lat, dropoff_long) -> np.ndarray:
+    """
+    Origin-destination points in miles, as an (n, 4) float64 array.
+    """
+    return np.column_stack([np.asarray(pickup_lat, dtype=np.float64) * MILES_PER_DEG_LAT,
+                            np.asarray(pickup_long, dtype=np.float64) * MILES_PER_DEG_LON,
+                            np.asarray(dropoff_lat, dtype=np.float64) * MILES_PER_DEG_LAT,
+                            np.asarray(dropoff_long, dtype=np.float64) * MILES_PER_DEG_LON])
+
+def _read_trips(file_paths: list, chunksize: int, bounds: tuple):
+    # Clean trips of the CSVs as (slot, points, values, pickup seconds) per chunk
+    lat_min, lon_min, lat_max, lon_max = bounds
+    for file_path in file_paths:
+        for chunk in pd.read_csv(file_path, usecols=READ_COLUMNS, chunksize=chunksize):
+            chunk = chunk.dropna()
+            pickup = parse_timestamps(chunk['pickup_datetime'])
+            features = time_features(pickup, parse_timestamps(chunk['dropoff_datetime']))
+            lat = chunk[['pickup_latitude', 'dropoff_latitude']].to_numpy(dtype=np.float64)
+            lon = chunk[['pickup_longitude', 'dropoff_longitude']].to_numpy(dtype=np.float64)
+            keep = (((lat >= lat_min) & (lat < lat_max) & (lon >= lon_min) & (lon < lon_max)).all(axis=1)
+                    & (features['trip_duration'] > 0) & (chunk['fare_amount'].to_numpy() > 0))
+            slot = features['day_of_week'] * 24 + features['start_hour']
+            values = np.column_stack([chunk['fare_amount'].to_numpy(dtype=np.float32),
+                                      chunk['total_amount'].to_numpy(dtype=np.float32),
+                                      features['trip_duration'].astype(np.float32)])
+            points = project(lat[:, 0], lon[:, 0], lat[:, 1], lon[:, 1])
+            yield slot[keep], points[keep], values[keep], pickup[keep]
+
+class TripIndex:
+    """
+    k-nearest historical trips per (day_of_week, hour) from an index built with build_trip_index.
+
+    Args:
+        path (str): The directory the index was built into.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            self.meta = json.load(file)
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        self.pickup = np.load(os.path.join(path, 'pickup.npy'), mmap_mode='r')
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def _tree(self, slot: int):
+        tree = self._trees.get(slot)
+        if tree is None:
+            with self._lock:
+                tree = self._trees.get(slot)
+                if tree is None:
+                    with open(os.path.join(self.path, 'trees', f'{slot:03d}.pkl'), 'rb') as file:
+                        tree = self._trees[slot] = pickle.load(file)
+        return tree
+
+    def _nearest_in_slot(self, slot: int, point: np.ndarray, k: int, radius: float) -> tuple:
+        # Grow the number of neighbours fetched until k of them are within radius at both ends, or
+        # the farthest one fetched is too far for any later one to qualify
+        size = int(self.offsets[slot + 1] - self.offsets[slot])
+        if size == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64), np.empty((0, 2))
+        tree = self._tree(slot)
+        fetch = min(size, 4 * k)
+        while True:
+            distance, index = tree.query(point, k=fetch)
+            distance, index = distance[0], index[0]
+            offsets = np.asarray(tree.data)[index] - point[0]
+            ends = np.column_stack([np.hypot(offsets[:, 0], offsets[:, 1]), np.hypot(offsets[:, 2], offsets[:, 3])])
+            within = (ends <= radius).all(axis=1)
+            if within.sum() >= k or fetch == size or distance[-1] > radius * math.sqrt(2):
+                break
+            fetch = min(size, fetch * 4)
+        return distance[within][:k], index[within][:k] + self.offsets[slot], ends[within][:k]
+
+    def nearest(self, day_of_week: int, hour: int, pickup_lat: float, pickup_long: float, dropoff_lat: float,
+                dropoff_long: float, k: int = 10, radius: float = 1.0, hour_window: int = 0) -> pd.DataFrame:
+        """
+        The k historical trips closest to an origin-destination pair, among those picked up at the
+        same day and hour whose pickup and dropoff are each within radius miles of the given ones.
+
+        Args:
+            day_of_week (int): The day of the week (0-6, where Monday is 0).
+            hour (int): The hour of the pickup.
+            pickup_lat, pickup_long, dropoff_lat, dropoff_long (float): The trip's coordinates.
+            k (int): The number of trips to return at most (default: 10).
+            radius (float): Maximum distance in miles of the pickups and of the dropoffs (default: 1.0).
+            hour_window (int): Also search this many hours before and after (default: 0).
+
+        Returns:
+            pd.DataFrame: The trips by increasing distance, with pickup_miles and dropoff_miles
+            (distances to the given pickup and dropoff), fare_amount, total_amount,
+            trip_duration and pickup_datetime.
+        """
+        point = project(pickup_lat, pickup_long, dropoff_lat, dropoff_long)
+        found = []
+        for shift in range(-hour_window, hour_window + 1):
+            # Hours before midnight belong to the previous day
+            slot = (day_of_week * 24 + hour + shift) % SLOTS
+            found.append(self._nearest_in_slot(slot, point, k, radius))
+        distance = np.concatenate([item[0] for item in found])
+        order = np.argsort(distance, kind='stable')[:k]
+        index = np.concatenate([item[1] for item in found])[order]
+        ends = np.concatenate([item[2] for item in found])[order]
+
+        trips = pd.DataFrame(self.values[index], columns=self.meta['columns'])
+        trips.insert(0, 'pickup_miles', ends[:, 0])
+        trips.insert(1, 'dropoff_miles', ends[:, 1])
+        trips['pickup_datetime'] = self.pickup[index].view('datetime64[s]')
+        return trips
+
+def build_trip_index(out_path: str, file_paths: list, chunksize: int = 1_000_000, bounds: tuple = BOUNDS,
+                     leaf_size: int = LEAF_SIZE) -> TripIndex:
+    """
+    Index the trips of CSVs by (day_of_week, hour) and origin-destination.
+
+    Trips with a missing value, a coordinate outside bounds, a non-positive duration or fare are left out.
+
+    Args:
+        out_path (str): Directory to write the trees, offsets.npy, values.npy, pickup.npy and meta.json to.
+        file_paths (list): Trips CSVs with the pickup/dropoff datetimes and coordinates, fare_amount and total_amount.
+        chunksize (int): Rows read per chunk (default: 1000000).
+        bounds (tuple): (lat_min, lon_min, lat_max, lon_max) trips must lie in (default: the five boroughs).
+        leaf_size (int): Points per KD-tree leaf (default: 40).
+
+    Returns:
+        TripIndex: The built index.
+    """
+    from sklearn.neighbors import KDTree
+    start = time.perf_counter()
+    slots, points, values, pickup = (np.concatenate(parts) for parts in zip(*_read_trips(file_paths, chunksize, bounds)))
+    order = np.argsort(slots, kind='stable')
+    points, values, pickup = points[order], values[order], pickup[order]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(slots, minlength=SLOTS))]).astype(np.int64)
+    del slots, order
+
+    os.makedirs(os.path.join(out_path, 'trees'), exist_ok=True)
+    for slot in np.flatnonzero(np.diff(offsets)):
+        tree = KDTree(points[offsets[slot]:offsets[slot + 1]], leaf_size=leaf_size)
+        with open(os.path.join(out_path, 'trees', f'{slot:03d}.pkl'), 'wb') as file:
+            pickle.dump(tree, file, protocol=pickle.HIGHEST_PROTOCOL)
+    np.save(os.path.join(out_path, 'offsets.npy'), offsets)
+    np.save(os.path.join(out_path, 'values.npy'), values)
+    np.save(os.path.join(out_path, 'pickup.npy'), pickup)
+    meta = {'bounds': list(bounds), 'trips': int(offsets[-1]), 'columns': VALUE_COLUMNS, 'leaf_size': leaf_size,
+            'sources': [os.path.abspath(file_path) for file_path in file_paths]}
+    with open(os.path.join(out_path, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+    logger.info(f"Indexed {offsets[-1]:,} trips in {time.perf_counter() - start:.1f}s to {out_path}")
+    return TripIndex(out_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or query the spatial index of historical trips.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='index the trips of CSVs')
+    build.add_argument('out_path')
+    build.add_argument('trips', nargs='+', help='trips CSVs')
+    build.add_argument('--chunksize', type=int, default=1_000_000)
+    query = subparsers.add_parser('query', help='print the nearest trips of an origin-destination pair')
+    query.add_argument('path')
+    query.add_argument('coordinates', nargs=4, type=float, help='pickup lat, pickup lon, dropoff lat, dropoff lon')
+    query.add_argument('--day', type=int, default=0, help='day of week, Monday is 0')
+    query.add_argument('--hour', type=int, default=12)
+    query.add_argument('--k', type=int, default=10)
+    query.add_argument('--radius', type=float, default=1.0, help='miles')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_trip_index(args.out_path, args.trips, args.chunksize)
+    else:
+        index = TripIndex(args.path)
+        start = time.perf_counter()
+        trips = index.nearest(args.day, args.hour, *args.coordinates, k=args.k, radius=args.radius)
+        logger.info(f"{len(trips)} trips in {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(trips.to_string(index=False))